@@ -4,7 +4,7 @@ from datetime import datetime, timezone, timedelta
 from ldap3 import Server, Connection, NTLM, ALL
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 import logging
@@ -23,6 +23,8 @@ from api_server.schemas import (
     SesionResponse,
     JobCreate,
     JobUpdate,
+    ProcesoActivoResponse,
+    SesionJobsResponse,
     SesionArchivoCreate,
     SesionArchivoResponse,
     SesionArchivoEstadoUpdate,
@@ -44,7 +46,8 @@ from api_server.utils.rutas import (
 )
 from api_server.utils.jobs import registrar_error_procesamiento, verificar_estado_sesion
 from api_server.utils.sesion_estado import asignar_estado_sesion
-from api_server.utils.sesion_procesamiento import ejecutar_procesamiento_sesion
+from api_server.utils.sesion_procesamiento import ejecutar_procesamiento_sesion, estado_carriles_union
+from api_server.utils.fragmentos import registrar_fragmentos, fragmentos_en_rango, cobertura_camara, cobertura_camara_sesion
 from api_server.utils.jwt import (
     create_access_token,
     create_refresh_token,
@@ -79,6 +82,9 @@ from api_server.utils.app_sessions import (
 from api_server.routers.dashboard import router as dashboard_router
 from api_server.routers.apk import router as apk_router
 from api_server.api_app import api_app
+from api_server.utils.rabbit_publisher import publicador_rabbit
+from api_server.utils.outbox import OUTBOX_HABILITADO, encolar_rabbit, estado_outbox
+from worker.admision import estado_admision
 
 # Declaración del logger
 logging.basicConfig(level=logging.INFO)
@@ -119,10 +125,6 @@ app.include_router(dashboard_router)
 app.include_router(apk_router)
 app.mount("/api", api_app)
 
-rabbit_user = os.getenv("RABBITMQ_USER")
-rabbit_pass = os.getenv("RABBITMQ_PASS")
-rabbit_host = os.getenv("RABBITMQ_HOST", "rabbitmq")
-
 SMB_ROOT = os.getenv("WINDOWS_WAVE_SHARE_MOUNT", "/mnt/wave").rstrip("/")
 GRABADOR_UUID = os.getenv("WINDOWS_WAVE_UUID", "").strip()
 API_SERVER_URL = os.getenv("API_SERVER_URL", "http://localhost:8000").strip()
@@ -248,16 +250,18 @@ def listar_archivos_sesion(sesion_id: int, db: Session = Depends(get_db)):
 
 def _publicar_whisper_rabbit(
     *,
+    db: Session,
     sesion_id: int,
     numero_expediente: str,
     nombre_carpeta: str,
 ) -> None:
-    """Publica job de transcripción en RabbitMQ (cola transcripciones)."""
-    if not rabbit_user or not rabbit_pass:
-        raise RuntimeError("RabbitMQ credentials no configuradas")
-
-    import pika
-
+    """
+    Publica job de transcripción en RabbitMQ (cola transcripciones).
+    Con OUTBOX_HABILITADO lo agrega a outbox_mensajes en la transacción
+    de `db` (sin commit); si no, lo deja en el buffer del publicador
+    persistente, que lo publica con confirmación y reintentos en segundo
+    plano (RuntimeError solo si el buffer está lleno).
+    """
     payload = {
         "sesion_id": int(sesion_id),
         "numero_expediente": numero_expediente,
@@ -271,64 +275,20 @@ def _publicar_whisper_rabbit(
         nombre_carpeta,
     )
 
-    credentials = pika.PlainCredentials(rabbit_user, rabbit_pass)
-    connection = None
-    last_error = None
-
-    for intento in range(3):
-        try:
-            connection = pika.BlockingConnection(
-                pika.ConnectionParameters(
-                    host=rabbit_host,
-                    port=5672,
-                    virtual_host="/",
-                    credentials=credentials,
-                )
-            )
-            channel = connection.channel()
-            channel.queue_declare(queue="transcripciones", durable=True)
-            channel.basic_publish(
-                exchange="",
-                routing_key="transcripciones",
-                body=json.dumps(payload),
-                properties=pika.BasicProperties(delivery_mode=2),
-            )
-            logger.info(
-                "[WHISPER] Mensaje publicado en cola transcripciones "
-                "sesion_id=%s exp=%s carpeta=%s",
-                sesion_id,
-                numero_expediente,
-                nombre_carpeta,
-            )
-            return
-        except Exception as e:
-            last_error = e
-            logger.warning(
-                "[WHISPER] Intento %s/3 falló encolando sesión %s: %s",
-                intento + 1,
-                sesion_id,
-                e,
-            )
-        finally:
-            if connection is not None:
-                try:
-                    connection.close()
-                except Exception:
-                    pass
-                connection = None
-
-    raise RuntimeError(
-        f"No se pudo encolar sesión {sesion_id} en RabbitMQ: {last_error}"
-    )
+    if OUTBOX_HABILITADO:
+        encolar_rabbit(db, "transcripciones", payload)
+    else:
+        publicador_rabbit.publicar("transcripciones", payload)
 
 
 def encolar_whisper_si_corresponde(
-    db: Session, sesion_id: int, *, force: bool = False
+    db: Session, sesion_id: int, *, force: bool = False, commit: bool = True
 ) -> bool:
     """
     Encola Whisper cuando video.webm queda listo.
     Idempotente: no reencola si la transcripción ya está completada.
     Jobs en pendiente/procesando/error pueden re-encolarse (mensaje perdido en RabbitMQ).
+    commit=False: con outbox, el mensaje queda en la transacción del llamador.
     """
     ses = db.query(models.Sesion).filter_by(id=sesion_id).first()
     if not ses or not ses.investigacion:
@@ -379,13 +339,42 @@ def encolar_whisper_si_corresponde(
     nombre_carpeta_fs = expediente_fs(nombre_carpeta)
 
     _publicar_whisper_rabbit(
+        db=db,
         sesion_id=sesion_id,
         numero_expediente=ses.investigacion.numero_expediente,
         nombre_carpeta=nombre_carpeta_fs,
     )
+    if OUTBOX_HABILITADO and commit:
+        db.commit()
     return True
 
 
+def _whisper_al_completar_video(db: Session, sesion_id: int, *, commit: bool = True) -> None:
+    """
+    Encolado Whisper de actualizar_estado(video); los errores solo se registran.
+    commit=False corre en un savepoint: si falla, solo se deshace lo del
+    encolado (outbox/job) y la transacción del llamador sigue utilizable.
+    """
+    try:
+        if commit:
+            encolado = encolar_whisper_si_corresponde(db, sesion_id)
+        else:
+            with db.begin_nested():
+                encolado = encolar_whisper_si_corresponde(
+                    db, sesion_id, commit=False)
+        if encolado:
+            logger.info(
+                "[WHISPER] Sesión %s encolada desde actualizar_estado(video)",
+                sesion_id,
+            )
+    except Exception as e:
+        logger.error(
+            "[WHISPER] Error encolando sesión %s tras completar video: %s",
+            sesion_id,
+            e,
+        )
+
+
 @app.put("/archivos/{sesion_id}/{tipo}/actualizar_estado")
 def actualizar_estado(
     sesion_id: int,
@@ -438,6 +427,17 @@ def actualizar_estado(
         elif data.estado in ("pendiente", "procesando"):
             archivo.tamano_kb = None
 
+    video_completado = (
+        tipo == "video"
+        and data.estado == "completado"
+        and bool(data.conversion_completa)
+    )
+
+    # Con outbox el mensaje Whisper entra en el mismo commit del archivo
+    if video_completado and OUTBOX_HABILITADO:
+        db.flush()
+        _whisper_al_completar_video(db, sesion_id, commit=False)
+
     db.commit()
 
     if data.estado == "error":
@@ -453,24 +453,8 @@ def actualizar_estado(
     #     Evita perder el encolado cuando hay sesiones concurrentes
     #     y el worker no logra llamar /whisper/enviar.
     # -------------------------------------------------
-    if (
-        tipo == "video"
-        and data.estado == "completado"
-        and bool(data.conversion_completa)
-    ):
-        try:
-            encolado = encolar_whisper_si_corresponde(db, sesion_id)
-            if encolado:
-                logger.info(
-                    "[WHISPER] Sesión %s encolada desde actualizar_estado(video)",
-                    sesion_id,
-                )
-        except Exception as e:
-            logger.error(
-                "[WHISPER] Error encolando sesión %s tras completar video: %s",
-                sesion_id,
-                e,
-            )
+    if video_completado and not OUTBOX_HABILITADO:
+        _whisper_al_completar_video(db, sesion_id)
 
     # -------------------------------------------------
     # 1. Verificar ARCHIVOS requeridos
@@ -616,6 +600,7 @@ def crear_job(data: JobCreate, db: Session = Depends(get_db), ):
     if job_existente:
         # 🔁 Resetear estado para reintento
         job_existente.estado = "pendiente"
+        job_existente.archivo = data.archivo
         job_existente.error = None
         job_existente.resultado = None
         job_existente.fecha_actualizacion = datetime.now(timezone.utc)
@@ -676,6 +661,8 @@ def actualizar_job_api(
             job.resultado = data.resultado
         if data.error is not None:
             job.error = data.error
+        if data.archivo is not None:
+            job.archivo = data.archivo
 
         # Si tu modelo Job tiene fecha_actualizacion, setéala
         if hasattr(job, "fecha_actualizacion"):
@@ -935,33 +922,40 @@ def jobs_procesando(db: Session = Depends(get_db)):
     return jobs
 
 
-@app.get("/sesiones/{sesion_id}/jobs")
+def _sesiones_con_procesos(db: Session):
+    """
+    Query de sesiones con investigación, jobs y archivos precargados:
+    3 consultas en total sin importar cuántas sesiones regrese.
+    """
+    return db.query(models.Sesion).options(
+        joinedload(models.Sesion.investigacion),
+        selectinload(models.Sesion.jobs),
+        selectinload(models.Sesion.archivos),
+    )
+
+
+def _jobs_recientes_primero(jobs):
+    return sorted(jobs, key=lambda j: j.fecha_creacion, reverse=True)
+
+
+@app.get("/sesiones/{sesion_id}/jobs", response_model=SesionJobsResponse)
 def listar_jobs_sesion(sesion_id: int, db: Session = Depends(get_db)):
 
-    sesion = db.query(models.Sesion).filter_by(id=sesion_id).first()
+    sesion = (
+        _sesiones_con_procesos(db)
+        .filter(models.Sesion.id == sesion_id)
+        .first()
+    )
     if not sesion:
         raise HTTPException(status_code=404, detail="Sesión no encontrada")
 
     expediente = sesion.investigacion.numero_expediente
 
     # ============================
-    # JOBS (procesos)
-    # ============================
-    jobs = (
-        db.query(models.Job)
-        .filter_by(sesion_id=sesion_id)
-        .order_by(models.Job.fecha_creacion.desc())
-        .all()
-    )
-
-    # ============================
-    # ARCHIVOS (evidencia real)
+    # JOBS (procesos) y ARCHIVOS (evidencia real), ya precargados
     # ============================
-    archivos = (
-        db.query(models.SesionArchivo)
-        .filter_by(sesion_id=sesion_id)
-        .all()
-    )
+    jobs = _jobs_recientes_primero(sesion.jobs)
+    archivos = sesion.archivos
 
     archivos_por_tipo = {a.tipo_archivo: a for a in archivos}
 
@@ -1036,58 +1030,148 @@ def listar_jobs_sesion(sesion_id: int, db: Session = Depends(get_db)):
     }
 
 
-@app.get("/procesos/activos")
+@app.get("/procesos/activos", response_model=list[ProcesoActivoResponse])
 def procesos_activos(db: Session = Depends(get_db)):
     sesiones = (
-        db.query(models.Sesion)
+        _sesiones_con_procesos(db)
         .filter(models.Sesion.estado.in_(["procesando"]))
         .all()
     )
 
     output = []
     for ses in sesiones:
-        jobs = (
-            db.query(models.Job)
-            .filter_by(sesion_id=ses.id)
-            .order_by(models.Job.fecha_creacion.desc())
-            .all()
-        )
-        archivos = (
-            db.query(models.SesionArchivo)
-            .filter_by(sesion_id=ses.id)
-            .all()
-        )
-
         output.append({
             "sesion_id": ses.id,
-            "expediente": ses.investigacion.numero_expediente,
+            "expediente": ses.investigacion.numero_expediente if ses.investigacion else None,
             "estado_sesion": ses.estado,
-            "jobs": jobs,
-            "archivos": archivos
+            "jobs": _jobs_recientes_primero(ses.jobs),
+            "archivos": sorted(ses.archivos, key=lambda a: a.id),
         })
 
     return output
 
+@app.get("/procesos/admision")
+def procesos_admision():
+    """
+    Control de admisión ffmpeg (host master): hilos en uso, cola FIFO y
+    tiempos de espera recientes por job. Sirve para dimensionar -c en
+    los workers Celery.
+    """
+    return estado_admision()
+
+
+@app.get("/procesos/publicador_rabbit")
+def procesos_publicador_rabbit():
+    """Publicador RabbitMQ de la API: conexión, pendientes y errores."""
+    return publicador_rabbit.estado()
+
+
+@app.get("/procesos/outbox")
+def procesos_outbox(db: Session = Depends(get_db)):
+    """Outbox transaccional: pendientes, enviados, errores y antigüedad."""
+    return estado_outbox(db)
+
+
+@app.on_event("shutdown")
+def _cerrar_publicador_rabbit():
+    publicador_rabbit.detener()
+
+
+@app.get("/procesos/carriles")
+def procesos_carriles():
+    """
+    Carriles de uniones (corta/larga): mensajes en cola, job en curso y
+    espera en cola reciente por carril.
+    """
+    return estado_carriles_union()
+
 # ============================================================
 #  LOGS FFMPEG
 # ============================================================
 
 
+FFMPEG_LOG_DIR = os.getenv("FFMPEG_LOG_DIR", "/opt/semefo/logs").rstrip("/")
+# KB por log que devuelve /procesos/ffmpeg_log sin tail_kb (ni completo=1)
+FFMPEG_LOG_TAIL_KB = int(os.getenv("FFMPEG_LOG_TAIL_KB", "64"))
+
+
+def _leer_log_parcial(path: str, tail_kb: int, desde_byte: int | None) -> dict:
+    """
+    Lee solo una ventana del log (nunca el archivo completo):
+    - desde_byte: continúa desde ese offset (seguimiento en vivo), máx tail_kb
+    - sin desde_byte: últimos tail_kb KB
+    Si el log rotó (desde_byte > tamaño) vuelve al modo cola.
+    """
+    tamano = os.path.getsize(path)
+    limite = tail_kb * 1024
+
+    if desde_byte is not None and desde_byte <= tamano:
+        inicio = desde_byte
+    else:
+        inicio = max(0, tamano - limite)
+
+    with open(path, "rb") as f:
+        f.seek(inicio)
+        data = f.read(limite)
+
+    contenido = data.decode("utf-8", errors="replace")
+
+    # En modo cola se descarta la primera línea (probablemente cortada)
+    if desde_byte is None and inicio > 0 and "\n" in contenido:
+        descartado, contenido = contenido.split("\n", 1)
+        inicio += len(descartado.encode("utf-8", errors="replace")) + 1
+
+    return {
+        "tamano_bytes": tamano,
+        "desde_byte": inicio,
+        "hasta_byte": inicio + len(data),
+        "contenido": contenido,
+    }
+
+
 @app.get("/procesos/ffmpeg_log/{sesion_id}")
-def obtener_ffmpeg_log(sesion_id: int):
+def obtener_ffmpeg_log(
+    sesion_id: int,
+    tail_kb: int | None = Query(
+        None, ge=1, le=4096, description="KB máximos a devolver por log."),
+    desde_byte: int | None = Query(
+        None, ge=0, description="Offset para seguir el log (hasta_byte anterior); requiere tipo."),
+    tipo: str | None = Query(
+        None, pattern="^(video|video2)$", description="Solo el log de este tipo."),
+    completo: bool = Query(
+        False, description="Log actual completo como texto (respuesta anterior)."),
+):
+    """
+    Por defecto: {archivo: {tamano_bytes, desde_byte, hasta_byte, contenido}}
+    con los últimos tail_kb (FFMPEG_LOG_TAIL_KB) KB de cada log, o desde
+    desde_byte. completo=1: {archivo: texto} con el archivo actual entero
+    (acotado por la rotación del worker).
+    """
+    if desde_byte is not None and not tipo:
+        raise HTTPException(
+            status_code=400,
+            detail="desde_byte requiere tipo (cada log tiene su propio offset)")
+    if completo and (tail_kb is not None or desde_byte is not None):
+        raise HTTPException(
+            status_code=400,
+            detail="completo no se combina con tail_kb ni desde_byte")
 
-    logs_path = "/opt/semefo/logs"
+    tipos = [tipo] if tipo else ["video", "video2"]
     posibles = [
-        f"{logs_path}/ffmpeg_video_{sesion_id}.log",
-        f"{logs_path}/ffmpeg_video2_{sesion_id}.log"
+        f"{FFMPEG_LOG_DIR}/ffmpeg_{t}_{sesion_id}.log" for t in tipos
     ]
 
     contenido = {}
 
     for path in posibles:
-        if os.path.exists(path):
-            with open(path, "r") as f:
+        if not os.path.exists(path):
+            continue
+        if completo:
+            with open(path, "r", errors="replace") as f:
                 contenido[os.path.basename(path)] = f.read()
+        else:
+            contenido[os.path.basename(path)] = _leer_log_parcial(
+                path, tail_kb or FFMPEG_LOG_TAIL_KB, desde_byte)
 
     if not contenido:
         raise HTTPException(
@@ -1096,6 +1180,117 @@ def obtener_ffmpeg_log(sesion_id: int):
     return contenido
 
 
+# ============================================================
+#  FRAGMENTOS POR CÁMARA (índice alimentado por el worker de manifest)
+# ============================================================
+
+def _a_ms(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _rango_ms(desde: datetime, hasta: datetime) -> tuple[int, int]:
+    desde_ms, hasta_ms = _a_ms(desde), _a_ms(hasta)
+    if hasta_ms <= desde_ms:
+        raise HTTPException(
+            status_code=400, detail="'hasta' debe ser posterior a 'desde'")
+    return desde_ms, hasta_ms
+
+
+@app.post("/fragmentos/{camara_mac}")
+def registrar_fragmentos_camara(
+    camara_mac: str,
+    data: dict,
+    db: Session = Depends(get_db),
+    principal=Depends(require_roles("worker", "dashboard_admin")),
+):
+    """
+    Lote de fragmentos nuevos: {"fragmentos": [{inicio_ms, fin_ms, ruta,
+    tamano_bytes}]}. Idempotente por ruta.
+    """
+    fragmentos = data.get("fragmentos") or []
+    insertados = registrar_fragmentos(db, camara_mac, fragmentos)
+    return {"recibidos": len(fragmentos), "insertados": insertados}
+
+
+@app.get("/fragmentos/{camara_mac}")
+def listar_fragmentos_camara(
+    camara_mac: str,
+    desde: datetime = Query(..., description="ISO 8601 (naive = UTC)"),
+    hasta: datetime = Query(..., description="ISO 8601 (naive = UTC)"),
+    db: Session = Depends(get_db),
+):
+    desde_ms, hasta_ms = _rango_ms(desde, hasta)
+    fragmentos = fragmentos_en_rango(db, camara_mac, desde_ms, hasta_ms)
+    return {
+        "camara_mac": camara_mac,
+        "fragmentos": [
+            {
+                "inicio_ms": f.inicio_ms,
+                "fin_ms": f.fin_ms,
+                "ruta": f.ruta,
+                "tamano_bytes": f.tamano_bytes,
+            }
+            for f in fragmentos
+        ],
+    }
+
+
+@app.get("/fragmentos/{camara_mac}/cobertura")
+def cobertura_fragmentos_camara(
+    camara_mac: str,
+    desde: datetime = Query(..., description="ISO 8601 (naive = UTC)"),
+    hasta: datetime = Query(..., description="ISO 8601 (naive = UTC)"),
+    db: Session = Depends(get_db),
+):
+    """Segundos grabados, huecos y traslapes de la cámara entre desde y hasta."""
+    desde_ms, hasta_ms = _rango_ms(desde, hasta)
+    return cobertura_camara(db, camara_mac, desde_ms, hasta_ms)
+
+
+@app.get("/sesiones/{sesion_id}/cobertura")
+def cobertura_sesion_camaras(sesion_id: int, db: Session = Depends(get_db)):
+    """
+    Cobertura grabada vs esperada por cámara (sesión menos pausas),
+    desde el índice fragmentos_camara, o desde el manifest del día si la
+    tabla no tiene filas en la ventana ("fuente" en cada cámara).
+    Permite detectar huecos antes de lanzar la unión.
+    """
+    sesion = db.query(models.Sesion).filter_by(id=sesion_id).first()
+    if not sesion:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    if not sesion.inicio or not sesion.fin:
+        raise HTTPException(
+            status_code=400, detail="La sesión no tiene inicio/fin")
+
+    desde_ms, hasta_ms = _rango_ms(sesion.inicio, sesion.fin)
+    pausas_ms = [
+        (_a_ms(p.inicio), _a_ms(p.fin))
+        for p in db.query(models.LogPausa).filter_by(sesion_id=sesion_id).all()
+    ]
+
+    # Mismo manifest que usa la unión: el del día de inicio de la sesión
+    fecha = sesion.inicio.strftime("%Y/%m/%d")
+
+    camaras = {}
+    for tipo, mac in (("video", sesion.camara1_mac_address),
+                      ("video2", sesion.camara2_mac_address)):
+        if mac:
+            path_manifest = (
+                f"{SMB_ROOT}/manifests/{GRABADOR_UUID}/{mac}/{fecha}/manifest.json")
+            camaras[tipo] = cobertura_camara_sesion(
+                db, mac, desde_ms, hasta_ms, pausas_ms, path_manifest)
+
+    return {
+        "sesion_id": sesion_id,
+        "inicio": sesion.inicio.isoformat(),
+        "fin": sesion.fin.isoformat(),
+        "pausas": len(pausas_ms),
+        "camaras": camaras,
+    }
+
+
 # ============================================================
 #  WHISPER — CORREGIDO: ruta_video ya no es obligatoria
 # ============================================================
@@ -2,8 +2,8 @@
 from datetime import datetime, timezone
 
 from sqlalchemy import (
-    Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float,
-    UniqueConstraint
+    Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey,
+    Float, Index, UniqueConstraint, text
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import INET, JSONB
@@ -44,6 +44,18 @@ class Investigacion(Base):
 class Sesion(Base):
     __tablename__ = "sesiones"
 
+    __table_args__ = (
+        # Orden de /dashboard/sesiones-fallidas (solo no finalizadas)
+        Index(
+            "ix_sesiones_fallidas_orden",
+            text("fecha_error_procesamiento DESC NULLS LAST"),
+            text("fecha DESC"),
+            # Desempate único: páginas estables con fechas repetidas
+            text("id DESC"),
+            postgresql_where=text("estado <> 'finalizada'"),
+        ),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     investigacion_id = Column(Integer, ForeignKey(
         "investigaciones.id"), nullable=False)
@@ -96,6 +108,11 @@ class SesionArchivo(Base):
     __table_args__ = (
         UniqueConstraint("sesion_id", "tipo_archivo",
                          name="uq_sesion_archivo"),
+        # EXISTS / conteo de archivos en error (sesiones fallidas)
+        Index(
+            "ix_sesion_archivos_error", "sesion_id",
+            postgresql_where=text("estado = 'error'"),
+        ),
     )
 
     id = Column(Integer, primary_key=True)
@@ -149,6 +166,16 @@ class Job(Base):
     __table_args__ = (
         # 🔒 UN SOLO JOB por sesión + tipo
         UniqueConstraint("sesion_id", "tipo", name="uq_jobs_sesion_tipo"),
+        # Jobs activos por antigüedad (detectar_pipeline_bloqueado)
+        Index(
+            "ix_jobs_activos_estado_fecha", "estado", "fecha_actualizacion",
+            postgresql_where=text("estado IN ('pendiente', 'procesando')"),
+        ),
+        # EXISTS / conteo de jobs en error (sesiones fallidas)
+        Index(
+            "ix_jobs_error_sesion", "sesion_id",
+            postgresql_where=text("estado = 'error'"),
+        ),
     )
 
     id = Column(Integer, primary_key=True)
@@ -228,6 +255,67 @@ class WhisperMountReport(Base):
     )
 
 
+class FragmentoCamara(Base):
+    """Índice de fragmentos grabados por cámara (ms epoch UTC)."""
+
+    __tablename__ = "fragmentos_camara"
+
+    __table_args__ = (
+        Index("ix_fragmentos_camara_mac_inicio", "camara_mac", "inicio_ms"),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    camara_mac = Column(String(50), nullable=False)
+    inicio_ms = Column(BigInteger, nullable=False)
+    fin_ms = Column(BigInteger, nullable=False)
+    ruta = Column(String(512), nullable=False, unique=True)
+    tamano_bytes = Column(BigInteger, nullable=True)
+    fecha_registro = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+
+# ============================================================
+#  📤 TABLA: Outbox (mensajes al broker en la misma transacción)
+# ============================================================
+class OutboxMensaje(Base):
+    """
+    Mensaje pendiente de publicar. tipo=celery: payload es la firma
+    (chain/chord) serializada; tipo=rabbit: destino es la cola y
+    payload el cuerpo JSON. Lo drena api_server.outbox_dispatcher.
+    """
+
+    __tablename__ = "outbox_mensajes"
+
+    __table_args__ = (
+        Index(
+            "ix_outbox_mensajes_pendientes", "disponible_en",
+            postgresql_where=text("estado = 'pendiente'"),
+        ),
+    )
+
+    id = Column(BigInteger, primary_key=True)
+    tipo = Column(String(20), nullable=False)
+    destino = Column(String(255), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    estado = Column(String(20), nullable=False, default="pendiente")
+    intentos = Column(Integer, nullable=False, default=0)
+    ultimo_error = Column(Text, nullable=True)
+    disponible_en = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    fecha_creacion = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+    fecha_envio = Column(DateTime(timezone=True), nullable=True)
+
+
 # ============================================================
 #  🧱 TABLA: Planchas
 # ============================================================
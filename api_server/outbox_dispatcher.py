@@ -0,0 +1,82 @@
+# ============================================================
+#   SEMEFO — outbox_dispatcher.py
+#   Drena outbox_mensajes hacia RabbitMQ en lotes:
+#     tipo=celery → signature(payload).apply_async() (chains/chords)
+#     tipo=rabbit → basic_publish con confirmación (transcripciones)
+#
+#   Uso (servicio outbox_dispatcher en docker-compose):
+#     python -m api_server.outbox_dispatcher
+# ============================================================
+
+import logging
+import os
+import signal
+import time
+
+from celery import signature
+
+from api_server.database import SessionLocal
+from api_server.utils.outbox import OUTBOX_LOTE, despachar_lote, purgar_enviados
+from api_server.utils.rabbit_publisher import PublicadorRabbit
+from worker.celery_app import celery_app
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("outbox_dispatcher")
+
+OUTBOX_POLL_SEG = float(os.getenv("OUTBOX_POLL_SEG", "1"))
+PURGA_CADA_SEG = 3600
+
+# Publisher confirms también para lo que publica Celery (pyamqp)
+celery_app.conf.broker_transport_options = {
+    **(celery_app.conf.broker_transport_options or {}),
+    "confirm_publish": True,
+}
+
+_detener = False
+
+
+def _senal(*_):
+    global _detener
+    _detener = True
+
+
+def publicar_celery(payload):
+    signature(payload, app=celery_app).apply_async()
+
+
+def main():
+    signal.signal(signal.SIGTERM, _senal)
+    signal.signal(signal.SIGINT, _senal)
+
+    rabbit = PublicadorRabbit()
+    ultima_purga = 0.0
+    logger.info("[OUTBOX] Dispatcher iniciado (lote=%s)", OUTBOX_LOTE)
+
+    while not _detener:
+        db = SessionLocal()
+        try:
+            r = despachar_lote(db, publicar_celery, rabbit.publicar_confirmado)
+            if r["enviados"] or r["fallidos"]:
+                logger.info("[OUTBOX] %s", r)
+
+            if time.monotonic() - ultima_purga > PURGA_CADA_SEG:
+                purgados = purgar_enviados(db)
+                if purgados:
+                    logger.info("[OUTBOX] Purgados %s mensajes enviados", purgados)
+                ultima_purga = time.monotonic()
+        except Exception as e:
+            db.rollback()
+            logger.error("[OUTBOX] Error en lote: %s", e)
+            r = {"enviados": 0, "fallidos": 0}
+        finally:
+            db.close()
+
+        # Lote lleno → seguir sin dormir
+        if r["enviados"] + r["fallidos"] < OUTBOX_LOTE:
+            time.sleep(OUTBOX_POLL_SEG)
+
+    logger.info("[OUTBOX] Dispatcher detenido")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from fastapi import Response, APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import func, distinct, text, case
+from sqlalchemy import func, distinct, text, case, and_, or_, cast, exists, select, Text
 import socket
 import shutil
 import secrets
@@ -14,7 +14,7 @@ from typing import Optional
 
 from api_server.database import get_db
 from api_server.utils.jobs import detectar_pipeline_bloqueado, sesion_tiene_errores_pipeline
-from api_server.utils.sesion_procesamiento import reprocesar_sesion_desde_bd
+from api_server.utils.sesion_procesamiento import estado_carriles_union, reprocesar_sesion_desde_bd
 from api_server.utils.app_sessions import (
     close_app_session,
     close_stale_sessions,
@@ -544,6 +544,7 @@ def infra_estado_dashboard(db: Session = Depends(get_db), principal=Depends(requ
         },
         "grabador": None,
         "wave_mount": None,
+        "carriles_union": None,
     }
 
     # -------------------------------------------------
@@ -635,6 +636,14 @@ def infra_estado_dashboard(db: Session = Depends(get_db), principal=Depends(requ
     if errores_manifest > 0:
         estado["infra_status"] = "warning"
 
+    # -------------------------------------------------
+    # Carriles de uniones (profundidad y espera en cola)
+    # -------------------------------------------------
+    try:
+        estado["carriles_union"] = estado_carriles_union()
+    except Exception:
+        estado["carriles_union"] = None
+
     # -------------------------------------------------
     # Disco MASTER (en vivo)
     # -------------------------------------------------
@@ -1083,6 +1092,33 @@ def _sesion_es_fallida(s: models.Sesion, db: Session) -> bool:
     return sesion_tiene_errores_pipeline(db, s.id)
 
 
+def _condicion_sesion_fallida():
+    """
+    Misma regla que _sesion_es_fallida, en SQL: con payload, no
+    finalizada y (error_procesamiento / estado error / algún job o
+    archivo en error, vía EXISTS).
+    """
+    job_error = exists().where(
+        models.Job.sesion_id == models.Sesion.id,
+        models.Job.estado == "error",
+    )
+    archivo_error = exists().where(
+        models.SesionArchivo.sesion_id == models.Sesion.id,
+        models.SesionArchivo.estado == "error",
+    )
+    return and_(
+        # bool(payload) en Python: NULL, JSON null y {} no cuentan
+        cast(models.Sesion.payload_procesamiento, Text).notin_(("null", "{}")),
+        models.Sesion.estado != "finalizada",
+        or_(
+            func.coalesce(models.Sesion.error_procesamiento, "") != "",
+            models.Sesion.estado == "error",
+            job_error,
+            archivo_error,
+        ),
+    )
+
+
 @router.get("/sesiones-fallidas")
 def listar_sesiones_fallidas(
     page: int = Query(1, ge=1),
@@ -1090,43 +1126,88 @@ def listar_sesiones_fallidas(
     db: Session = Depends(get_db),
     _principal=Depends(require_dashboard_permission("sesiones_fallidas")),
 ):
-    candidatas = (
-        db.query(models.Sesion)
-        .filter(models.Sesion.payload_procesamiento.isnot(None))
-        .filter(models.Sesion.estado != "finalizada")
+    # Conteos solo para las filas de la página (subconsultas correlacionadas)
+    jobs_error = (
+        select(func.count(models.Job.id))
+        .where(
+            models.Job.sesion_id == models.Sesion.id,
+            models.Job.estado == "error",
+        )
+        .scalar_subquery()
+    )
+    archivos_error = (
+        select(func.count(models.SesionArchivo.id))
+        .where(
+            models.SesionArchivo.sesion_id == models.Sesion.id,
+            models.SesionArchivo.estado == "error",
+        )
+        .scalar_subquery()
+    )
+
+    filtro = _condicion_sesion_fallida()
+    offset = (page - 1) * per_page
+
+    filas = (
+        db.query(
+            models.Sesion.id,
+            models.Investigacion.numero_expediente,
+            models.Sesion.nombre_sesion,
+            models.Sesion.plancha_nombre,
+            models.Sesion.usuario_ldap,
+            models.Sesion.user_nombre,
+            models.Sesion.estado,
+            models.Sesion.fecha,
+            models.Sesion.fecha_error_procesamiento,
+            models.Sesion.error_procesamiento,
+            models.Sesion.error_origen,
+            models.Sesion.reintentos_procesamiento,
+            jobs_error.label("jobs_error"),
+            archivos_error.label("archivos_error"),
+            func.count().over().label("total"),
+        )
+        .outerjoin(
+            models.Investigacion,
+            models.Investigacion.id == models.Sesion.investigacion_id,
+        )
+        .filter(filtro)
         .order_by(
             models.Sesion.fecha_error_procesamiento.desc().nullslast(),
             models.Sesion.fecha.desc(),
+            models.Sesion.id.desc(),
         )
+        .offset(offset)
+        .limit(per_page)
         .all()
     )
 
-    fallidas = [s for s in candidatas if _sesion_es_fallida(s, db)]
-    total = len(fallidas)
-    offset = (page - 1) * per_page
-    pagina = fallidas[offset: offset + per_page]
-
-    data = []
-    for s in pagina:
-        jobs_error, archivos_error = _contar_jobs_archivos_error(db, s.id)
-        inv = s.investigacion
-        data.append({
-            "id": s.id,
-            "numero_expediente": inv.numero_expediente if inv else None,
-            "nombre_sesion": s.nombre_sesion,
-            "plancha_nombre": s.plancha_nombre,
-            "usuario_ldap": s.usuario_ldap,
-            "user_nombre": s.user_nombre,
-            "estado": s.estado,
-            "fecha": s.fecha,
-            "fecha_error_procesamiento": s.fecha_error_procesamiento,
-            "error_procesamiento": s.error_procesamiento,
-            "error_origen": s.error_origen,
-            "reintentos_procesamiento": s.reintentos_procesamiento or 0,
-            "tiene_payload": bool(s.payload_procesamiento),
-            "jobs_error": jobs_error,
-            "archivos_error": archivos_error,
-        })
+    if filas:
+        total = filas[0].total
+    elif page > 1:
+        # Página fuera de rango: el total sale de un COUNT aparte
+        total = db.query(func.count(models.Sesion.id)).filter(filtro).scalar()
+    else:
+        total = 0
+
+    data = [
+        {
+            "id": f.id,
+            "numero_expediente": f.numero_expediente,
+            "nombre_sesion": f.nombre_sesion,
+            "plancha_nombre": f.plancha_nombre,
+            "usuario_ldap": f.usuario_ldap,
+            "user_nombre": f.user_nombre,
+            "estado": f.estado,
+            "fecha": f.fecha,
+            "fecha_error_procesamiento": f.fecha_error_procesamiento,
+            "error_procesamiento": f.error_procesamiento,
+            "error_origen": f.error_origen,
+            "reintentos_procesamiento": f.reintentos_procesamiento or 0,
+            "tiene_payload": True,
+            "jobs_error": f.jobs_error,
+            "archivos_error": f.archivos_error,
+        }
+        for f in filas
+    ]
 
     return {
         "meta": {
@@ -51,7 +51,8 @@ class SesionArchivoResponse(BaseModel):
     tipo_archivo: str
     ruta_original: Optional[str]
     ruta_convertida: Optional[str]
-    conversion_completa: bool
+    # Columna nullable: filas antiguas pueden traer NULL
+    conversion_completa: Optional[bool] = False
     estado: str
     mensaje: Optional[str] = None
     fecha: datetime
@@ -128,6 +129,52 @@ class JobUpdate(BaseModel):
     estado: Optional[str] = None
     resultado: Optional[str] = None
     error: Optional[str] = None
+    archivo: Optional[str] = None
+
+
+class JobResponse(BaseModel):
+    id: int
+    investigacion_id: int
+    sesion_id: int
+    tipo: str
+    archivo: str
+    estado: str
+    resultado: Optional[str] = None
+    error: Optional[str] = None
+    fecha_creacion: datetime
+    fecha_actualizacion: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class ProcesoActivoResponse(BaseModel):
+    sesion_id: int
+    expediente: Optional[str] = None
+    estado_sesion: str
+    jobs: List[JobResponse] = []
+    archivos: List[SesionArchivoResponse] = []
+
+
+class SesionJobItem(BaseModel):
+    """Job (o archivo sin job, id=None) con su ruta real en disco/red."""
+    id: Optional[int] = None
+    tipo: str
+    archivo: Optional[str] = None
+    estado: str
+    error: Optional[str] = None
+    fecha_creacion: Optional[datetime] = None
+    fecha_actualizacion: Optional[datetime] = None
+    ruta: Optional[str] = None
+    ruta_red: Optional[str] = None
+    tamano_actual_KB: Optional[float] = None
+
+
+class SesionJobsResponse(BaseModel):
+    sesion_id: int
+    expediente: Optional[str] = None
+    estado_sesion: str
+    nombre_sesion: Optional[str] = None
+    jobs: List[SesionJobItem] = []
 
 
 # ======================================================
@@ -0,0 +1,146 @@
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+
+from api_server import models
+from worker.cobertura import cobertura_sesion
+from worker.manifest_indice import abrir_indice, ruta_indice
+from worker.manifest_journal import fusionar, leer_journal, ruta_journal
+
+# Cota superior de la duración de un fragmento: acota el range scan por
+# (camara_mac, inicio_ms) sin necesitar índice sobre fin_ms.
+FRAGMENTO_MAX_MS = 3600 * 1000
+
+
+def registrar_fragmentos(db: Session, camara_mac: str, fragmentos: list[dict]) -> int:
+    """
+    Inserta fragmentos nuevos; los ya registrados (misma ruta) se ignoran.
+    Retorna cuántos se insertaron.
+    """
+    filas = []
+    for f in fragmentos:
+        try:
+            inicio_ms = int(f["inicio_ms"])
+            fin_ms = int(f["fin_ms"])
+            ruta = str(f["ruta"])[:512]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if fin_ms <= inicio_ms:
+            continue
+        filas.append({
+            "camara_mac": camara_mac,
+            "inicio_ms": inicio_ms,
+            "fin_ms": fin_ms,
+            "ruta": ruta,
+            "tamano_bytes": f.get("tamano_bytes"),
+        })
+
+    if not filas:
+        return 0
+
+    stmt = (
+        insert(models.FragmentoCamara)
+        .values(filas)
+        .on_conflict_do_nothing(index_elements=["ruta"])
+    )
+    resultado = db.execute(stmt)
+    db.commit()
+    return resultado.rowcount or 0
+
+
+def fragmentos_en_rango(db: Session, camara_mac: str, desde_ms: int, hasta_ms: int):
+    """Fragmentos que se traslapan con [desde_ms, hasta_ms], por inicio."""
+    F = models.FragmentoCamara
+    return (
+        db.query(F)
+        .filter(
+            F.camara_mac == camara_mac,
+            F.inicio_ms >= desde_ms - FRAGMENTO_MAX_MS,
+            F.inicio_ms <= hasta_ms,
+            F.fin_ms >= desde_ms,
+        )
+        .order_by(F.inicio_ms.asc())
+        .all()
+    )
+
+
+def cobertura_camara(db: Session, camara_mac: str, desde_ms: int, hasta_ms: int, pausas_ms=()) -> dict:
+    """Cobertura grabada de la cámara en la ventana (menos pausas)."""
+    fragmentos = fragmentos_en_rango(db, camara_mac, desde_ms, hasta_ms)
+    return {
+        "camara_mac": camara_mac,
+        **cobertura_sesion(
+            [(f.inicio_ms, f.fin_ms) for f in fragmentos],
+            desde_ms, hasta_ms, pausas_ms,
+        ),
+    }
+
+
+def _iso_a_ms(iso: str) -> int:
+    dt = datetime.fromisoformat(iso)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def fragmentos_desde_manifest(path_manifest: str, desde_ms: int, hasta_ms: int):
+    """
+    [(inicio_ms, fin_ms)] del manifest de la cámara que se traslapan con
+    la ventana: manifest.idx si existe, si no snapshot + journal (journal
+    primero, misma regla que el worker). None si no hay manifest.
+    """
+    with abrir_indice(ruta_indice(path_manifest)) as indice:
+        if indice is not None and len(indice):
+            desde = datetime.fromtimestamp(desde_ms / 1000, tz=timezone.utc)
+            hasta = datetime.fromtimestamp(hasta_ms / 1000, tz=timezone.utc)
+            return [
+                (_iso_a_ms(f["inicio"]), _iso_a_ms(f["fin"]))
+                for f in indice.rango(desde, hasta)
+            ]
+
+    journal = leer_journal(ruta_journal(path_manifest))
+    try:
+        with open(path_manifest, "r", encoding="utf-8") as f:
+            archivos = json.load(f).get("archivos", [])
+    except (OSError, ValueError):
+        if not journal:
+            return None
+        archivos = []
+
+    fragmentos = []
+    for a in fusionar(archivos, journal):
+        try:
+            ini, fin = _iso_a_ms(a["inicio"]), _iso_a_ms(a["fin"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if fin >= desde_ms and ini <= hasta_ms:
+            fragmentos.append((ini, fin))
+    return fragmentos
+
+
+def cobertura_camara_sesion(db: Session, camara_mac: str, desde_ms: int, hasta_ms: int, pausas_ms, path_manifest: str) -> dict:
+    """
+    Como cobertura_camara, pero si fragmentos_camara no tiene filas en la
+    ventana (publicación apagada o fallida, días previos a la migración)
+    usa el manifest de la cámara. "fuente" indica de dónde salió:
+    fragmentos_camara | manifest | None (ninguno tiene datos).
+    """
+    fragmentos = [
+        (f.inicio_ms, f.fin_ms)
+        for f in fragmentos_en_rango(db, camara_mac, desde_ms, hasta_ms)
+    ]
+    fuente = "fragmentos_camara" if fragmentos else None
+
+    if not fragmentos:
+        desde_manifest = fragmentos_desde_manifest(
+            path_manifest, desde_ms, hasta_ms)
+        if desde_manifest is not None:
+            fragmentos, fuente = desde_manifest, "manifest"
+
+    return {
+        "camara_mac": camara_mac,
+        "fuente": fuente,
+        **cobertura_sesion(fragmentos, desde_ms, hasta_ms, pausas_ms),
+    }
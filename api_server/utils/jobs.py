@@ -1,6 +1,7 @@
 from api_server import models
 from api_server.utils.sesion_estado import asignar_estado_sesion
-from sqlalchemy.orm import Session
+from sqlalchemy import exists
+from sqlalchemy.orm import Session, aliased
 from datetime import datetime, timezone, timedelta
 
 
@@ -139,58 +140,50 @@ def crear_o_resetear_job(
 
 
 def detectar_pipeline_bloqueado(db, minutos=15):
+    """
+    Jobs video/video2 en pendiente/procesando sin avance en `minutos`
+    cuya sesión ya tiene el manifest completado. Una sola consulta
+    sobre jobs activos (índice parcial ix_jobs_activos_estado_fecha);
+    no recorre el histórico de sesiones.
+    """
     limite = datetime.now(timezone.utc) - timedelta(minutes=minutos)
-
-    sesiones_bloqueadas = []
-
-    sesiones = db.query(models.Sesion).all()
-
-    for ses in sesiones:
-        jobs = (
-            db.query(models.Job)
-            .filter(models.Job.sesion_id == ses.id)
-            .all()
+    manifest = aliased(models.Job)
+
+    filas = (
+        db.query(
+            models.Job.sesion_id,
+            models.Job.tipo,
+            models.Job.fecha_actualizacion,
+            models.Investigacion.numero_expediente,
         )
+        .join(models.Sesion, models.Sesion.id == models.Job.sesion_id)
+        .join(
+            models.Investigacion,
+            models.Investigacion.id == models.Sesion.investigacion_id,
+        )
+        .filter(
+            models.Job.estado.in_(("pendiente", "procesando")),
+            models.Job.fecha_actualizacion < limite,
+            models.Job.tipo.in_(("video", "video2")),
+            exists().where(
+                manifest.sesion_id == models.Job.sesion_id,
+                manifest.tipo == "manifest",
+                manifest.estado == "completado",
+            ),
+        )
+        .order_by(models.Job.sesion_id, models.Job.tipo)
+        .all()
+    )
 
-        jobs_por_tipo = {j.tipo: j for j in jobs}
-
-        manifest = jobs_por_tipo.get("manifest")
-        video = jobs_por_tipo.get("video")
-        video2 = jobs_por_tipo.get("video2")
-
-        if not manifest or manifest.estado != "completado":
-            continue
-
-        # Si video existe pero no avanza
-        if video and video.estado in ("pendiente", "procesando"):
-            # Asegurar que ambos datetimes tengan zona horaria para comparar
-            fecha_act = video.fecha_actualizacion
-            if fecha_act.tzinfo is None:
-                fecha_act = fecha_act.replace(tzinfo=timezone.utc)
-
-            if fecha_act < limite:
-                sesiones_bloqueadas.append({
-                    "sesion_id": ses.id,
-                    "expediente": ses.investigacion.numero_expediente,
-                    "bloqueado_en": "video",
-                    "desde": video.fecha_actualizacion
-                })
-
-        if video2 and video2.estado in ("pendiente", "procesando"):
-            # Asegurar que ambos datetimes tengan zona horaria para comparar
-            fecha_act2 = video2.fecha_actualizacion
-            if fecha_act2.tzinfo is None:
-                fecha_act2 = fecha_act2.replace(tzinfo=timezone.utc)
-
-            if fecha_act2 < limite:
-                sesiones_bloqueadas.append({
-                    "sesion_id": ses.id,
-                    "expediente": ses.investigacion.numero_expediente,
-                    "bloqueado_en": "video2",
-                    "desde": video2.fecha_actualizacion
-                })
-
-    return sesiones_bloqueadas
+    return [
+        {
+            "sesion_id": f.sesion_id,
+            "expediente": f.numero_expediente,
+            "bloqueado_en": f.tipo,
+            "desde": f.fecha_actualizacion,
+        }
+        for f in filas
+    ]
 
 
 def crear_job_interno(
@@ -199,7 +192,8 @@ def crear_job_interno(
     numero_expediente: str,
     sesion_id: int,
     tipo: str,
-    archivo: str
+    archivo: str,
+    commit: bool = True,
 ) -> dict:
     """
     Crea o reutiliza un Job de manera interna (sin FastAPI).
@@ -207,6 +201,8 @@ def crear_job_interno(
     Reglas:
     - Un job es único por (sesion_id + tipo)
     - Si existe, se resetea para reintento
+    - commit=False: solo flush (el id queda asignado) para que el
+      llamador confirme jobs + outbox en una sola transacción
     """
 
     # 🔒 Buscar SIEMPRE por sesión + tipo
@@ -222,8 +218,11 @@ def crear_job_interno(
         job_existente.resultado = None
         job_existente.fecha_actualizacion = datetime.now(timezone.utc)
 
-        db.commit()
-        db.refresh(job_existente)
+        if commit:
+            db.commit()
+            db.refresh(job_existente)
+        else:
+            db.flush()
 
         return job_existente.id
 
@@ -250,7 +249,10 @@ def crear_job_interno(
     )
 
     db.add(nuevo)
-    db.commit()
-    db.refresh(nuevo)
+    if commit:
+        db.commit()
+        db.refresh(nuevo)
+    else:
+        db.flush()
 
     return nuevo.id
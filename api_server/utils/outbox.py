@@ -0,0 +1,152 @@
+"""
+Outbox transaccional: los mensajes al broker se guardan en
+outbox_mensajes dentro de la misma transacción que los cambios de
+sesión/jobs, y api_server.outbox_dispatcher los publica en lotes.
+Entrega al menos una vez (un crash entre publicar y marcar puede
+duplicar el mensaje).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from api_server import models
+
+# 1 = la API escribe en outbox_mensajes en lugar de publicar directo
+OUTBOX_HABILITADO = os.getenv("OUTBOX_HABILITADO", "0").strip() in (
+    "1", "true", "True", "yes", "YES")
+OUTBOX_LOTE = int(os.getenv("OUTBOX_LOTE", "100"))
+# Reintento: 2^intentos segundos, con tope
+OUTBOX_BACKOFF_MAX_SEG = int(os.getenv("OUTBOX_BACKOFF_MAX_SEG", "300"))
+# Después de N intentos el mensaje queda en estado error (revisión manual)
+OUTBOX_INTENTOS_MAX = int(os.getenv("OUTBOX_INTENTOS_MAX", "20"))
+OUTBOX_RETENCION_DIAS = int(os.getenv("OUTBOX_RETENCION_DIAS", "7"))
+
+TIPO_CELERY = "celery"
+TIPO_RABBIT = "rabbit"
+
+
+def _now_utc():
+    return datetime.now(timezone.utc)
+
+
+# ============================================================
+#  ESCRITURA (dentro de la transacción del request; sin commit)
+# ============================================================
+
+def encolar_celery(db: Session, firma, destino: str = "") -> None:
+    """firma: Signature / chain / chord de Celery (se guarda como dict)."""
+    payload = json.loads(json.dumps(firma))
+    db.add(models.OutboxMensaje(
+        tipo=TIPO_CELERY,
+        destino=destino or payload.get("task") or "celery",
+        payload=payload,
+        estado="pendiente",
+        intentos=0,
+    ))
+
+
+def encolar_rabbit(db: Session, cola: str, payload: dict[str, Any]) -> None:
+    db.add(models.OutboxMensaje(
+        tipo=TIPO_RABBIT,
+        destino=cola,
+        payload=payload,
+        estado="pendiente",
+        intentos=0,
+    ))
+
+
+# ============================================================
+#  DESPACHO (proceso outbox_dispatcher)
+# ============================================================
+
+def despachar_lote(
+    db: Session,
+    publicar_celery: Callable[[dict], None],
+    publicar_rabbit: Callable[[str, dict], None],
+    lote: int = OUTBOX_LOTE,
+) -> dict[str, int]:
+    """
+    Toma hasta `lote` pendientes (FOR UPDATE SKIP LOCKED: se pueden
+    correr varios dispatchers), los publica en orden de id y hace un
+    solo commit. Retorna conteo enviados/fallidos.
+    """
+    ahora = _now_utc()
+    mensajes = (
+        db.query(models.OutboxMensaje)
+        .filter(
+            models.OutboxMensaje.estado == "pendiente",
+            models.OutboxMensaje.disponible_en <= ahora,
+        )
+        .order_by(models.OutboxMensaje.id.asc())
+        .limit(lote)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    enviados = fallidos = 0
+    for m in mensajes:
+        try:
+            if m.tipo == TIPO_CELERY:
+                publicar_celery(m.payload)
+            elif m.tipo == TIPO_RABBIT:
+                publicar_rabbit(m.destino, m.payload)
+            else:
+                raise ValueError(f"Tipo de outbox desconocido: {m.tipo}")
+
+            m.estado = "enviado"
+            m.fecha_envio = _now_utc()
+            m.ultimo_error = None
+            enviados += 1
+        except Exception as e:
+            m.intentos = (m.intentos or 0) + 1
+            m.ultimo_error = f"{type(e).__name__}: {e}"[:4000]
+            if m.intentos >= OUTBOX_INTENTOS_MAX:
+                m.estado = "error"
+            else:
+                espera = min(2 ** m.intentos, OUTBOX_BACKOFF_MAX_SEG)
+                m.disponible_en = _now_utc() + timedelta(seconds=espera)
+            fallidos += 1
+
+    db.commit()
+    return {"enviados": enviados, "fallidos": fallidos}
+
+
+def purgar_enviados(db: Session, dias: int = OUTBOX_RETENCION_DIAS) -> int:
+    limite = _now_utc() - timedelta(days=dias)
+    n = (
+        db.query(models.OutboxMensaje)
+        .filter(
+            models.OutboxMensaje.estado == "enviado",
+            models.OutboxMensaje.fecha_envio < limite,
+        )
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return n
+
+
+def estado_outbox(db: Session) -> dict[str, Any]:
+    conteo = dict(
+        db.query(models.OutboxMensaje.estado, func.count(models.OutboxMensaje.id))
+        .group_by(models.OutboxMensaje.estado)
+        .all()
+    )
+    mas_antiguo = (
+        db.query(func.min(models.OutboxMensaje.fecha_creacion))
+        .filter(models.OutboxMensaje.estado == "pendiente")
+        .scalar()
+    )
+    return {
+        "habilitado": OUTBOX_HABILITADO,
+        "pendientes": conteo.get("pendiente", 0),
+        "enviados": conteo.get("enviado", 0),
+        "errores": conteo.get("error", 0),
+        "pendiente_mas_antiguo": mas_antiguo,
+    }
@@ -0,0 +1,275 @@
+"""
+Publicador RabbitMQ persistente de la API (cola transcripciones).
+
+Una sola conexión/canal pika en un hilo de fondo, con publisher
+confirms. Las rutas HTTP dejan el mensaje en un buffer en memoria
+acotado y retornan de inmediato; el hilo lo publica, espera el ack del
+broker y reintenta/reconecta con backoff.
+
+Un mensaje que falla RABBIT_INTENTOS_MAX veces seguidas se manda a
+"<cola>.muertos" (si se puede) y se descarta, para no bloquear a los
+que vienen detrás.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+RABBITMQ_USER = os.getenv("RABBITMQ_USER")
+RABBITMQ_PASS = os.getenv("RABBITMQ_PASS")
+RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "rabbitmq")
+RABBITMQ_PORT = int(os.getenv("RABBITMQ_PORT", "5672"))
+
+# Mensajes pendientes máximos en memoria (put falla si se llena)
+RABBIT_OUTBOX_MAX = int(os.getenv("RABBIT_OUTBOX_MAX", "1000"))
+# Backoff de reconexión: 1s, 2s, 4s ... hasta este tope
+RABBIT_RECONEXION_MAX_SEG = float(os.getenv("RABBIT_RECONEXION_MAX_SEG", "30"))
+RABBIT_HEARTBEAT_SEG = int(os.getenv("RABBIT_HEARTBEAT_SEG", "60"))
+# Intentos por mensaje antes de mandarlo a "<cola>.muertos"
+RABBIT_INTENTOS_MAX = max(1, int(os.getenv("RABBIT_INTENTOS_MAX", "5")))
+SUFIJO_MUERTOS = ".muertos"
+
+# Cada cuánto el hilo atiende heartbeats si no hay mensajes
+_ESPERA_COLA_SEG = 5.0
+
+
+class PublicadorRabbit:
+    """
+    publicar() → buffer (put_nowait); el hilo drena con confirmación
+    del broker. Un mensaje cuenta como publicado solo cuando el broker
+    lo confirma; la durabilidad la dan los reintentos del hilo y el
+    dead-letter (o el outbox). publicar_confirmado() es la vía síncrona.
+    """
+
+    def __init__(self, maximo: int = RABBIT_OUTBOX_MAX):
+        self._buffer: queue.Queue = queue.Queue(maxsize=maximo)
+        self._lock = threading.Lock()
+        self._hilo: threading.Thread | None = None
+        self._detener = threading.Event()
+
+        self._conexion = None
+        self._canal = None
+        self._declaradas: set[str] = set()
+        # Mensaje sacado del buffer y aún sin confirmar por el broker
+        self._en_curso: tuple[str, str] | None = None
+        self._intentos_en_curso = 0
+
+        self.publicados = 0
+        self.reintentos = 0
+        self.descartados = 0
+        self.ultimo_error: str | None = None
+        self.ultima_publicacion: float | None = None
+
+    # --------------------------------------------------------
+    #   API
+    # --------------------------------------------------------
+
+    def publicar(self, cola: str, payload: dict[str, Any]) -> None:
+        """
+        Deja el mensaje en el buffer y retorna sin esperar al broker.
+        RuntimeError solo si faltan credenciales o el buffer está lleno.
+        """
+        if not RABBITMQ_USER or not RABBITMQ_PASS:
+            raise RuntimeError("RabbitMQ credentials no configuradas")
+
+        self._asegurar_hilo()
+        try:
+            self._buffer.put_nowait((cola, json.dumps(payload)))
+        except queue.Full:
+            raise RuntimeError(
+                f"Buffer RabbitMQ lleno ({self._buffer.maxsize} pendientes)"
+            ) from None
+
+    def publicar_confirmado(self, cola: str, payload: dict[str, Any]) -> None:
+        """
+        Publica en el hilo que llama y espera el ack del broker (sin
+        buffer). Para procesos de un solo hilo como el dispatcher del
+        outbox; no mezclar con publicar() en la misma instancia.
+        """
+        if not RABBITMQ_USER or not RABBITMQ_PASS:
+            raise RuntimeError("RabbitMQ credentials no configuradas")
+
+        try:
+            if self._conexion is None or not self._conexion.is_open:
+                self._conectar()
+            self._enviar(cola, json.dumps(payload))
+        except Exception as e:
+            self.ultimo_error = f"{type(e).__name__}: {e}"
+            self._cerrar()
+            raise
+        self.publicados += 1
+        self.ultima_publicacion = time.time()
+
+    def estado(self) -> dict[str, Any]:
+        return {
+            "conectado": bool(self._conexion and self._conexion.is_open),
+            "hilo_activo": bool(self._hilo and self._hilo.is_alive()),
+            "pendientes": self._buffer.qsize() + (1 if self._en_curso else 0),
+            "capacidad": self._buffer.maxsize,
+            "publicados": self.publicados,
+            "reintentos": self.reintentos,
+            "descartados": self.descartados,
+            "intentos_en_curso": self._intentos_en_curso,
+            "ultimo_error": self.ultimo_error,
+            "ultima_publicacion": self.ultima_publicacion,
+        }
+
+    def detener(self, timeout: float = 10.0) -> None:
+        """Shutdown: intenta vaciar el buffer antes de cerrar."""
+        limite = time.monotonic() + timeout
+        while (
+            (not self._buffer.empty() or self._en_curso)
+            and time.monotonic() < limite
+        ):
+            if not (self._hilo and self._hilo.is_alive()):
+                break
+            time.sleep(0.1)
+
+        self._detener.set()
+        try:
+            self._buffer.put_nowait(None)  # despierta al hilo en get()
+        except queue.Full:
+            pass
+        if self._hilo:
+            self._hilo.join(max(0.0, limite - time.monotonic()))
+
+        pendientes = self.estado()["pendientes"]
+        if pendientes:
+            logger.warning(
+                "[RABBIT] Cerrando con %s mensajes sin publicar", pendientes)
+
+    # --------------------------------------------------------
+    #   HILO DE FONDO
+    # --------------------------------------------------------
+
+    def _asegurar_hilo(self) -> None:
+        # Arranque perezoso: el hilo nace en el proceso que sirve (post-fork)
+        with self._lock:
+            if self._hilo and self._hilo.is_alive():
+                return
+            self._detener.clear()
+            self._hilo = threading.Thread(
+                target=self._bucle, name="publicador-rabbit", daemon=True)
+            self._hilo.start()
+
+    def _conectar(self) -> None:
+        import pika
+
+        self._conexion = pika.BlockingConnection(
+            pika.ConnectionParameters(
+                host=RABBITMQ_HOST,
+                port=RABBITMQ_PORT,
+                virtual_host="/",
+                credentials=pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS),
+                heartbeat=RABBIT_HEARTBEAT_SEG,
+                blocked_connection_timeout=30,
+            )
+        )
+        self._canal = self._conexion.channel()
+        self._canal.confirm_delivery()
+        self._declaradas = set()
+        logger.info("[RABBIT] Conectado a %s:%s", RABBITMQ_HOST, RABBITMQ_PORT)
+
+    def _cerrar(self) -> None:
+        try:
+            if self._conexion and self._conexion.is_open:
+                self._conexion.close()
+        except Exception:
+            pass
+        self._conexion = None
+        self._canal = None
+
+    def _enviar(self, cola: str, cuerpo: str) -> None:
+        import pika
+
+        if cola not in self._declaradas:
+            self._canal.queue_declare(queue=cola, durable=True)
+            self._declaradas.add(cola)
+
+        # Con confirm_delivery, basic_publish bloquea hasta el ack y
+        # lanza NackError / UnroutableError si el broker no lo acepta
+        self._canal.basic_publish(
+            exchange="",
+            routing_key=cola,
+            body=cuerpo,
+            properties=pika.BasicProperties(delivery_mode=2),
+            mandatory=True,
+        )
+
+    def _bucle(self) -> None:
+        espera = 1.0
+
+        while not self._detener.is_set():
+            try:
+                if self._conexion is None or not self._conexion.is_open:
+                    self._conectar()
+                    espera = 1.0
+
+                if self._en_curso is None:
+                    try:
+                        item = self._buffer.get(timeout=_ESPERA_COLA_SEG)
+                    except queue.Empty:
+                        self._conexion.process_data_events(time_limit=0)
+                        continue
+                    # None = despertar de detener()
+                    if item is None:
+                        continue
+                    self._en_curso = item
+                    self._intentos_en_curso = 0
+
+                cola, cuerpo = self._en_curso
+                self._intentos_en_curso += 1
+                self._enviar(cola, cuerpo)
+                self._en_curso = None
+                self._intentos_en_curso = 0
+                self.publicados += 1
+                self.ultima_publicacion = time.time()
+
+            except Exception as e:
+                # El mensaje en curso se conserva y se reintenta tras
+                # reconectar, hasta RABBIT_INTENTOS_MAX
+                self.ultimo_error = f"{type(e).__name__}: {e}"
+                self.reintentos += 1
+                logger.warning(
+                    "[RABBIT] Error publicando (%s); reconexión en %.0fs",
+                    self.ultimo_error,
+                    espera,
+                )
+                self._cerrar()
+                if self._en_curso and self._intentos_en_curso >= RABBIT_INTENTOS_MAX:
+                    self._descartar_en_curso()
+                self._detener.wait(espera)
+                espera = min(espera * 2, RABBIT_RECONEXION_MAX_SEG)
+
+        self._cerrar()
+
+    def _descartar_en_curso(self) -> None:
+        """Dead-letter del mensaje en curso: <cola>.muertos o, si falla, al log."""
+        cola, cuerpo = self._en_curso
+        self._en_curso = None
+        self._intentos_en_curso = 0
+        self.descartados += 1
+
+        destino = f"{cola}{SUFIJO_MUERTOS}"
+        try:
+            self._conectar()
+            self._enviar(destino, cuerpo)
+            logger.error(
+                "[RABBIT] Mensaje enviado a %s tras %s intentos: %s",
+                destino, RABBIT_INTENTOS_MAX, cuerpo)
+        except Exception as e:
+            self._cerrar()
+            logger.error(
+                "[RABBIT] Mensaje descartado tras %s intentos (%s no disponible: %s): %s",
+                RABBIT_INTENTOS_MAX, destino, e, cuerpo)
+
+
+publicador_rabbit = PublicadorRabbit()
@@ -5,18 +5,25 @@
 import os
 from datetime import datetime, timezone
 
-from celery import chain
+from celery import chain, chord
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
 
 from api_server import models
 from api_server.utils.jobs import crear_job_interno, limpiar_error_procesamiento
+from api_server.utils.outbox import OUTBOX_HABILITADO, encolar_celery
 from api_server.utils.rutas import parse_hhmmss_to_seconds
 from api_server.utils.sesion_estado import asignar_estado_sesion, validar_estado_sesion
+from worker.carriles import carril_union, duracion_valida_seg, estado_carriles, profundidad_colas
 from worker.celery_app import celery_app
+from worker.perfiles import PERFILES_CODIFICACION, perfil_valido
 
 GRABADOR_UUID = os.getenv("WINDOWS_WAVE_UUID", "").strip()
 
+# 1 = ambas cámaras en una sola tarea unir_sesion (chord tras los 2 manifests)
+UNION_SESION_COMBINADA = os.getenv("UNION_SESION_COMBINADA", "0").strip() in (
+    "1", "true", "True", "yes", "YES")
+
 
 def _now_utc():
     return datetime.now(timezone.utc)
@@ -28,6 +35,17 @@ def _normalizar_job_id(result):
     return result
 
 
+def estado_carriles_union() -> dict:
+    """Profundidad de colas (broker) + esperas registradas por el worker."""
+    try:
+        with celery_app.connection_for_read() as conexion:
+            profundidad = profundidad_colas(conexion)
+    except Exception as e:
+        print(f"[CARRIL] No se pudo consultar RabbitMQ: {e}")
+        profundidad = None
+    return estado_carriles(profundidad)
+
+
 def _buscar_investigacion(db: Session, expediente) -> models.Investigacion | None:
     """Resuelve investigación por número de expediente o id (legacy app)."""
     if expediente is None or expediente == "":
@@ -142,6 +160,18 @@ def ejecutar_procesamiento_sesion(
     if not cam1 or not cam2:
         raise HTTPException(status_code=400, detail="Faltan MAC addresses")
 
+    # Perfil de codificación opcional por sesión (worker/perfiles.py);
+    # se valida aquí para no fallar en el worker después del manifest
+    perfil_video = (ses.get("perfil_video") or "").strip() or None
+    if perfil_video and not perfil_valido(perfil_video):
+        raise HTTPException(
+            status_code=400,
+            detail=(
+                f"perfil_video desconocido: {perfil_video} "
+                f"(válidos: auto, {', '.join(PERFILES_CODIFICACION)})"
+            ),
+        )
+
     try:
         inicio_iso = ses["inicio"]
         fin_iso = ses["fin"]
@@ -246,6 +276,7 @@ def ejecutar_procesamiento_sesion(
         sesion_id=id_sesion,
         tipo="manifest",
         archivo=f"manifests/{GRABADOR_UUID}/{cam1}/{yyyy}/{mm}/{dd}/manifest.json",
+        commit=not OUTBOX_HABILITADO,
     ))
     if not job_manifest1:
         raise HTTPException(
@@ -259,6 +290,7 @@ def ejecutar_procesamiento_sesion(
         sesion_id=id_sesion,
         tipo="manifest",
         archivo=f"manifests/{GRABADOR_UUID}/{cam2}/{yyyy}/{mm}/{dd}/manifest.json",
+        commit=not OUTBOX_HABILITADO,
     ))
     if not job_manifest2:
         raise HTTPException(
@@ -266,45 +298,98 @@ def ejecutar_procesamiento_sesion(
             detail="No se pudo registrar job de manifest para cámara 2",
         )
 
-    chain(
-        celery_app.signature(
-            "tasks.generar_manifest",
-            args=[cam1, fecha_solo, job_manifest1],
-            immutable=True,
-        ),
-        celery_app.signature(
-            "worker.tasks.unir_video",
-            args=[
-                numero_expediente,
-                nombre_carpeta,
-                id_sesion,
-                path_manifest1,
-                inicio_iso,
-                fin_iso,
-            ],
-            immutable=True,
-        ),
-    ).apply_async()
-
-    chain(
-        celery_app.signature(
-            "tasks.generar_manifest",
-            args=[cam2, fecha_solo, job_manifest2],
-            immutable=True,
-        ),
-        celery_app.signature(
-            "worker.tasks.unir_video2",
-            args=[
-                numero_expediente,
-                nombre_carpeta,
-                id_sesion,
-                path_manifest2,
-                inicio_iso,
-                fin_iso,
-            ],
-            immutable=True,
-        ),
-    ).apply_async()
+    # En el chord combinado los manifests no lanzan: ver unir_sesion
+    manifest_kwargs = {"tolerante": True} if UNION_SESION_COMBINADA else {}
+    manifest1 = celery_app.signature(
+        "tasks.generar_manifest",
+        args=[cam1, fecha_solo, job_manifest1, fin_iso],
+        kwargs=manifest_kwargs,
+        immutable=True,
+    )
+    manifest2 = celery_app.signature(
+        "tasks.generar_manifest",
+        args=[cam2, fecha_solo, job_manifest2, fin_iso],
+        kwargs=manifest_kwargs,
+        immutable=True,
+    )
+
+    # Carril corto/largo + prioridad por duración válida (SJF)
+    try:
+        duracion_valida = duracion_valida_seg(inicio_dt, fin_dt, pausas)
+    except Exception as e:
+        print(f"[CARRIL] Sesión {id_sesion}: no se pudo estimar duración: {e}")
+        duracion_valida = (fin_dt - inicio_dt).total_seconds()
+    carril = carril_union(duracion_valida)
+    print(
+        f"[CARRIL] Sesión {id_sesion}: {duracion_valida:.0f}s válidos → "
+        f"{carril['queue']} (prioridad {carril['priority']})"
+    )
+
+    if UNION_SESION_COMBINADA:
+        # Ambos manifests en paralelo → una sola unión (video + video2).
+        # Manifests tolerantes: un error retorna {"error"} en vez de
+        # romper el chord, y unir_sesion (no inmutable: recibe la lista
+        # de resultados) une solo la cámara que sí tiene manifest.
+        lanzamientos = [chord(
+            [manifest1, manifest2],
+            celery_app.signature(
+                "worker.tasks.unir_sesion",
+                args=[
+                    numero_expediente,
+                    nombre_carpeta,
+                    id_sesion,
+                    path_manifest1,
+                    path_manifest2,
+                    inicio_iso,
+                    fin_iso,
+                ],
+                kwargs={"perfil": perfil_video},
+                **carril,
+            ),
+        )]
+    else:
+        lanzamientos = [chain(
+            manifest1,
+            celery_app.signature(
+                "worker.tasks.unir_video",
+                args=[
+                    numero_expediente,
+                    nombre_carpeta,
+                    id_sesion,
+                    path_manifest1,
+                    inicio_iso,
+                    fin_iso,
+                ],
+                kwargs={"perfil": perfil_video},
+                immutable=True,
+                **carril,
+            ),
+        ), chain(
+            manifest2,
+            celery_app.signature(
+                "worker.tasks.unir_video2",
+                args=[
+                    numero_expediente,
+                    nombre_carpeta,
+                    id_sesion,
+                    path_manifest2,
+                    inicio_iso,
+                    fin_iso,
+                ],
+                kwargs={"perfil": perfil_video},
+                immutable=True,
+                **carril,
+            ),
+        )]
+
+    if OUTBOX_HABILITADO:
+        # Jobs + mensajes en la misma transacción; outbox_dispatcher publica
+        for firma in lanzamientos:
+            encolar_celery(db, firma, destino=f"sesion:{id_sesion}")
+        db.commit()
+    else:
+        for firma in lanzamientos:
+            firma.apply_async()
 
     return {
         "status": "procesando",
@@ -317,6 +402,8 @@ def ejecutar_procesamiento_sesion(
         "pausas_app_registradas": pausas_registradas,
         "manifest1": path_manifest1,
         "manifest2": path_manifest2,
+        "carril_union": carril["queue"],
+        "prioridad_union": carril["priority"],
         "reintento": es_reintento,
     }
 
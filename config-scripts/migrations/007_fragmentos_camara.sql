@@ -0,0 +1,15 @@
+-- Índice de fragmentos por cámara (rango por inicio/fin en ms epoch).
+-- Lo alimenta el worker de manifest; lo consultan la unión y /fragmentos/{mac}/cobertura.
+
+CREATE TABLE IF NOT EXISTS fragmentos_camara (
+    id BIGSERIAL PRIMARY KEY,
+    camara_mac VARCHAR(50) NOT NULL,
+    inicio_ms BIGINT NOT NULL,
+    fin_ms BIGINT NOT NULL,
+    ruta VARCHAR(512) NOT NULL UNIQUE,
+    tamano_bytes BIGINT,
+    fecha_registro TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_fragmentos_camara_mac_inicio
+    ON fragmentos_camara (camara_mac, inicio_ms);
@@ -0,0 +1,19 @@
+-- Outbox transaccional: chains Celery y mensajes Whisper se escriben en la
+-- misma transacción que sesión/jobs; api_server.outbox_dispatcher los publica.
+
+CREATE TABLE IF NOT EXISTS outbox_mensajes (
+    id BIGSERIAL PRIMARY KEY,
+    tipo VARCHAR(20) NOT NULL,
+    destino VARCHAR(255) NOT NULL,
+    payload JSONB NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    ultimo_error TEXT,
+    disponible_en TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    fecha_creacion TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    fecha_envio TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_outbox_mensajes_pendientes
+    ON outbox_mensajes (disponible_en)
+    WHERE estado = 'pendiente';
@@ -0,0 +1,7 @@
+-- Índice parcial para detectar_pipeline_bloqueado (/dashboard/infraestructura):
+-- solo jobs activos, ordenados por última actualización.
+-- (sesion_id, tipo) ya está indexado por uq_jobs_sesion_tipo.
+
+CREATE INDEX IF NOT EXISTS ix_jobs_activos_estado_fecha
+    ON jobs (estado, fecha_actualizacion)
+    WHERE estado IN ('pendiente', 'procesando');
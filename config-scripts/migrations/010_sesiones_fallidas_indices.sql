@@ -0,0 +1,16 @@
+-- Índices para /dashboard/sesiones-fallidas (filtro y paginación en SQL).
+-- Orden del listado sobre sesiones no finalizadas (id como desempate
+-- único, para que OFFSET/LIMIT no repita ni salte filas con fechas
+-- iguales) y EXISTS / conteos de jobs y archivos en error por sesión.
+
+CREATE INDEX IF NOT EXISTS ix_sesiones_fallidas_orden
+    ON sesiones (fecha_error_procesamiento DESC NULLS LAST, fecha DESC, id DESC)
+    WHERE estado <> 'finalizada';
+
+CREATE INDEX IF NOT EXISTS ix_jobs_error_sesion
+    ON jobs (sesion_id)
+    WHERE estado = 'error';
+
+CREATE INDEX IF NOT EXISTS ix_sesion_archivos_error
+    ON sesion_archivos (sesion_id)
+    WHERE estado = 'error';
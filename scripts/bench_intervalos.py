@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# ============================================================
+#   SEMEFO — bench_intervalos.py
+#   Micro-benchmark del cruce intervalos válidos × fragmentos:
+#   cruce anidado original vs worker.intervalos (python y numpy),
+#   10k fragmentos × 500 pausas. Las propiedades (mismos cortes,
+#   casos borde) están en tests/test_intervalos.py.
+#
+#   Uso:
+#     PYTHONPATH=/app python scripts/bench_intervalos.py [frags=10000] [pausas=500]
+# ============================================================
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from worker.cobertura import intervalos_validos_ms
+from worker.intervalos import calcular_cortes, np
+
+BASE = datetime(2025, 12, 2, tzinfo=timezone.utc)
+BASE_MS = round(BASE.timestamp() * 1000)
+
+
+# ============================================================
+#   IMPLEMENTACIÓN DE REFERENCIA (cruce anidado original)
+# ============================================================
+
+def referencia_intervalos(inicio, fin, pausas):
+    pausas = sorted(pausas, key=lambda x: x["inicio"])
+    intervalos = []
+    cursor = inicio
+    for p in pausas:
+        if p["fin"] <= cursor:
+            continue
+        if p["inicio"] > cursor:
+            intervalos.append({"ini": cursor, "fin": p["inicio"]})
+        cursor = max(cursor, p["fin"])
+    if cursor < fin:
+        intervalos.append({"ini": cursor, "fin": fin})
+    return intervalos
+
+
+def referencia_segmentos(frags, intervalos):
+    segmentos = []
+    for intervalo in intervalos:
+        for f in frags:
+            if f["_dt_fin"] <= intervalo["ini"] or f["_dt_ini"] >= intervalo["fin"]:
+                continue
+            duracion_frag = (f["_dt_fin"] - f["_dt_ini"]).total_seconds()
+            ini = max(0, (intervalo["ini"] - f["_dt_ini"]).total_seconds())
+            fin_ = min(
+                (intervalo["fin"] - f["_dt_ini"]).total_seconds(),
+                duracion_frag
+            )
+            if fin_ <= ini:
+                continue
+            segmentos.append({
+                "ruta": f["ruta"],
+                "ini": ini,
+                "fin": fin_,
+                "completo": ini == 0 and fin_ == duracion_frag,
+            })
+    return segmentos
+
+
+# ============================================================
+#   GENERADORES
+# ============================================================
+
+def _dt(ms):
+    return BASE + timedelta(milliseconds=ms)
+
+
+def generar_caso(n_frags, n_pausas, traslape=True):
+    """Fragmentos ~76 s con huecos y traslapes ocasionales; pausas aleatorias."""
+    frags = []
+    t = 0
+    for k in range(n_frags):
+        dur = random.randint(60_000, 90_000)
+        if traslape and random.random() < 0.05:
+            t -= random.randint(1, 5_000)
+        elif random.random() < 0.05:
+            t += random.randint(1, 120_000)
+        frags.append((t, t + dur, f"/x/{k}.mkv"))
+        t += dur
+    frags.sort()
+
+    total = max(t, 1)
+    inicio = random.randint(-60_000, total // 4)
+    fin = random.randint(inicio + 1, total + 60_000)
+
+    pausas = []
+    for _ in range(n_pausas):
+        a = random.randint(inicio - 30_000, fin)
+        pausas.append((a, a + random.randint(1, 120_000)))
+    return frags, inicio, fin, pausas
+
+
+def segmentos_motor(frags, inicio, fin, pausas, usar_numpy):
+    validos = intervalos_validos_ms(inicio, fin, pausas)
+    cortes = calcular_cortes(
+        [f[0] for f in frags], [f[1] for f in frags],
+        [v[0] for v in validos], [v[1] for v in validos],
+        usar_numpy=usar_numpy,
+    )
+    return [
+        {
+            "ruta": frags[i][2],
+            "ini": a / 1000,
+            "fin": b / 1000,
+            "completo": a == 0 and b == frags[i][1] - frags[i][0],
+        }
+        for i, a, b in cortes
+    ]
+
+
+def segmentos_referencia(frags, inicio, fin, pausas):
+    frags_dt = [
+        {"_dt_ini": _dt(a), "_dt_fin": _dt(b), "ruta": r} for a, b, r in frags
+    ]
+    intervalos = referencia_intervalos(
+        _dt(inicio), _dt(fin),
+        [{"inicio": _dt(a), "fin": _dt(b)} for a, b in pausas],
+    )
+    return referencia_segmentos(frags_dt, intervalos)
+
+
+# ============================================================
+#   MAIN
+# ============================================================
+
+def medir(nombre, func):
+    t0 = time.perf_counter()
+    r = func()
+    seg = time.perf_counter() - t0
+    print(f"{nombre:<22} {seg * 1000:10.1f} ms  segmentos={len(r)}")
+    return seg
+
+
+def main():
+    n_frags = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    n_pausas = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    random.seed(20251202)
+    frags, _, _, _ = generar_caso(n_frags, 0)
+    inicio, fin = frags[0][0], frags[-1][1]
+    pausas = []
+    for _ in range(n_pausas):
+        a = random.randint(inicio, fin)
+        pausas.append((a, a + random.randint(1_000, 60_000)))
+
+    print(f"Benchmark: {n_frags} fragmentos × {n_pausas} pausas")
+    ref = medir("referencia (anidado)",
+                lambda: segmentos_referencia(frags, inicio, fin, pausas))
+    py = medir("motor python",
+               lambda: segmentos_motor(frags, inicio, fin, pausas, False))
+    print(f"  speedup python: {ref / py:.1f}x")
+    if np is not None:
+        nump = medir("motor numpy",
+                     lambda: segmentos_motor(frags, inicio, fin, pausas, True))
+        print(f"  speedup numpy:  {ref / nump:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# ============================================================
+#   SEMEFO — bench_manifest_probe.py
+#   Mide el indexado de un día nuevo: ffprobe serial vs pool
+#   (MANIFEST_PROBE_WORKERS) vs cache de duraciones caliente,
+#   sobre un directorio sintético de MKV pequeños.
+#
+#   Uso (dentro de celery_manifest):
+#     PYTHONPATH=/app python scripts/bench_manifest_probe.py \
+#         [n_fragmentos=300] [workers=8] [dir_existente]
+# ============================================================
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from glob import glob
+
+# Cache aislado: no tocar el SQLite de producción
+_CACHE_DIR = tempfile.mkdtemp(prefix="bench_duraciones_")
+os.environ["DURACIONES_CACHE_PATH"] = os.path.join(_CACHE_DIR, "d.sqlite")
+
+from worker import duraciones_cache  # noqa: E402
+from worker.manifest_builder import EXT_FRAGMENTO, probar_fragmentos  # noqa: E402
+
+
+def generar_fragmentos(destino, n, dur_seg=2):
+    """
+    Un MKV base (testsrc) copiado n veces con nombres estilo grabador
+    <epoch_ms>_<dur_ms>.mkv en subcarpetas por hora.
+    """
+    base = os.path.join(destino, "base.mkv")
+    subprocess.run(
+        [
+            "ffmpeg", "-y", "-v", "error", "-f", "lavfi",
+            "-i", f"testsrc=size=320x240:rate=10:duration={dur_seg}",
+            "-c:v", "libx264", "-preset", "ultrafast", base
+        ],
+        check=True
+    )
+
+    ts = 1764662554731
+    for i in range(n):
+        hora = os.path.join(destino, f"{(i // 60):02d}")
+        os.makedirs(hora, exist_ok=True)
+        shutil.copy(base, os.path.join(
+            hora, f"{ts + i * dur_seg * 1000}_{dur_seg * 1000}.mkv"))
+    os.remove(base)
+
+
+def _vaciar_cache():
+    conn = duraciones_cache._conexion()
+    conn.execute("DELETE FROM duraciones")
+    conn.commit()
+
+
+def medir(nombre, fragmentos, workers):
+    t0 = time.monotonic()
+    resultados = probar_fragmentos(fragmentos, max_workers=workers)
+    seg = time.monotonic() - t0
+    validos = sum(1 for r in resultados.values() if r[0] is not None)
+    print(
+        f"{nombre:<14} workers={workers:<3} {seg:7.2f}s  "
+        f"{len(fragmentos) / seg:8.1f} frag/s  validos={validos}"
+    )
+    return seg
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    directorio = sys.argv[3] if len(sys.argv) > 3 else None
+
+    trabajo = None
+    if not directorio:
+        trabajo = tempfile.mkdtemp(prefix="bench_manifest_")
+        directorio = trabajo
+        print(f"Generando {n} fragmentos en {directorio} ...")
+        generar_fragmentos(directorio, n)
+
+    try:
+        fragmentos = sorted(glob(os.path.join(directorio, "*", EXT_FRAGMENTO)))
+        print(f"Fragmentos: {len(fragmentos)}")
+
+        _vaciar_cache()
+        serial = medir("serial", fragmentos, 1)
+
+        _vaciar_cache()
+        pool = medir("pool", fragmentos, workers)
+
+        # Segunda sesión en la misma cámara/día: todo sale del cache
+        cache = medir("cache", fragmentos, workers)
+
+        print(f"\nSpeedup pool:  {serial / pool:.2f}x")
+        print(f"Speedup cache: {serial / cache:.2f}x")
+    finally:
+        if trabajo:
+            shutil.rmtree(trabajo, ignore_errors=True)
+        shutil.rmtree(_CACHE_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# ============================================================
+#   SEMEFO — bench_union_video.py
+#   Compara la unión dos_etapas (recorte + concat) contra
+#   una_pasada (concat con inpoint/outpoint) sobre un manifest real.
+#
+#   Uso (dentro de celery_uniones):
+#     PYTHONPATH=/app python scripts/bench_union_video.py \
+#         <manifest.json> <inicio_iso> <fin_iso> [pausas.json]
+#
+#   pausas.json: lista [{"inicio": iso, "fin": iso}, ...] (opcional)
+#
+#   Lecturas: /proc/self/io acumula la E/S de los hijos ya
+#   esperados (ffmpeg, y sh que lo lanza). rchar cuenta todo lo
+#   leído por read(), incluido SMB/CIFS y page cache; read_bytes
+#   solo lo que llegó al dispositivo de bloques local (0 en CIFS).
+# ============================================================
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from worker.tasks import (
+    cargar_manifest,
+    construir_intervalos_validos,
+    escribir_lista_concat,
+    escribir_lista_una_pasada,
+    ffmpeg_concat_cmd,
+    fragmentos_del_manifest,
+    planificar_segmentos,
+    preparar_partes_dos_etapas,
+)
+
+
+def _io_proceso():
+    """(rchar, read_bytes) de /proc/self/io, con los hijos ya esperados."""
+    io = {}
+    with open("/proc/self/io") as f:
+        for linea in f:
+            clave, valor = linea.split(":")
+            io[clave] = int(valor)
+    return io["rchar"], io["read_bytes"]
+
+
+def _io_desde(inicio):
+    rchar, read_bytes = _io_proceso()
+    return {"bytes_leidos": rchar - inicio[0], "bytes_disco": read_bytes - inicio[1]}
+
+
+def _bytes_logicos(segmentos, partes=None):
+    """Bytes que el pipeline abre para lectura (tamaño de archivos)."""
+    total = 0
+    for seg in segmentos:
+        total += os.path.getsize(seg["ruta"])
+    for p in partes or []:
+        if os.path.exists(p):
+            total += os.path.getsize(p)
+    return total
+
+
+def _ejecutar(cmd):
+    r = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+    if r.returncode != 0:
+        raise RuntimeError(r.stderr[-2000:])
+
+
+def medir_dos_etapas(segmentos, trabajo):
+    t0 = time.monotonic()
+    io0 = _io_proceso()
+
+    partes = preparar_partes_dos_etapas(segmentos, trabajo)
+    list_txt = os.path.join(trabajo, "list.txt")
+    escribir_lista_concat(list_txt, partes)
+    salida = os.path.join(trabajo, "dos_etapas.webm")
+    _ejecutar(ffmpeg_concat_cmd(list_txt, salida))
+
+    recortadas = [p for p in partes if p.startswith(trabajo)]
+    return {
+        "modo": "dos_etapas",
+        "segundos": round(time.monotonic() - t0, 2),
+        **_io_desde(io0),
+        # recorte lee los fragmentos de borde + concat lee completos y partes
+        "bytes_logicos": _bytes_logicos(segmentos, recortadas),
+        "partes_temp": len(recortadas),
+        "salida_bytes": os.path.getsize(salida),
+    }
+
+
+def medir_una_pasada(segmentos, trabajo):
+    t0 = time.monotonic()
+    io0 = _io_proceso()
+
+    list_txt = os.path.join(trabajo, "list_una_pasada.txt")
+    escribir_lista_una_pasada(list_txt, segmentos)
+    salida = os.path.join(trabajo, "una_pasada.webm")
+    _ejecutar(ffmpeg_concat_cmd(list_txt, salida))
+
+    return {
+        "modo": "una_pasada",
+        "segundos": round(time.monotonic() - t0, 2),
+        **_io_desde(io0),
+        "bytes_logicos": _bytes_logicos(segmentos),
+        "partes_temp": 0,
+        "salida_bytes": os.path.getsize(salida),
+    }
+
+
+def main():
+    if len(sys.argv) < 4:
+        print(
+            "Uso: python scripts/bench_union_video.py "
+            "<manifest.json> <inicio_iso> <fin_iso> [pausas.json]"
+        )
+        sys.exit(1)
+
+    manifest_path, inicio_iso, fin_iso = sys.argv[1:4]
+    pausas = []
+    if len(sys.argv) > 4:
+        with open(sys.argv[4]) as f:
+            pausas = json.load(f)
+
+    inicio = datetime.fromisoformat(inicio_iso)
+    fin = datetime.fromisoformat(fin_iso)
+
+    manifest = cargar_manifest(manifest_path)
+    frags = fragmentos_del_manifest(manifest, inicio, fin)
+    intervalos = construir_intervalos_validos(inicio, fin, pausas)
+    segmentos = planificar_segmentos(frags, intervalos)
+
+    print(f"Segmentos: {len(segmentos)} "
+          f"(bordes: {sum(1 for s in segmentos if not s['completo'])})")
+
+    trabajo = tempfile.mkdtemp(prefix="bench_union_")
+    try:
+        resultados = [
+            medir_dos_etapas(segmentos, trabajo),
+            medir_una_pasada(segmentos, trabajo),
+        ]
+    finally:
+        shutil.rmtree(trabajo, ignore_errors=True)
+
+    print(f"{'modo':<12}{'seg':>10}{'MB leídos':>12}{'MB disco':>12}"
+          f"{'MB lógicos':>12}{'partes':>8}{'MB salida':>11}")
+    for r in resultados:
+        print(
+            f"{r['modo']:<12}{r['segundos']:>10}"
+            f"{r['bytes_leidos'] / 1e6:>12.1f}{r['bytes_disco'] / 1e6:>12.1f}"
+            f"{r['bytes_logicos'] / 1e6:>12.1f}"
+            f"{r['partes_temp']:>8}{r['salida_bytes'] / 1e6:>11.1f}"
+        )
+    print("Nota: 'MB leídos' (rchar) incluye SMB/CIFS y page cache; 'MB disco' "
+          "(read_bytes) solo el disco local, 0 si los fragmentos están en CIFS.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# ============================================================
+#   SEMEFO — migrar_manifests.py
+#   Genera manifest.idx (índice binario por rango) para los
+#   manifest.json existentes. Toma el lock de cada manifest,
+#   así que puede correrse con los workers arriba.
+#
+#   Uso (dentro de celery_manifest):
+#     PYTHONPATH=/app python scripts/migrar_manifests.py [--forzar] [--dry-run] [--fragmentos] [raiz]
+#
+#   raiz: por defecto ${SMB_MOUNT}/manifests
+#   --forzar: reconstruye aunque el .idx ya exista
+#   --fragmentos: además publica todos los fragmentos en la tabla
+#                 fragmentos_camara (idempotente por ruta)
+# ============================================================
+
+import fcntl
+import os
+import sys
+import time
+from glob import glob
+
+from worker.manifest_builder import SMB_ROOT, cargar_manifest_completo, publicar_fragmentos
+from worker.manifest_indice import abrir_indice, escribir_indice, ruta_indice
+
+
+def migrar(path_manifest, forzar=False, dry_run=False):
+    path_idx = ruta_indice(path_manifest)
+    if os.path.exists(path_idx) and not forzar:
+        return "existe"
+
+    if dry_run:
+        return "pendiente"
+
+    with open(f"{path_manifest}.lock", "w") as lock_fp:
+        fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+
+        manifest = cargar_manifest_completo(path_manifest)
+        if not manifest.get("archivos"):
+            return "vacio"
+
+        escribir_indice(
+            path_idx, manifest.get("camara_mac", ""), manifest["archivos"])
+
+    with abrir_indice(path_idx) as indice:
+        registros = len(indice) if indice is not None else None
+    if registros != len({a["ruta"] for a in manifest["archivos"]}):
+        raise RuntimeError(f"Verificación falló para {path_idx}")
+    return "migrado"
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    forzar = "--forzar" in sys.argv
+    dry_run = "--dry-run" in sys.argv
+    raiz = args[0] if args else os.path.join(SMB_ROOT, "manifests")
+
+    manifests = sorted(glob(os.path.join(raiz, "**", "manifest.json"), recursive=True))
+    print(f"Manifests encontrados: {len(manifests)} en {raiz}")
+
+    t0 = time.monotonic()
+    conteo = {}
+    for path in manifests:
+        try:
+            resultado = migrar(path, forzar=forzar, dry_run=dry_run)
+        except Exception as e:
+            resultado = "error"
+            print(f"❌ {path}: {e}")
+        conteo[resultado] = conteo.get(resultado, 0) + 1
+        if resultado in ("migrado", "pendiente"):
+            print(f"{resultado:<10} {path}")
+
+    if "--fragmentos" in sys.argv and not dry_run:
+        for path in manifests:
+            manifest = cargar_manifest_completo(path)
+            if manifest.get("archivos"):
+                publicar_fragmentos(
+                    manifest.get("camara_mac", ""), manifest["archivos"])
+
+    print(f"\nResumen ({time.monotonic() - t0:.1f}s): {conteo}")
+
+
+if __name__ == "__main__":
+    main()
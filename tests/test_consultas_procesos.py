@@ -0,0 +1,144 @@
+# ============================================================
+#   SEMEFO — test_consultas_procesos.py
+#   Regresión N+1 de /procesos/activos y /sesiones/{id}/jobs:
+#   cuenta las sentencias SQL con 1 y con N sesiones en proceso
+#   y valida la salida contra los response_model, incluida una
+#   fila con conversion_completa NULL.
+#
+#   SQLite en memoria (JSONB/INET se compilan como JSON/VARCHAR);
+#   no toca la base real.
+#
+#   Uso:
+#     python -m pytest tests/test_consultas_procesos.py
+# ============================================================
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import INET, JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_sqlite(tipo, compilador, **kw):
+    return "JSON"
+
+
+@compiles(INET, "sqlite")
+def _inet_sqlite(tipo, compilador, **kw):
+    return "VARCHAR"
+
+
+from api_server import main, models  # noqa: E402
+from api_server.database import Base  # noqa: E402
+from api_server.schemas import ProcesoActivoResponse, SesionJobsResponse  # noqa: E402
+
+# Sentencias máximas: sesiones (+ investigación en JOIN), jobs, archivos
+CONSULTAS_MAX = 3
+BASE = datetime(2025, 12, 2, tzinfo=timezone.utc)
+
+
+# ============================================================
+#   BASE EN MEMORIA
+# ============================================================
+
+@pytest.fixture
+def base():
+    engine = create_engine("sqlite://")
+
+    # Índices con sintaxis solo de PostgreSQL (DESC NULLS LAST)
+    for tabla in Base.metadata.tables.values():
+        for indice in list(tabla.indexes):
+            if "NULLS" in " ".join(str(e) for e in indice.expressions):
+                tabla.indexes.discard(indice)
+
+    Base.metadata.create_all(engine)
+    contador = {"sentencias": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _contar(*_):
+        contador["sentencias"] += 1
+
+    db = sessionmaker(bind=engine)()
+    yield db, contador
+    db.close()
+    engine.dispose()
+
+
+def sembrar(db, n):
+    inv = models.Investigacion(numero_expediente="EXP-TEST")
+    db.add(inv)
+    db.flush()
+
+    for i in range(n):
+        ses = models.Sesion(
+            investigacion_id=inv.id,
+            nombre_sesion=f"test_{i}",
+            usuario_ldap="test",
+            tablet_id="test",
+            estado="procesando",
+            fecha=BASE + timedelta(minutes=i),
+        )
+        db.add(ses)
+        db.flush()
+
+        for tipo in ("manifest", "video", "video2"):
+            db.add(models.Job(
+                investigacion_id=inv.id,
+                sesion_id=ses.id,
+                tipo=tipo,
+                archivo=f"{tipo}.webm",
+                estado="procesando",
+            ))
+        for tipo in ("video", "audio"):
+            db.add(models.SesionArchivo(
+                sesion_id=ses.id,
+                tipo_archivo=tipo,
+                ruta_original=f"/tmp/{ses.id}/{tipo}",
+                ruta_convertida=f"/tmp/{ses.id}/{tipo}",
+                # Fila legacy: la columna es nullable
+                conversion_completa=None if tipo == "audio" else False,
+                estado="pendiente",
+            ))
+
+    db.commit()
+
+
+def medir(db, contador, func):
+    db.expire_all()
+    contador["sentencias"] = 0
+    r = func()
+    return r, contador["sentencias"]
+
+
+# ============================================================
+#   TESTS
+# ============================================================
+
+@pytest.mark.parametrize("sesiones", [1, 50])
+def test_procesos_activos_sentencias_constantes(base, sesiones):
+    db, contador = base
+    sembrar(db, sesiones)
+
+    activos, n = medir(db, contador, lambda: main.procesos_activos(db=db))
+
+    assert n <= CONSULTAS_MAX
+    assert len(activos) == sesiones
+    # Lo mismo que hace FastAPI con response_model
+    TypeAdapter(list[ProcesoActivoResponse]).validate_python(activos)
+
+
+@pytest.mark.parametrize("sesiones", [1, 50])
+def test_jobs_sesion_sentencias_constantes(base, sesiones):
+    db, contador = base
+    sembrar(db, sesiones)
+    primera = db.query(models.Sesion.id).order_by(models.Sesion.id).first()[0]
+
+    jobs, n = medir(
+        db, contador, lambda: main.listar_jobs_sesion(sesion_id=primera, db=db))
+
+    assert n <= CONSULTAS_MAX
+    SesionJobsResponse.model_validate(jobs)
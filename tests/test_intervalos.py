@@ -0,0 +1,199 @@
+# ============================================================
+#   SEMEFO — test_intervalos.py
+#   Propiedades del cruce intervalos válidos × fragmentos:
+#   - construir_intervalos_validos (unión) y intervalos_validos_ms
+#     (cobertura) dan los mismos intervalos, recortados a la sesión.
+#   - worker.intervalos (numpy y fallback) produce exactamente los
+#     mismos cortes que el cruce anidado original.
+#   Casos borde: pausas antes del inicio y después del fin, pausas
+#   traslapadas, fragmentos de duración cero.
+#
+#   Uso:
+#     python -m pytest tests/test_intervalos.py
+# ============================================================
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from worker.cobertura import intervalos_validos_ms
+from worker.intervalos import calcular_cortes, np
+from worker.tasks import construir_intervalos_validos, planificar_segmentos
+
+BASE = datetime(2025, 12, 2, tzinfo=timezone.utc)
+MOTORES = [False] + ([True] if np is not None else [])
+
+
+def _dt(ms):
+    return BASE + timedelta(milliseconds=ms)
+
+
+def _ms(dt):
+    return round((dt - BASE).total_seconds() * 1000)
+
+
+def _pausas_iso(pausas):
+    return [{"inicio": _dt(a).isoformat(), "fin": _dt(b).isoformat()} for a, b in pausas]
+
+
+# ============================================================
+#   REFERENCIAS
+# ============================================================
+
+def resta_ingenua(inicio, fin, pausas):
+    """[inicio, fin] menos cada pausa, partiendo intervalos uno por uno."""
+    intervalos = [(inicio, fin)]
+    for p_ini, p_fin in pausas:
+        restantes = []
+        for a, b in intervalos:
+            if p_fin <= a or p_ini >= b:
+                restantes.append((a, b))
+                continue
+            if p_ini > a:
+                restantes.append((a, p_ini))
+            if p_fin < b:
+                restantes.append((p_fin, b))
+        intervalos = restantes
+    return sorted(intervalos)
+
+
+def referencia_segmentos(frags, intervalos):
+    """Cruce anidado original (intervalos × fragmentos sobre datetimes)."""
+    segmentos = []
+    for intervalo in intervalos:
+        for f in frags:
+            if f["_dt_fin"] <= intervalo["ini"] or f["_dt_ini"] >= intervalo["fin"]:
+                continue
+            duracion_frag = (f["_dt_fin"] - f["_dt_ini"]).total_seconds()
+            ini = max(0, (intervalo["ini"] - f["_dt_ini"]).total_seconds())
+            fin_ = min(
+                (intervalo["fin"] - f["_dt_ini"]).total_seconds(),
+                duracion_frag
+            )
+            if fin_ <= ini:
+                continue
+            segmentos.append({
+                "ruta": f["ruta"],
+                "ini": ini,
+                "fin": fin_,
+                "completo": ini == 0 and fin_ == duracion_frag,
+            })
+    return segmentos
+
+
+# ============================================================
+#   GENERADOR
+# ============================================================
+
+def generar_caso(rnd, n_frags, n_pausas):
+    """
+    Fragmentos ~76 s con huecos, traslapes y alguno de duración cero;
+    pausas que pueden caer antes del inicio, después del fin o
+    traslaparse entre sí.
+    """
+    frags = []
+    t = 0
+    for k in range(n_frags):
+        dur = 0 if rnd.random() < 0.05 else rnd.randint(60_000, 90_000)
+        if rnd.random() < 0.05:
+            t -= rnd.randint(1, 5_000)
+        elif rnd.random() < 0.05:
+            t += rnd.randint(1, 120_000)
+        frags.append((t, t + dur, f"/x/{k}.mkv"))
+        t += dur
+    frags.sort()
+
+    total = max(t, 1)
+    inicio = rnd.randint(-60_000, total // 4)
+    fin = rnd.randint(inicio + 1, total + 60_000)
+
+    pausas = []
+    for _ in range(n_pausas):
+        a = rnd.randint(inicio - 150_000, fin + 150_000)
+        pausas.append((a, a + rnd.randint(1, 120_000)))
+    return frags, inicio, fin, pausas
+
+
+def _frags_dt(frags):
+    return [{"_dt_ini": _dt(a), "_dt_fin": _dt(b), "ruta": r} for a, b, r in frags]
+
+
+def _casos(n):
+    rnd = random.Random(20251202)
+    return [generar_caso(rnd, rnd.randint(0, 60), rnd.randint(0, 12)) for _ in range(n)]
+
+
+# ============================================================
+#   INTERVALOS VÁLIDOS
+# ============================================================
+
+@pytest.mark.parametrize("frags, inicio, fin, pausas", _casos(300))
+def test_intervalos_iguales_en_union_y_cobertura(frags, inicio, fin, pausas):
+    esperado = resta_ingenua(inicio, fin, pausas)
+
+    union = construir_intervalos_validos(_dt(inicio), _dt(fin), _pausas_iso(pausas))
+    assert [(_ms(v["ini"]), _ms(v["fin"])) for v in union] == esperado
+    assert intervalos_validos_ms(inicio, fin, pausas) == esperado
+
+
+@pytest.mark.parametrize("pausas, esperado", [
+    # Antes del inicio (completa y cruzando el inicio)
+    ([(-500, -100)], [(0, 1000)]),
+    ([(-500, 200)], [(200, 1000)]),
+    # Después del fin (completa y cruzando el fin)
+    ([(1500, 2000)], [(0, 1000)]),
+    ([(800, 2000)], [(0, 800)]),
+    # Traslapadas y contenidas una en otra
+    ([(100, 400), (300, 600)], [(0, 100), (600, 1000)]),
+    ([(100, 900), (200, 300)], [(0, 100), (900, 1000)]),
+    # Cubre toda la sesión
+    ([(-10, 1010)], []),
+])
+def test_intervalos_casos_borde(pausas, esperado):
+    union = construir_intervalos_validos(_dt(0), _dt(1000), _pausas_iso(pausas))
+    assert [(_ms(v["ini"]), _ms(v["fin"])) for v in union] == esperado
+    assert intervalos_validos_ms(0, 1000, pausas) == esperado
+
+
+# ============================================================
+#   CORTES
+# ============================================================
+
+@pytest.mark.parametrize("usar_numpy", MOTORES)
+@pytest.mark.parametrize("frags, inicio, fin, pausas", _casos(300))
+def test_cortes_iguales_al_cruce_anidado(frags, inicio, fin, pausas, usar_numpy):
+    intervalos = construir_intervalos_validos(_dt(inicio), _dt(fin), _pausas_iso(pausas))
+    esperado = referencia_segmentos(_frags_dt(frags), intervalos)
+
+    cortes = calcular_cortes(
+        [f[0] for f in frags], [f[1] for f in frags],
+        [_ms(v["ini"]) for v in intervalos], [_ms(v["fin"]) for v in intervalos],
+        usar_numpy=usar_numpy,
+    )
+    obtenido = [
+        {
+            "ruta": frags[i][2],
+            "ini": a / 1000,
+            "fin": b / 1000,
+            "completo": a == 0 and b == frags[i][1] - frags[i][0],
+        }
+        for i, a, b in cortes
+    ]
+    assert obtenido == esperado
+
+
+def test_planificar_segmentos_sin_fragmentos_de_duracion_cero():
+    frags = _frags_dt([
+        (0, 500, "/x/a.mkv"),
+        (500, 500, "/x/cero.mkv"),
+        (500, 1000, "/x/b.mkv"),
+    ])
+    intervalos = construir_intervalos_validos(
+        _dt(0), _dt(1000), _pausas_iso([(200, 300), (1200, 1300)]))
+
+    assert planificar_segmentos(frags, intervalos) == [
+        {"ruta": "/x/a.mkv", "ini": 0.0, "fin": 0.2, "completo": False},
+        {"ruta": "/x/a.mkv", "ini": 0.3, "fin": 0.5, "completo": False},
+        {"ruta": "/x/b.mkv", "ini": 0.0, "fin": 0.5, "completo": True},
+    ]
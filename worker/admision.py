@@ -0,0 +1,222 @@
+# ============================================================
+#   SEMEFO — admision.py
+#   Control de admisión host-wide para trabajo ffmpeg.
+#   Semáforo por hilos con cola FIFO compartida entre contenedores
+#   (celery_uniones / celery_manifest) vía archivos en TEMP_ROOT.
+# ============================================================
+
+import fcntl
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+TEMP_ROOT = os.getenv("TEMP_ROOT", "/opt/semefo/storage/tmp")
+ADMISION_DIR = os.getenv("ADMISION_DIR", os.path.join(TEMP_ROOT, "admision"))
+
+# Presupuesto total de hilos ffmpeg en el host
+ADMISION_HILOS_HOST = max(
+    1, int(os.getenv("ADMISION_HILOS_HOST", os.cpu_count() or 4)))
+ADMISION_POLL_SEG = float(os.getenv("ADMISION_POLL_SEG", "0.25"))
+ADMISION_HISTORIAL = 200
+
+_ESTADO = "estado.json"
+_LOCK = "estado.lock"
+
+
+# ============================================================
+#   ESTADO COMPARTIDO
+# ============================================================
+
+def _ruta(nombre):
+    return os.path.join(ADMISION_DIR, nombre)
+
+
+def _ruta_ticket(ticket):
+    return _ruta(f"ticket_{ticket}.lock")
+
+
+@contextmanager
+def _bloqueo_estado():
+    os.makedirs(ADMISION_DIR, exist_ok=True)
+    with open(_ruta(_LOCK), "w") as lock_fp:
+        fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fp.fileno(), fcntl.LOCK_UN)
+
+
+def _leer_estado():
+    try:
+        with open(_ruta(_ESTADO), "r") as f:
+            estado = json.load(f)
+    except Exception:
+        estado = {}
+
+    estado.setdefault("siguiente_ticket", 1)
+    estado.setdefault("cola", [])
+    estado.setdefault("activos", [])
+    estado.setdefault("esperas", [])
+    return estado
+
+
+def _guardar_estado(estado):
+    tmp = _ruta(f"{_ESTADO}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(estado, f)
+    os.replace(tmp, _ruta(_ESTADO))
+
+
+def _ticket_vivo(ticket):
+    """
+    El dueño mantiene flock sobre ticket_<n>.lock mientras espera/corre.
+    Si podemos tomarlo, el proceso murió (el kernel liberó el lock).
+    """
+    try:
+        fp = open(_ruta_ticket(ticket), "r")
+    except FileNotFoundError:
+        return False
+
+    with fp:
+        try:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+        return False
+
+
+def _purgar_muertos(estado):
+    """Quita tickets de procesos muertos. Retorna True si hubo cambios."""
+    cambios = False
+    for clave in ("cola", "activos"):
+        vivos = []
+        for t in estado[clave]:
+            if _ticket_vivo(t["ticket"]):
+                vivos.append(t)
+            else:
+                print(f"[ADMISION] Ticket huérfano liberado: {t}")
+                cambios = True
+        estado[clave] = vivos
+    return cambios
+
+
+# ============================================================
+#   API PÚBLICA
+# ============================================================
+
+@contextmanager
+def slot_ffmpeg(hilos, etiqueta=""):
+    """
+    Bloquea hasta obtener `hilos` del presupuesto del host (FIFO estricto)
+    y los libera al salir. Devuelve (yield) la espera en segundos.
+    """
+    hilos = max(1, min(int(hilos), ADMISION_HILOS_HOST))
+    os.makedirs(ADMISION_DIR, exist_ok=True)
+
+    with _bloqueo_estado():
+        estado = _leer_estado()
+        ticket = estado["siguiente_ticket"]
+        estado["siguiente_ticket"] = ticket + 1
+
+        # El lock del ticket se toma ANTES de publicarlo en la cola
+        ticket_fp = open(_ruta_ticket(ticket), "w")
+        fcntl.flock(ticket_fp.fileno(), fcntl.LOCK_EX)
+
+        estado["cola"].append({
+            "ticket": ticket,
+            "hilos": hilos,
+            "etiqueta": etiqueta,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "solicitado": time.time(),
+        })
+        _guardar_estado(estado)
+
+    t0 = time.monotonic()
+    try:
+        _esperar_turno(ticket)
+        espera = round(time.monotonic() - t0, 3)
+        _registrar_espera(ticket, etiqueta, hilos, espera)
+        print(
+            f"[ADMISION] {etiqueta} ticket={ticket} hilos={hilos} "
+            f"espera={espera}s"
+        )
+        yield espera
+    finally:
+        _liberar(ticket)
+        try:
+            fcntl.flock(ticket_fp.fileno(), fcntl.LOCK_UN)
+            ticket_fp.close()
+            os.remove(_ruta_ticket(ticket))
+        except OSError:
+            pass
+
+
+def _esperar_turno(ticket):
+    while True:
+        with _bloqueo_estado():
+            estado = _leer_estado()
+            cambios = _purgar_muertos(estado)
+
+            cola = estado["cola"]
+            en_uso = sum(t["hilos"] for t in estado["activos"])
+
+            if cola and cola[0]["ticket"] == ticket:
+                yo = cola[0]
+                if not estado["activos"] or en_uso + yo["hilos"] <= ADMISION_HILOS_HOST:
+                    cola.pop(0)
+                    yo["otorgado"] = time.time()
+                    estado["activos"].append(yo)
+                    _guardar_estado(estado)
+                    return
+
+            if cambios:
+                _guardar_estado(estado)
+
+        time.sleep(ADMISION_POLL_SEG)
+
+
+def _registrar_espera(ticket, etiqueta, hilos, espera):
+    with _bloqueo_estado():
+        estado = _leer_estado()
+        estado["esperas"].append({
+            "ticket": ticket,
+            "etiqueta": etiqueta,
+            "hilos": hilos,
+            "espera_seg": espera,
+            "fecha": datetime.now(timezone.utc).isoformat(),
+        })
+        estado["esperas"] = estado["esperas"][-ADMISION_HISTORIAL:]
+        _guardar_estado(estado)
+
+
+def _liberar(ticket):
+    with _bloqueo_estado():
+        estado = _leer_estado()
+        estado["cola"] = [t for t in estado["cola"] if t["ticket"] != ticket]
+        estado["activos"] = [
+            t for t in estado["activos"] if t["ticket"] != ticket]
+        _guardar_estado(estado)
+
+
+def estado_admision():
+    """
+    Snapshot para diagnóstico/dashboard: uso, cola y esperas recientes.
+    Solo lectura (estado.json se reemplaza atómicamente), sin tomar lock.
+    """
+    estado = _leer_estado()
+
+    esperas = [e["espera_seg"] for e in estado["esperas"]]
+    return {
+        "capacidad_hilos": ADMISION_HILOS_HOST,
+        "hilos_en_uso": sum(t["hilos"] for t in estado["activos"]),
+        "activos": estado["activos"],
+        "cola": estado["cola"],
+        "esperas_recientes": estado["esperas"][-20:],
+        "espera_promedio_seg": round(sum(esperas) / len(esperas), 3) if esperas else 0.0,
+        "espera_max_seg": max(esperas) if esperas else 0.0,
+    }
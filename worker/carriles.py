@@ -0,0 +1,337 @@
+# ============================================================
+#   SEMEFO — carriles.py
+#   Carriles de prioridad para las uniones de video.
+#   La API estima la duración válida de la sesión (fin - inicio
+#   - pausas) y encola la unión en "uniones_corta" o
+#   "uniones_larga" con prioridad RabbitMQ (más corta = mayor).
+#
+#   Envejecimiento: la prioridad se fija al publicar, así que sin
+#   ayuda una unión de baja prioridad puede esperar indefinidamente
+#   mientras sigan llegando otras más cortas (y el prefetch de
+#   Celery es por canal, no por cola: nada garantiza que el worker
+#   alterne carriles). El servicio envejecimiento_carriles
+#   (worker/envejecimiento_carriles.py) republica los mensajes que
+#   llevan esperando: +1 de prioridad cada UNION_ENVEJECIMIENTO_SEG
+#   y, pasado UNION_ENVEJECIMIENTO_MOVER_SEG, las del carril largo
+#   pasan al corto. Cota: una unión larga entra al carril corto con
+#   prioridad máxima tras MOVER_SEG (+ un ciclo) y solo la preceden
+#   las que ya estaban ahí con prioridad máxima.
+#
+#   Esperas por carril en TEMP_ROOT (mismo patrón que admision.py)
+#   para el dashboard.
+# ============================================================
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from worker.cobertura import intervalos_validos_ms
+
+TEMP_ROOT = os.getenv("TEMP_ROOT", "/opt/semefo/storage/tmp")
+CARRILES_DIR = os.getenv("CARRILES_DIR", os.path.join(TEMP_ROOT, "carriles"))
+
+COLA_CORTA = "uniones_corta"
+COLA_LARGA = "uniones_larga"
+COLA_LEGACY = "uniones_video"
+COLAS_UNION = (COLA_CORTA, COLA_LARGA, COLA_LEGACY)
+
+TAREAS_UNION = (
+    "worker.tasks.unir_video",
+    "worker.tasks.unir_video2",
+    "worker.tasks.unir_sesion",
+)
+
+# Sesiones con duración válida <= UNION_CORTA_MAX_SEG van al carril corto
+UNION_CORTA_MAX_SEG = int(os.getenv("UNION_CORTA_MAX_SEG", "1800"))
+# Cada UNION_PRIORIDAD_PASO_SEG de duración baja un punto de prioridad
+UNION_PRIORIDAD_PASO_SEG = max(
+    1, int(os.getenv("UNION_PRIORIDAD_PASO_SEG", "900")))
+PRIORIDAD_MAX = 9  # x-max-priority de las colas = 10
+
+# +1 de prioridad por cada UNION_ENVEJECIMIENTO_SEG en cola (0 = apagado)
+UNION_ENVEJECIMIENTO_SEG = int(os.getenv("UNION_ENVEJECIMIENTO_SEG", "600"))
+# Uniones del carril largo con más espera que esto pasan al corto (0 = nunca)
+UNION_ENVEJECIMIENTO_MOVER_SEG = int(
+    os.getenv("UNION_ENVEJECIMIENTO_MOVER_SEG", "3600"))
+# Máximo de mensajes revisados por carril en cada ciclo. Mientras se
+# revisa el carril quedan retenidos sin ack y celery_uniones no puede
+# tomarlos: un lote chico acota esa ventana (las colas son de decenas)
+UNION_ENVEJECIMIENTO_LOTE = int(os.getenv("UNION_ENVEJECIMIENTO_LOTE", "50"))
+CARRILES_HISTORIAL = 200
+
+_ESTADO = "estado.json"
+_LOCK = "estado.lock"
+
+
+# ============================================================
+#   ASIGNACIÓN DE CARRIL (API)
+# ============================================================
+
+def duracion_valida_seg(inicio, fin, pausas):
+    """
+    inicio/fin: datetime; pausas: [{"inicio": iso|datetime, "fin": ...}].
+    Duración de la sesión menos pausas (misma regla que la unión).
+    Pausas ilegibles se ignoran: la estimación solo decide el carril.
+    """
+    def _ms(v):
+        if isinstance(v, str):
+            v = datetime.fromisoformat(v)
+        return round(v.timestamp() * 1000)
+
+    pausas_ms = []
+    for p in pausas or []:
+        try:
+            pausas_ms.append((_ms(p["inicio"]), _ms(p["fin"])))
+        except Exception:
+            continue
+
+    validos = intervalos_validos_ms(_ms(inicio), _ms(fin), pausas_ms)
+    return sum(b - a for a, b in validos) / 1000
+
+
+def carril_union(duracion_seg):
+    """
+    Retorna {"queue", "priority"} para apply_async / signature.
+    Shortest-job-first dentro de cada carril vía prioridad 1..9.
+    """
+    duracion_seg = max(0.0, float(duracion_seg or 0))
+    cola = COLA_CORTA if duracion_seg <= UNION_CORTA_MAX_SEG else COLA_LARGA
+    prioridad = PRIORIDAD_MAX - min(
+        PRIORIDAD_MAX - 1, int(duracion_seg // UNION_PRIORIDAD_PASO_SEG))
+    return {"queue": cola, "priority": prioridad}
+
+
+# ============================================================
+#   ENVEJECIMIENTO (servicio envejecimiento_carriles)
+# ============================================================
+
+def destino_envejecido(cola, prioridad_base, espera_seg, prioridad_actual=0):
+    """
+    (cola, prioridad) que le toca a un mensaje que lleva espera_seg en
+    cola. prioridad_base es la que se le asignó al publicarlo; la
+    prioridad nunca baja (una larga ya movida al corto conserva la máxima).
+    """
+    prioridad = prioridad_base or 0
+    if UNION_ENVEJECIMIENTO_SEG > 0:
+        prioridad += int(max(0.0, espera_seg) // UNION_ENVEJECIMIENTO_SEG)
+    prioridad = min(PRIORIDAD_MAX, max(prioridad, prioridad_actual or 0))
+
+    if (
+        cola == COLA_LARGA
+        and UNION_ENVEJECIMIENTO_MOVER_SEG > 0
+        and espera_seg >= UNION_ENVEJECIMIENTO_MOVER_SEG
+    ):
+        return COLA_CORTA, PRIORIDAD_MAX
+    return cola, prioridad
+
+
+def promover_envejecidos(canal, colas=(COLA_CORTA, COLA_LARGA),
+                         lote=UNION_ENVEJECIMIENTO_LOTE, ahora=None):
+    """
+    Revisa hasta `lote` mensajes por carril (basic_get sin ack) y
+    republica con publisher confirm los que suben de prioridad o
+    cambian de carril; el original se confirma (ack) solo después del
+    confirm. Los demás se devuelven a su cola (nack con requeue) al
+    terminar el carril: hasta entonces el worker de uniones no los ve.
+
+    Un crash entre el confirm y el ack duplica el mensaje (al menos
+    una vez, igual que task_acks_late); la unión es reanudable.
+
+    canal: canal py-amqp (connection.default_channel de kombu).
+    Retorna {cola: promovidos}.
+    """
+    import amqp
+
+    ahora = ahora or time.time()
+    canal.confirm_select()
+    resultado = {}
+
+    for cola in colas:
+        devolver = []
+        promovidos = 0
+        try:
+            for _ in range(lote):
+                msg = canal.basic_get(queue=cola, no_ack=False)
+                if msg is None:
+                    break
+
+                props = dict(msg.properties)
+                headers = dict(props.get("application_headers") or {})
+                base = headers.get("prioridad_base", props.get("priority") or 0)
+                encolado_ts = headers.get("encolado_ts")
+                if not encolado_ts:
+                    devolver.append(msg)
+                    continue
+
+                actual = props.get("priority") or 0
+                destino, prioridad = destino_envejecido(
+                    cola, base, ahora - encolado_ts, actual)
+                if destino == cola and prioridad == actual:
+                    devolver.append(msg)
+                    continue
+
+                headers["prioridad_base"] = base
+                props["application_headers"] = headers
+                props["priority"] = prioridad
+                try:
+                    canal.basic_publish_confirm(
+                        amqp.Message(msg.body, **props),
+                        exchange="",
+                        routing_key=destino,
+                    )
+                except Exception:
+                    devolver.append(msg)
+                    raise
+                canal.basic_ack(msg.delivery_tag)
+                promovidos += 1
+                print(
+                    f"[CARRIL] Envejecimiento {headers.get('id')}: "
+                    f"{cola}/{actual} → {destino}/{prioridad} "
+                    f"(espera {ahora - encolado_ts:.0f}s)"
+                )
+        finally:
+            # Requeue: vuelven a su posición en la cola
+            for msg in devolver:
+                canal.basic_reject(msg.delivery_tag, requeue=True)
+        resultado[cola] = promovidos
+
+    return resultado
+
+
+# ============================================================
+#   ESTADO COMPARTIDO (worker escribe, API lee)
+# ============================================================
+
+def _ruta(nombre):
+    return os.path.join(CARRILES_DIR, nombre)
+
+
+@contextmanager
+def _bloqueo_estado():
+    os.makedirs(CARRILES_DIR, exist_ok=True)
+    with open(_ruta(_LOCK), "w") as lock_fp:
+        fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fp.fileno(), fcntl.LOCK_UN)
+
+
+def _leer_estado():
+    try:
+        with open(_ruta(_ESTADO), "r") as f:
+            estado = json.load(f)
+    except Exception:
+        estado = {}
+
+    estado.setdefault("en_curso", {})
+    estado.setdefault("esperas", [])
+    return estado
+
+
+def _guardar_estado(estado):
+    tmp = _ruta(f"{_ESTADO}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(estado, f)
+    os.replace(tmp, _ruta(_ESTADO))
+
+
+def registrar_inicio(task_id, tarea, carril, prioridad, encolado_ts):
+    """task_prerun: espera en cola = ahora - encolado_ts (header al publicar)."""
+    ahora = time.time()
+    espera = round(ahora - encolado_ts, 3) if encolado_ts else None
+
+    with _bloqueo_estado():
+        estado = _leer_estado()
+        estado["en_curso"][task_id] = {
+            "tarea": tarea,
+            "carril": carril,
+            "prioridad": prioridad,
+            "inicio": ahora,
+        }
+        if espera is not None:
+            estado["esperas"].append({
+                "task_id": task_id,
+                "tarea": tarea,
+                "carril": carril,
+                "prioridad": prioridad,
+                "espera_seg": espera,
+                "fecha": datetime.now(timezone.utc).isoformat(),
+            })
+            estado["esperas"] = estado["esperas"][-CARRILES_HISTORIAL:]
+        _guardar_estado(estado)
+
+    print(
+        f"[CARRIL] {tarea} carril={carril} prioridad={prioridad} "
+        f"espera={espera}s"
+    )
+
+
+def registrar_fin(task_id):
+    with _bloqueo_estado():
+        estado = _leer_estado()
+        if estado["en_curso"].pop(task_id, None) is not None:
+            _guardar_estado(estado)
+
+
+# ============================================================
+#   LECTURA (dashboard)
+# ============================================================
+
+def profundidad_colas(conexion, colas=COLAS_UNION):
+    """
+    Mensajes listos y consumidores por cola (queue_declare pasivo).
+    conexion: kombu Connection (celery_app.connection_for_read()).
+    """
+    resultado = {}
+    for cola in colas:
+        try:
+            with conexion.channel() as canal:
+                ok = canal.queue_declare(queue=cola, passive=True)
+            resultado[cola] = {
+                "mensajes": ok.message_count,
+                "consumidores": ok.consumer_count,
+            }
+        except Exception:
+            # Cola aún no declarada (o broker caído)
+            resultado[cola] = None
+    return resultado
+
+
+def estado_carriles(profundidad=None):
+    """
+    Snapshot por carril: profundidad (si se pasa), en curso y
+    esperas recientes. Solo lectura, sin tomar lock.
+    """
+    estado = _leer_estado()
+    ahora = time.time()
+
+    carriles = {}
+    for cola in COLAS_UNION:
+        esperas = [
+            e["espera_seg"] for e in estado["esperas"] if e["carril"] == cola
+        ]
+        ordenadas = sorted(esperas)
+        carriles[cola] = {
+            "cola": (profundidad or {}).get(cola),
+            "en_curso": [
+                {**t, "transcurrido_seg": round(ahora - t["inicio"], 1)}
+                for t in estado["en_curso"].values() if t["carril"] == cola
+            ],
+            "jobs_recientes": len(esperas),
+            "espera_promedio_seg": round(sum(esperas) / len(esperas), 3) if esperas else 0.0,
+            "espera_p95_seg": ordenadas[int(0.95 * (len(ordenadas) - 1))] if ordenadas else 0.0,
+            "espera_max_seg": ordenadas[-1] if ordenadas else 0.0,
+        }
+
+    return {
+        "corta_max_seg": UNION_CORTA_MAX_SEG,
+        "prioridad_paso_seg": UNION_PRIORIDAD_PASO_SEG,
+        "envejecimiento_seg": UNION_ENVEJECIMIENTO_SEG,
+        "envejecimiento_mover_seg": UNION_ENVEJECIMIENTO_MOVER_SEG,
+        "carriles": carriles,
+        "esperas_recientes": estado["esperas"][-20:],
+    }
@@ -3,7 +3,20 @@
 # ============================================================
 
 from celery import Celery
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from kombu import Exchange, Queue
 import os
+import time
+
+from worker.carriles import (
+    COLA_CORTA,
+    COLA_LARGA,
+    COLA_LEGACY,
+    PRIORIDAD_MAX,
+    TAREAS_UNION,
+    registrar_fin,
+    registrar_inicio,
+)
 
 # ============================================================
 #   BROKER / BACKEND
@@ -30,19 +43,53 @@ celery_app = Celery(
     ]
 )
 
+# ============================================================
+#   COLAS
+#   Los carriles de unión llevan x-max-priority; manifest y la
+#   cola legacy se declaran igual que antes (redeclarar con otros
+#   argumentos falla en RabbitMQ).
+# ============================================================
+
+def _cola(nombre, **argumentos):
+    return Queue(
+        nombre,
+        Exchange(nombre),
+        routing_key=nombre,
+        queue_arguments=argumentos or None,
+    )
+
+
+celery_app.conf.task_queues = (
+    _cola("manifest"),
+    _cola(COLA_LEGACY),
+    _cola(COLA_CORTA, **{"x-max-priority": PRIORIDAD_MAX + 1}),
+    _cola(COLA_LARGA, **{"x-max-priority": PRIORIDAD_MAX + 1}),
+)
+
 # ============================================================
 #   RUTEO DE TAREAS → COLAS
+#   Las uniones normalmente llegan con queue/priority explícitos
+#   (api_server.utils.sesion_procesamiento → carril_union); sin
+#   estimación caen al carril largo.
 # ============================================================
 
 celery_app.conf.task_routes = {
     # manifest
     "tasks.generar_manifest": {"queue": "manifest"},
+    "tasks.verificar_duraciones_sufijo": {"queue": "manifest"},
 
     # video principal
-    "worker.tasks.unir_video": {"queue": "uniones_video"},
+    "worker.tasks.unir_video": {"queue": COLA_LARGA},
 
     # video secundario
-    "worker.tasks.unir_video2": {"queue": "uniones_video"},
+    "worker.tasks.unir_video2": {"queue": COLA_LARGA},
+
+    # ambas cámaras en una tarea (UNION_SESION_COMBINADA)
+    "worker.tasks.unir_sesion": {"queue": COLA_LARGA},
+
+    # chord manifest×2 → unir_sesion: el backend en BD sondea con
+    # chord_unlock, que no debe caer en la cola "celery" (sin worker)
+    "celery.chord_unlock": {"queue": "manifest"},
 }
 
 # ============================================================
@@ -66,3 +113,40 @@ celery_app.conf.update(
     worker_prefetch_multiplier=1,     # no acaparar tareas
     task_default_delivery_mode=2,     # mensajes persistentes en RabbitMQ
 )
+
+# ============================================================
+#   ESPERA EN COLA POR CARRIL (uniones)
+# ============================================================
+
+@before_task_publish.connect
+def _marcar_encolado(sender=None, headers=None, **_):
+    # Corre donde se publica (API o el worker que cierra la cadena)
+    if sender in TAREAS_UNION and headers is not None:
+        headers.setdefault("encolado_ts", time.time())
+
+
+@task_prerun.connect
+def _inicio_union(task_id=None, task=None, **_):
+    if task is None or task.name not in TAREAS_UNION:
+        return
+    try:
+        info = task.request.delivery_info or {}
+        registrar_inicio(
+            task_id,
+            task.name.rsplit(".", 1)[-1],
+            info.get("routing_key"),
+            info.get("priority"),
+            getattr(task.request, "encolado_ts", None),
+        )
+    except Exception as e:
+        print(f"[CARRIL] No se pudo registrar espera: {e}")
+
+
+@task_postrun.connect
+def _fin_union(task_id=None, task=None, **_):
+    if task is None or task.name not in TAREAS_UNION:
+        return
+    try:
+        registrar_fin(task_id)
+    except Exception as e:
+        print(f"[CARRIL] No se pudo cerrar registro: {e}")
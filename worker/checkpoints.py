@@ -0,0 +1,229 @@
+# ============================================================
+#   SEMEFO — checkpoints.py
+#   Partes recortadas y chunks codificados reutilizables entre
+#   entregas de la misma unión (reinicio del worker con
+#   task_acks_late, reproceso desde el dashboard).
+#
+#   temp_dir/checkpoint.json es el manifiesto de contenido:
+#     {"<archivo>": {"clave", "src", "ini", "fin", "tamano", "hash"}}
+#   Un archivo se reutiliza solo si está en el manifiesto y su
+#   tamaño y hash coinciden; lo demás (p. ej. un ffmpeg cortado a
+#   la mitad) se borra y se rehace.
+#
+#   Mientras una unión usa el directorio mantiene flock compartido
+#   sobre temp_dir/checkpoint.lock; la retención solo borra los
+#   directorios cuyo lock exclusivo puede tomar sin esperar.
+# ============================================================
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from worker.duraciones_cache import firma_archivo
+
+CHECKPOINT = "checkpoint.json"
+CHECKPOINT_LOCK = "checkpoint.lock"
+CHECKPOINT_VERSION = 1
+# Directorios de checkpoint sin tocar por más de N días se eliminan
+UNION_CHECKPOINT_DIAS = float(os.getenv("UNION_CHECKPOINT_DIAS", "3"))
+
+_PREFIJOS_ARTEFACTO = ("part_", "chunk_")
+
+
+def hash_archivo(path, bloque=1024 * 1024):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            datos = f.read(bloque)
+            if not datos:
+                break
+            h.update(datos)
+    return h.hexdigest()
+
+
+def clave_contenido(*partes):
+    """Clave estable de lo que produce un archivo (fuentes, cortes, perfil)."""
+    texto = json.dumps(partes, sort_keys=True, default=str)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def clave_recorte(src, ini_seg, fin_seg):
+    # La firma de la fuente invalida la parte si el MKV cambió
+    return clave_contenido("recorte", src, firma_archivo(src), round(ini_seg, 3), round(fin_seg, 3))
+
+
+class CheckpointUnion:
+    """
+    Manifiesto de contenido de un temp_dir de unión. Seguro entre
+    hilos (recortes/chunks en paralelo registran concurrentemente).
+    """
+
+    def __init__(self, temp_dir):
+        self.temp_dir = temp_dir
+        self.path = os.path.join(temp_dir, CHECKPOINT)
+        self._lock = threading.Lock()
+        self._lock_fp = None
+        self.entradas = {}
+        self._tomar_lock()
+        self._cargar()
+
+    # --------------------------------------------------------
+
+    def _tomar_lock(self):
+        """
+        flock compartido sobre checkpoint.lock hasta cerrar(). Si la
+        retención borró el directorio mientras se esperaba el lock, se
+        recrea y se vuelve a tomar.
+        """
+        path_lock = os.path.join(self.temp_dir, CHECKPOINT_LOCK)
+        while True:
+            os.makedirs(self.temp_dir, exist_ok=True)
+            fp = open(path_lock, "a")
+            fcntl.flock(fp.fileno(), fcntl.LOCK_SH)
+            try:
+                vigente = os.fstat(fp.fileno()).st_ino == os.stat(path_lock).st_ino
+            except FileNotFoundError:
+                vigente = False
+            if vigente:
+                self._lock_fp = fp
+                return
+            fp.close()
+
+    def cerrar(self):
+        """Libera el lock; el directorio queda sujeto a la retención."""
+        if self._lock_fp:
+            self._lock_fp.close()
+            self._lock_fp = None
+
+    # --------------------------------------------------------
+
+    def _cargar(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") != CHECKPOINT_VERSION:
+                raise ValueError("versión distinta")
+            entradas = data.get("archivos", {})
+        except Exception:
+            entradas = {}
+
+        validas = {}
+        for nombre, e in entradas.items():
+            ruta = os.path.join(self.temp_dir, nombre)
+            try:
+                ok = (
+                    os.path.getsize(ruta) == e["tamano"]
+                    and hash_archivo(ruta) == e["hash"]
+                )
+            except (OSError, KeyError):
+                ok = False
+            if ok:
+                validas[nombre] = e
+            else:
+                print(f"[CHECKPOINT] Descarto {nombre}: no coincide con el manifiesto")
+
+        # Artefactos sin registrar = escrituras interrumpidas
+        for nombre in os.listdir(self.temp_dir):
+            if nombre.startswith(_PREFIJOS_ARTEFACTO) and nombre not in validas:
+                try:
+                    os.remove(os.path.join(self.temp_dir, nombre))
+                except OSError:
+                    pass
+
+        self.entradas = validas
+        if validas:
+            print(f"[CHECKPOINT] {self.temp_dir}: {len(validas)} archivos reutilizables")
+        self._guardar()
+
+    def _guardar(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "version": CHECKPOINT_VERSION,
+                "actualizado": time.time(),
+                "archivos": self.entradas,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    # --------------------------------------------------------
+
+    def ruta(self, nombre):
+        return os.path.join(self.temp_dir, nombre)
+
+    def valido(self, nombre, clave):
+        with self._lock:
+            e = self.entradas.get(nombre)
+            return e is not None and e.get("clave") == clave
+
+    def registrar(self, nombre, clave, **meta):
+        """Llamar solo cuando el archivo quedó completo (ffmpeg rc=0)."""
+        ruta = self.ruta(nombre)
+        entrada = {
+            "clave": clave,
+            "tamano": os.path.getsize(ruta),
+            "hash": hash_archivo(ruta),
+            **meta,
+        }
+        with self._lock:
+            self.entradas[nombre] = entrada
+            self._guardar()
+
+    def eliminar(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        self.cerrar()
+
+
+# ============================================================
+#   RETENCIÓN
+# ============================================================
+
+def purgar_checkpoints(raiz, dias=UNION_CHECKPOINT_DIAS, excluir=()):
+    """
+    Borra directorios de unión abandonados bajo `raiz` (TEMP_ROOT):
+    solo los que tienen checkpoint.json, no se han actualizado en
+    `dias` y ninguna unión tiene abiertos (checkpoint.lock libre).
+    Retorna cuántos se eliminaron.
+    """
+    if dias <= 0:
+        return 0
+
+    limite = time.time() - dias * 86400
+    excluir = {os.path.abspath(e) for e in excluir}
+    eliminados = 0
+
+    try:
+        entradas = list(os.scandir(raiz))
+    except OSError:
+        return 0
+
+    for d in entradas:
+        if not d.is_dir(follow_symlinks=False) or os.path.abspath(d.path) in excluir:
+            continue
+        try:
+            mtime = os.path.getmtime(os.path.join(d.path, CHECKPOINT))
+        except OSError:
+            continue
+        if mtime >= limite:
+            continue
+
+        try:
+            lock_fp = open(os.path.join(d.path, CHECKPOINT_LOCK), "a")
+        except OSError:
+            continue
+        with lock_fp:
+            try:
+                fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print(f"[CHECKPOINT] Retención: {d.path} en uso, se conserva")
+                continue
+            shutil.rmtree(d.path, ignore_errors=True)
+        eliminados += 1
+        print(f"[CHECKPOINT] Retención: eliminado {d.path}")
+
+    return eliminados
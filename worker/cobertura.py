@@ -0,0 +1,122 @@
+# ============================================================
+#   SEMEFO — cobertura.py
+#   Cobertura grabada vs esperada de una sesión por cámara.
+#   Barrido de eventos (sweep) sobre fragmentos + intervalos
+#   válidos (sesión menos pausas): O((n + m) log(n + m)).
+#   Sin dependencias: lo usan el worker (pre-check de la unión)
+#   y la API (/sesiones/{id}/cobertura).
+# ============================================================
+
+
+def intervalos_validos_ms(inicio_ms, fin_ms, pausas_ms):
+    """
+    [inicio, fin] menos las pausas → [(ini, fin)] ordenados y disjuntos.
+    Misma regla que tasks.construir_intervalos_validos.
+    """
+    intervalos = []
+    cursor = inicio_ms
+
+    for p_ini, p_fin in sorted(pausas_ms):
+        if p_fin <= cursor:
+            continue
+        if p_ini > cursor:
+            intervalos.append((cursor, min(p_ini, fin_ms)))
+        cursor = max(cursor, p_fin)
+        if cursor >= fin_ms:
+            break
+
+    if cursor < fin_ms:
+        intervalos.append((cursor, fin_ms))
+
+    return [(a, b) for a, b in intervalos if b > a]
+
+
+def _agregar_tramo(tramos, ini, fin):
+    """Agrega [ini, fin) fusionando con el último tramo si es contiguo."""
+    if tramos and tramos[-1][1] == ini:
+        tramos[-1][1] = fin
+    else:
+        tramos.append([ini, fin])
+
+
+def barrido_cobertura(fragmentos_ms, validos_ms):
+    """
+    fragmentos_ms: [(ini, fin)] en cualquier orden (pueden traslaparse).
+    validos_ms: [(ini, fin)] disjuntos (lo esperado).
+
+    Retorna ms esperados, grabados, huecos (válido sin fragmento) y
+    traslapes (válido con 2+ fragmentos).
+    """
+    eventos = []
+    for ini, fin in fragmentos_ms:
+        if fin > ini:
+            eventos.append((ini, 1, 0))
+            eventos.append((fin, -1, 0))
+    for ini, fin in validos_ms:
+        eventos.append((ini, 0, 1))
+        eventos.append((fin, 0, -1))
+    eventos.sort()
+
+    esperado = grabado = 0
+    huecos, traslapes = [], []
+    profundidad = valido = 0
+    anterior = None
+
+    i = 0
+    while i < len(eventos):
+        t = eventos[i][0]
+
+        if anterior is not None and t > anterior and valido > 0:
+            dt = t - anterior
+            esperado += dt
+            if profundidad > 0:
+                grabado += dt
+            else:
+                _agregar_tramo(huecos, anterior, t)
+            if profundidad > 1:
+                _agregar_tramo(traslapes, anterior, t)
+
+        # Todos los eventos del mismo instante se aplican juntos
+        while i < len(eventos) and eventos[i][0] == t:
+            profundidad += eventos[i][1]
+            valido += eventos[i][2]
+            i += 1
+        anterior = t
+
+    return {
+        "esperado_ms": esperado,
+        "grabado_ms": grabado,
+        "huecos": [tuple(h) for h in huecos],
+        "traslapes": [tuple(t) for t in traslapes],
+    }
+
+
+def _tramos_seg(tramos):
+    return [
+        {
+            "inicio_ms": ini,
+            "fin_ms": fin,
+            "duracion_seg": round((fin - ini) / 1000, 3),
+        }
+        for ini, fin in tramos
+    ]
+
+
+def cobertura_sesion(fragmentos_ms, inicio_ms, fin_ms, pausas_ms=()):
+    """Resumen serializable (JSON) de la cobertura de una cámara."""
+    validos = intervalos_validos_ms(inicio_ms, fin_ms, pausas_ms)
+    r = barrido_cobertura(fragmentos_ms, validos)
+
+    esperado = r["esperado_ms"]
+    grabado = r["grabado_ms"]
+    return {
+        "inicio_ms": inicio_ms,
+        "fin_ms": fin_ms,
+        "fragmentos": len(fragmentos_ms),
+        "esperado_seg": round(esperado / 1000, 3),
+        "grabado_seg": round(grabado / 1000, 3),
+        "faltante_seg": round((esperado - grabado) / 1000, 3),
+        "porcentaje": round(100 * grabado / esperado, 2) if esperado else 0.0,
+        "huecos": _tramos_seg(r["huecos"]),
+        "traslapes": _tramos_seg(r["traslapes"]),
+    }
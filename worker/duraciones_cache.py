@@ -0,0 +1,153 @@
+# ============================================================
+#   SEMEFO — duraciones_cache.py
+#   Cache persistente de duraciones ffprobe por fragmento.
+#   Clave (ruta, tamaño, mtime): si el archivo cambia en el SMB
+#   la entrada deja de coincidir y se vuelve a probar.
+#   SQLite local en TEMP_ROOT, compartido por todas las sesiones
+#   de la misma cámara/día (y por todos los procesos del host).
+# ============================================================
+
+import os
+import sqlite3
+import threading
+import time
+
+TEMP_ROOT = os.getenv("TEMP_ROOT", "/opt/semefo/storage/tmp")
+DURACIONES_CACHE_PATH = os.getenv(
+    "DURACIONES_CACHE_PATH", os.path.join(TEMP_ROOT, "duraciones.sqlite"))
+
+# Entradas no consultadas en N días se purgan al abrir conexión
+# (como máximo una vez por hora por proceso)
+DURACIONES_CACHE_DIAS = int(os.getenv("DURACIONES_CACHE_DIAS", "30"))
+_PURGA_CADA_SEG = 3600
+
+_local = threading.local()
+_lock = threading.Lock()
+# [(hilo, conexión)] para cerrar las de hilos que ya terminaron
+_conexiones = []
+_ultima_purga = 0.0
+
+
+# ============================================================
+#   CONEXIÓN
+# ============================================================
+
+def _conexion():
+    """
+    Una conexión por hilo (sqlite3 no comparte conexiones entre hilos).
+    check_same_thread=False solo para poder cerrarla desde otro hilo
+    cuando el suyo ya terminó.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+
+    os.makedirs(os.path.dirname(DURACIONES_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(
+        DURACIONES_CACHE_PATH, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS duraciones (
+            ruta TEXT PRIMARY KEY,
+            tamano INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            duracion REAL NOT NULL,
+            usado REAL NOT NULL
+        )
+        """
+    )
+    conn.commit()
+    _purgar(conn)
+
+    cerrar_conexiones_inactivas()
+    with _lock:
+        _conexiones.append((threading.current_thread(), conn))
+    _local.conn = conn
+    return conn
+
+
+def _purgar(conn):
+    """Purga de entradas sin uso, como máximo una vez por _PURGA_CADA_SEG."""
+    global _ultima_purga
+    with _lock:
+        if time.time() - _ultima_purga < _PURGA_CADA_SEG:
+            return
+        _ultima_purga = time.time()
+
+    conn.execute(
+        "DELETE FROM duraciones WHERE usado < ?",
+        (time.time() - DURACIONES_CACHE_DIAS * 86400,)
+    )
+    conn.commit()
+
+
+def cerrar_conexiones_inactivas():
+    """Cierra las conexiones de hilos que ya terminaron (p. ej. un pool cerrado)."""
+    with _lock:
+        inactivas = [c for h, c in _conexiones if not h.is_alive()]
+        _conexiones[:] = [(h, c) for h, c in _conexiones if h.is_alive()]
+
+    for conn in inactivas:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+# ============================================================
+#   API PÚBLICA
+# ============================================================
+
+def firma_archivo(path):
+    """(tamaño, mtime_ns) del archivo, o None si no se puede leer."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def obtener_cacheada(path, firma):
+    """Duración guardada para `path` si la firma coincide; si no, None."""
+    if firma is None:
+        return None
+
+    try:
+        conn = _conexion()
+        fila = conn.execute(
+            "SELECT tamano, mtime_ns, duracion FROM duraciones WHERE ruta = ?",
+            (path,)
+        ).fetchone()
+
+        if not fila or (fila[0], fila[1]) != tuple(firma):
+            return None
+
+        conn.execute(
+            "UPDATE duraciones SET usado = ? WHERE ruta = ?",
+            (time.time(), path)
+        )
+        conn.commit()
+        return fila[2]
+
+    except sqlite3.Error as e:
+        print(f"[DURACIONES] Cache no disponible ({e}) → ffprobe directo")
+        return None
+
+
+def guardar_cacheada(path, firma, duracion):
+    if firma is None or duracion is None:
+        return
+
+    try:
+        conn = _conexion()
+        conn.execute(
+            "INSERT OR REPLACE INTO duraciones "
+            "(ruta, tamano, mtime_ns, duracion, usado) VALUES (?, ?, ?, ?, ?)",
+            (path, firma[0], firma[1], float(duracion), time.time())
+        )
+        conn.commit()
+
+    except sqlite3.Error as e:
+        print(f"[DURACIONES] No se pudo guardar en cache {path}: {e}")
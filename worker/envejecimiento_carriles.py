@@ -0,0 +1,62 @@
+# ============================================================
+#   SEMEFO — envejecimiento_carriles.py
+#   Sube la prioridad de las uniones que llevan tiempo en cola y
+#   pasa al carril corto las largas que esperaron demasiado
+#   (ver worker/carriles.py → promover_envejecidos).
+#
+#   Uso (servicio envejecimiento_carriles en docker-compose):
+#     python -m worker.envejecimiento_carriles
+# ============================================================
+
+import os
+import signal
+import time
+
+from worker.carriles import (
+    UNION_ENVEJECIMIENTO_MOVER_SEG,
+    UNION_ENVEJECIMIENTO_SEG,
+    promover_envejecidos,
+)
+from worker.celery_app import celery_app
+
+UNION_ENVEJECIMIENTO_POLL_SEG = max(
+    5, int(os.getenv("UNION_ENVEJECIMIENTO_POLL_SEG", "60")))
+
+_detener = False
+
+
+def _senal(*_):
+    global _detener
+    _detener = True
+
+
+def main():
+    signal.signal(signal.SIGTERM, _senal)
+    signal.signal(signal.SIGINT, _senal)
+
+    print(
+        f"[CARRIL] Envejecimiento iniciado (paso={UNION_ENVEJECIMIENTO_SEG}s, "
+        f"mover={UNION_ENVEJECIMIENTO_MOVER_SEG}s, "
+        f"ciclo={UNION_ENVEJECIMIENTO_POLL_SEG}s)")
+
+    while not _detener:
+        try:
+            with celery_app.connection_for_write() as conexion:
+                conexion.ensure_connection(max_retries=3)
+                r = promover_envejecidos(conexion.default_channel)
+            if any(r.values()):
+                print(f"[CARRIL] Promovidos: {r}")
+        except Exception as e:
+            # Los mensajes tomados y no confirmados vuelven solos a la
+            # cola al cerrarse el canal
+            print(f"[CARRIL] Error en ciclo de envejecimiento: {e}")
+
+        fin = time.monotonic() + UNION_ENVEJECIMIENTO_POLL_SEG
+        while not _detener and time.monotonic() < fin:
+            time.sleep(1)
+
+    print("[CARRIL] Envejecimiento detenido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# ============================================================
+#   SEMEFO — intervalos.py
+#   Álgebra de intervalos para la unión: intervalos válidos
+#   (sesión menos pausas) × fragmentos → lista de cortes
+#   (índice de fragmento, in_ms, out_ms) en orden de reproducción.
+#
+#   Motor sobre arreglos int64 de ms epoch con NumPy searchsorted;
+#   si NumPy no está disponible se usa el mismo algoritmo con bisect.
+# ============================================================
+
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+try:
+    import numpy as np
+except ImportError:  # API / entornos sin numpy
+    np = None
+
+
+def _fin_max(fines):
+    """Máximo acumulado de fines: monotónico aunque haya traslapes."""
+    return list(accumulate(fines, max))
+
+
+# ============================================================
+#   MOTOR NUMPY
+# ============================================================
+
+def _cortes_numpy(frag_ini, frag_fin, val_ini, val_fin):
+    f_ini = np.asarray(frag_ini, dtype=np.int64)
+    f_fin = np.asarray(frag_fin, dtype=np.int64)
+    v_ini = np.asarray(val_ini, dtype=np.int64)
+    v_fin = np.asarray(val_fin, dtype=np.int64)
+
+    if not len(f_ini) or not len(v_ini):
+        return []
+
+    # Candidatos por intervalo j: fragmentos [lo_j, hi_j) con
+    # fin_max > v_ini[j] y f_ini < v_fin[j]
+    fin_max = np.maximum.accumulate(f_fin)
+    lo = np.searchsorted(fin_max, v_ini, side="right")
+    hi = np.searchsorted(f_ini, v_fin, side="left")
+    cuenta = np.clip(hi - lo, 0, None)
+
+    total = int(cuenta.sum())
+    if not total:
+        return []
+
+    # Expande los rangos [lo_j, hi_j) sin loop de Python
+    j = np.repeat(np.arange(len(v_ini)), cuenta)
+    base = np.repeat(np.cumsum(cuenta) - cuenta, cuenta)
+    i = np.repeat(lo, cuenta) + (np.arange(total) - base)
+
+    entrada = np.maximum(v_ini[j], f_ini[i]) - f_ini[i]
+    salida = np.minimum(v_fin[j], f_fin[i]) - f_ini[i]
+
+    ok = salida > entrada
+    return list(zip(
+        i[ok].tolist(), entrada[ok].tolist(), salida[ok].tolist()))
+
+
+# ============================================================
+#   MOTOR PURO PYTHON (fallback)
+# ============================================================
+
+def _cortes_python(frag_ini, frag_fin, val_ini, val_fin):
+    fin_max = _fin_max(frag_fin)
+    cortes = []
+
+    for vi, vf in zip(val_ini, val_fin):
+        lo = bisect_right(fin_max, vi)
+        hi = bisect_left(frag_ini, vf)
+        for i in range(lo, hi):
+            entrada = max(vi, frag_ini[i]) - frag_ini[i]
+            salida = min(vf, frag_fin[i]) - frag_ini[i]
+            if salida > entrada:
+                cortes.append((i, entrada, salida))
+
+    return cortes
+
+
+# ============================================================
+#   API PÚBLICA
+# ============================================================
+
+def calcular_cortes(frag_ini, frag_fin, val_ini, val_fin, usar_numpy=True):
+    """
+    frag_ini/frag_fin: ms epoch de cada fragmento, ORDENADOS por inicio.
+    val_ini/val_fin: intervalos válidos disjuntos y ordenados.
+
+    Retorna [(i, in_ms, out_ms)]: in/out relativos al inicio del
+    fragmento i, en orden de reproducción (por intervalo, luego por
+    fragmento). Un corte es el fragmento completo si
+    in_ms == 0 and out_ms == frag_fin[i] - frag_ini[i].
+    """
+    if usar_numpy and np is not None:
+        return _cortes_numpy(frag_ini, frag_fin, val_ini, val_fin)
+    return _cortes_python(list(frag_ini), list(frag_fin),
+                          list(val_ini), list(val_fin))
@@ -9,6 +9,7 @@ import requests
 from datetime import datetime, timezone
 import base64
 import json
+from urllib.parse import quote, urlencode
 
 
 # ============================================================
@@ -184,7 +185,7 @@ def _solo_job_id(job_id):
     raise ValueError(f"job_id inválido ({type(job_id).__name__}): {job_id}")
 
 
-def actualizar_job(job_id, estado=None, resultado=None, error=None):
+def actualizar_job(job_id, estado=None, resultado=None, error=None, archivo=None):
     try:
         jid = _solo_job_id(job_id)  # ✅
         if jid is None:
@@ -198,6 +199,8 @@ def actualizar_job(job_id, estado=None, resultado=None, error=None):
             payload["resultado"] = resultado
         if error is not None:
             payload["error"] = error
+        if archivo is not None:
+            payload["archivo"] = archivo
 
         _request("PUT", f"{API_URL}/jobs/{jid}/actualizar",
                  json=payload, timeout=10)
@@ -286,6 +289,71 @@ def finalizar_archivo(
         return False
 
 
+def actualizar_progreso(sesion_id, tipo_archivo, progreso):
+    """
+    Reporta % de avance de un archivo en proceso.
+    Endpoint: PUT /sesiones/{sesion_id}/progreso/{tipo_archivo}
+    """
+    try:
+        _request(
+            "PUT",
+            f"{API_URL}/sesiones/{sesion_id}/progreso/{tipo_archivo}",
+            json={"progreso": progreso},
+            timeout=5
+        )
+        return True
+
+    except Exception as e:
+        print(f"❌ Error reportando progreso {tipo_archivo}: {e}")
+        return False
+
+
+# ============================================================
+#   FRAGMENTOS POR CÁMARA
+# ============================================================
+def registrar_fragmentos(camara_mac, fragmentos, lote=500):
+    """
+    Publica fragmentos nuevos en el índice del master.
+    fragmentos: [{inicio_ms, fin_ms, ruta, tamano_bytes}]
+    Endpoint: POST /fragmentos/{camara_mac}
+    """
+    try:
+        insertados = 0
+        for i in range(0, len(fragmentos), lote):
+            r = _request(
+                "POST",
+                f"{API_URL}/fragmentos/{quote(camara_mac, safe='')}",
+                json={"fragmentos": fragmentos[i:i + lote]},
+                timeout=30
+            )
+            insertados += (r.json() or {}).get("insertados", 0)
+        return insertados
+
+    except Exception as e:
+        print(f"❌ Error registrando fragmentos de {camara_mac}: {e}")
+        return None
+
+
+def obtener_fragmentos(camara_mac, desde_iso, hasta_iso):
+    """
+    Fragmentos de la cámara que se traslapan con [desde, hasta].
+    Endpoint: GET /fragmentos/{camara_mac}?desde=&hasta=
+    Retorna lista (ordenada por inicio) o None si la API no respondió.
+    """
+    try:
+        qs = urlencode({"desde": desde_iso, "hasta": hasta_iso})
+        r = _request(
+            "GET",
+            f"{API_URL}/fragmentos/{quote(camara_mac, safe='')}?{qs}",
+            timeout=10
+        )
+        return (r.json() or {}).get("fragmentos", [])
+
+    except Exception as e:
+        print(f"❌ Error consultando fragmentos de {camara_mac}: {e}")
+        return None
+
+
 # ============================================================
 #   PAUSAS AUTO
 # ============================================================
@@ -9,11 +9,19 @@ import os
 import json
 import subprocess
 import fcntl
+import time
+from concurrent.futures import ThreadPoolExecutor
 from glob import glob
 from dotenv import load_dotenv
 from .celery_app import celery_app
-from worker.job_api_client import actualizar_job
+from worker.job_api_client import actualizar_job, registrar_fragmentos
 from worker.heartbeat import send_heartbeat
+from worker.admision import slot_ffmpeg
+from worker.manifest_indice import ruta_indice, escribir_indice, agregar_al_indice, abrir_indice
+from worker.manifest_journal import ruta_journal, leer_journal, leer_journal_desde, agregar_al_journal, contar_lineas, fusionar, leer_meta, guardar_meta, tamano_journal
+from worker.duraciones_cache import (
+    firma_archivo, obtener_cacheada, guardar_cacheada, cerrar_conexiones_inactivas
+)
 from datetime import datetime, timedelta, timezone, date
 
 load_dotenv()
@@ -24,13 +32,60 @@ GRABADOR_UUID = os.getenv("GRABADOR_UUID", "UNKNOWN_UUID")
 
 EXT_FRAGMENTO = "*.mkv"
 
+# ffprobe concurrentes al indexar un día nuevo (fuera del lock del manifest)
+MANIFEST_PROBE_WORKERS = max(1, int(os.getenv("MANIFEST_PROBE_WORKERS", "8")))
+# Hilos que declara ante admisión cada ffprobe (un lote pide workers × esto)
+MANIFEST_PROBE_HILOS = max(1, int(os.getenv("MANIFEST_PROBE_HILOS", "1")))
+
+# El grabador nombra los fragmentos <inicio_ms>_<duracion_ms>.mkv.
+# 1 (default) = confiar en el sufijo (sin ffprobe); ffprobe solo si no
+# parsea. 0 = ffprobe (o cache) para cada fragmento.
+MANIFEST_DURACION_SUFIJO = os.getenv(
+    "MANIFEST_DURACION_SUFIJO", "1").strip() in ("1", "true", "True", "yes", "YES")
+# % de fragmentos a verificar con ffprobe en segundo plano (0 = apagado)
+MANIFEST_VERIFICAR_PCT = float(os.getenv("MANIFEST_VERIFICAR_PCT", "5"))
+# Diferencia máxima aceptada entre sufijo y ffprobe (segundos)
+MANIFEST_VERIFICAR_TOLERANCIA = float(
+    os.getenv("MANIFEST_VERIFICAR_TOLERANCIA", "1.0"))
+# Un sufijo mayor a esto se considera basura y se usa ffprobe
+DURACION_SUFIJO_MAX_SEG = 6 * 3600
+
+# Líneas en manifest.journal que disparan la compactación al snapshot
+MANIFEST_COMPACTAR_LINEAS = max(
+    1, int(os.getenv("MANIFEST_COMPACTAR_LINEAS", "200")))
+
+# Publicar fragmentos nuevos en la tabla fragmentos_camara (vía API)
+FRAGMENTOS_INDICE_API = os.getenv("FRAGMENTOS_INDICE_API", "1").strip() in (
+    "1", "true", "True", "yes", "YES")
+
+# Espera máxima por el último fragmento de la sesión (antes: sleep fijo)
+MANIFEST_WAIT_SECONDS = int(os.getenv("MANIFEST_WAIT_SECONDS", "300"))
+# Cada cuánto se reintenta la tarea mientras el fragmento final no existe
+MANIFEST_POLL_SEG = max(1, int(os.getenv("MANIFEST_POLL_SEG", "15")))
+
 
 # ============================================================
 #   UTILIDADES
 # ============================================================
 
 def obtener_duracion(path):
-    """Obtiene duración REAL del MKV usando ffprobe."""
+    """
+    Obtiene duración REAL del MKV. Primero consulta el cache persistente
+    (ruta, tamaño, mtime); solo si no hay coincidencia corre ffprobe.
+    """
+    firma = firma_archivo(path)
+
+    dur = obtener_cacheada(path, firma)
+    if dur is not None:
+        return dur
+
+    dur = _ffprobe_duracion(path)
+    guardar_cacheada(path, firma, dur)
+    return dur
+
+
+def _ffprobe_duracion(path):
+    """Duración REAL del MKV usando ffprobe (sin cache)."""
     try:
         result = subprocess.run(
             [
@@ -58,6 +113,22 @@ def obtener_duracion(path):
         return None
 
 
+def duracion_desde_sufijo(filename):
+    """
+    1764662554731_76000.mkv → 76.0 (segundos). None si el sufijo no
+    parsea limpio o es absurdo.
+    """
+    nombre = os.path.splitext(filename)[0]
+    partes = nombre.split("_")
+    if len(partes) != 2 or not partes[1].isdigit():
+        return None
+
+    dur = int(partes[1]) / 1000
+    if dur <= 0 or dur > DURACION_SUFIJO_MAX_SEG:
+        return None
+    return dur
+
+
 def extraer_timestamps(filename, fullpath):
     """
     Convierte nombres como:
@@ -77,7 +148,11 @@ def extraer_timestamps(filename, fullpath):
         # Conversión segura a datetime
         inicio = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
 
-        dur = obtener_duracion(fullpath)
+        dur = None
+        if MANIFEST_DURACION_SUFIJO:
+            dur = duracion_desde_sufijo(filename)
+        if dur is None:
+            dur = obtener_duracion(fullpath)
         if dur is None:
             return None, None, None
 
@@ -108,37 +183,164 @@ def cargar_manifest(path_manifest):
     return {}
 
 
+def cargar_manifest_completo(path_manifest):
+    """
+    Snapshot + journal fusionados: la vista que deben usar los lectores.
+
+    Sin lock, pero el journal se lee ANTES que el snapshot: compactar
+    hace rename del snapshot y después trunca el journal, así que si
+    aquí se ve el journal ya truncado, el snapshot leído después ya
+    incluye esas líneas. Al revés (snapshot viejo + journal truncado)
+    se perderían fragmentos.
+    """
+    entradas = leer_journal(ruta_journal(path_manifest))
+    manifest = cargar_manifest(path_manifest)
+    if entradas:
+        manifest["archivos"] = fusionar(manifest.get("archivos", []), entradas)
+    return manifest
+
+
 def guardar_manifest(path_manifest, data):
+    """Escritura atómica (temp + fsync + rename). Retorna True si se guardó."""
     os.makedirs(os.path.dirname(path_manifest), exist_ok=True)
+    tmp = f"{path_manifest}.{os.getpid()}.tmp"
 
     try:
-        with open(path_manifest, "w", encoding="utf-8") as f:
+        with open(tmp, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path_manifest)
+        return True
     except Exception as e:
         print(f"[MANIFEST] ERROR guardando manifest {path_manifest}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
 
 
-def _actualizar_manifest_con_lock(path_manifest, mac_camara, fecha_iso, fragmentos):
+def compactar_manifest(path_manifest, mac_camara, fecha_iso):
     """
-    Actualiza manifest.json con lock exclusivo para evitar condiciones de
-    carrera cuando varias sesiones terminan al mismo tiempo (misma cámara/día).
+    Vuelca el journal al snapshot y lo vacía. Llamar con el lock tomado.
+    Si el crash ocurre entre el rename y el truncate, las líneas quedan
+    repetidas en el journal y los lectores las deduplican.
     """
+    path_journal = ruta_journal(path_manifest)
+
+    manifest = cargar_manifest_completo(path_manifest)
+    manifest.setdefault("uuid", GRABADOR_UUID)
+    manifest.setdefault("fecha", fecha_iso)
+    manifest.setdefault("camara_mac", mac_camara)
+    manifest.setdefault("archivos", [])
+
+    if guardar_manifest(path_manifest, manifest):
+        os.truncate(path_journal, 0)
+        meta = leer_meta(path_journal)
+        guardar_meta(path_journal, {
+            "generacion": meta["generacion"] + 1, "lineas": 0, "bytes": 0})
+        print(
+            f"[MANIFEST] Journal compactado → {path_manifest} "
+            f"({len(manifest['archivos'])} fragmentos)")
+
+
+def probar_fragmentos(fragmentos, max_workers=MANIFEST_PROBE_WORKERS):
+    """
+    Corre extraer_timestamps en paralelo (pool de hilos: el trabajo real
+    ocurre en procesos ffprobe). Retorna {ruta: (inicio, fin, dur)}.
+
+    Los fragmentos con sufijo confiable (MANIFEST_DURACION_SUFIJO) se
+    resuelven sin ffprobe; el resto corre dentro de un slot de admisión
+    de workers × MANIFEST_PROBE_HILOS hilos.
+    """
+    if not fragmentos:
+        return {}
+
+    def _probar(file_path):
+        return extraer_timestamps(os.path.basename(file_path), file_path)
+
+    resultados = {}
+    con_ffprobe = []
+    for f in fragmentos:
+        if MANIFEST_DURACION_SUFIJO and duracion_desde_sufijo(os.path.basename(f)) is not None:
+            resultados[f] = _probar(f)
+        else:
+            con_ffprobe.append(f)
+    if not con_ffprobe:
+        return resultados
+
+    workers = min(max_workers, len(con_ffprobe))
+    with slot_ffmpeg(workers * MANIFEST_PROBE_HILOS, f"ffprobe:{len(con_ffprobe)}"):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            resultados.update(zip(con_ffprobe, pool.map(_probar, con_ffprobe)))
+    # Los hilos del pool ya terminaron: cerrar sus conexiones al cache
+    cerrar_conexiones_inactivas()
+    return resultados
+
+
+def vista_manifest(path_manifest):
+    """
+    Lectura sin lock de lo ya indexado: {"archivos", "timestamps"} para
+    deduplicar, más la generación y el byte del journal hasta donde se
+    leyó. Orden meta → journal → snapshot: si una compactación se cruza
+    con esta lectura, la generación que se ve con el lock ya no coincide
+    y el merge vuelve a leer todo.
+    """
+    path_journal = ruta_journal(path_manifest)
+    generacion = leer_meta(path_journal)["generacion"]
+    entradas, offset = leer_journal_desde(path_journal)
+    existentes = cargar_manifest(path_manifest).get("archivos", []) + entradas
+    return {
+        "generacion": generacion,
+        "offset": offset,
+        "archivos": {a["archivo"] for a in existentes},
+        "timestamps": {(a["inicio"], a["fin"]) for a in existentes},
+    }
+
+
+def _actualizar_manifest_con_lock(path_manifest, mac_camara, fecha_iso, fragmentos, probados=None, vista=None):
+    """
+    Registra fragmentos nuevos con lock exclusivo para evitar condiciones
+    de carrera cuando varias sesiones terminan al mismo tiempo (misma
+    cámara/día).
+
+    Día nuevo → snapshot inicial directo. Día existente → una línea por
+    fragmento en manifest.journal (O_APPEND), sin reescribir el snapshot;
+    al pasar MANIFEST_COMPACTAR_LINEAS se compacta.
+
+    probados: {ruta: (inicio, fin, dur)} calculado antes de tomar el lock.
+    Solo los fragmentos que falten ahí (aparecidos entre el probe y el
+    lock) se prueban dentro de la sección crítica.
+
+    vista: vista_manifest() leída antes del lock. Si la generación no
+    cambió, con el lock solo se lee la cola del journal posterior a esa
+    lectura, así que el trabajo bajo lock es O(fragmentos nuevos).
+    """
+    probados = probados or {}
     lock_path = f"{path_manifest}.lock"
+    path_journal = ruta_journal(path_manifest)
     os.makedirs(os.path.dirname(path_manifest), exist_ok=True)
 
     with open(lock_path, "w") as lock_fp:
         fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
 
-        manifest = cargar_manifest(path_manifest)
-        manifest.setdefault("uuid", GRABADOR_UUID)
-        manifest.setdefault("fecha", fecha_iso)
-        manifest.setdefault("camara_mac", mac_camara)
-        manifest.setdefault("archivos", [])
+        # Con el lock tomado nadie compacta: snapshot y journal son consistentes
+        meta = leer_meta(path_journal)
+        tamano = tamano_journal(path_journal)
 
-        ya_archivos = {a["archivo"] for a in manifest["archivos"]}
-        ya_timestamps = {
-            (a["inicio"], a["fin"]) for a in manifest["archivos"]
-        }
+        if (vista is not None and vista["generacion"] == meta["generacion"]
+                and tamano >= vista["offset"]):
+            cola, _ = leer_journal_desde(path_journal, vista["offset"])
+            for a in cola:
+                vista["archivos"].add(a["archivo"])
+                vista["timestamps"].add((a["inicio"], a["fin"]))
+        else:
+            # Compactación (o snapshot nuevo) entre la vista y el lock
+            vista = vista_manifest(path_manifest)
+
+        ya_archivos = vista["archivos"]
+        ya_timestamps = vista["timestamps"]
 
         nuevos = []
         for file_path in fragmentos:
@@ -147,7 +349,10 @@ def _actualizar_manifest_con_lock(path_manifest, mac_camara, fecha_iso, fragment
             if archivo in ya_archivos:
                 continue
 
-            inicio, fin, dur = extraer_timestamps(archivo, file_path)
+            if file_path in probados:
+                inicio, fin, dur = probados[file_path]
+            else:
+                inicio, fin, dur = extraer_timestamps(archivo, file_path)
             if inicio is None:
                 continue
 
@@ -163,15 +368,130 @@ def _actualizar_manifest_con_lock(path_manifest, mac_camara, fecha_iso, fragment
                 "ruta": file_path,
             }
 
-            manifest["archivos"].append(entry)
+            ya_archivos.add(archivo)
             nuevos.append(entry)
 
-        manifest["archivos"].sort(key=lambda x: x["inicio"])
-        guardar_manifest(path_manifest, manifest)
+        if not os.path.exists(path_manifest):
+            if guardar_manifest(path_manifest, {
+                "uuid": GRABADOR_UUID,
+                "fecha": fecha_iso,
+                "camara_mac": mac_camara,
+                "archivos": fusionar(leer_journal(path_journal), nuevos),
+            }):
+                meta["generacion"] += 1
+                guardar_meta(path_journal, meta)
+        elif nuevos or meta["bytes"] != tamano:
+            if meta["bytes"] != tamano:
+                # Meta desfasado (crash tras un append o día previo al meta)
+                meta["lineas"] = contar_lineas(path_journal)
+            agregar_al_journal(path_journal, nuevos)
+            meta["lineas"] += len(nuevos)
+            meta["bytes"] = tamano_journal(path_journal)
+            guardar_meta(path_journal, meta)
+
+        actualizar_indice(path_manifest, mac_camara, nuevos)
+
+        if meta["lineas"] >= MANIFEST_COMPACTAR_LINEAS:
+            compactar_manifest(path_manifest, mac_camara, fecha_iso)
 
     return nuevos
 
 
+def actualizar_indice(path_manifest, mac_camara, nuevos):
+    """
+    Mantiene manifest.idx en sincronía (llamar con el lock tomado):
+    append de lo nuevo si está sano, reconstrucción completa si no existe
+    o quedó con un registro truncado (un append detrás de basura
+    desalinearía todo lo siguiente).
+    Ante error se borra el índice para que los lectores usen el JSON.
+    """
+    path_idx = ruta_indice(path_manifest)
+    try:
+        with abrir_indice(path_idx) as indice:
+            sano = indice is not None and indice.completo
+        if sano:
+            agregar_al_indice(path_idx, nuevos)
+        else:
+            escribir_indice(
+                path_idx, mac_camara,
+                cargar_manifest_completo(path_manifest).get("archivos", []))
+    except Exception as e:
+        print(f"[MANIFEST] Error actualizando índice {path_idx}: {e}")
+        try:
+            os.remove(path_idx)
+        except OSError:
+            pass
+
+
+def publicar_fragmentos(mac_camara, entradas):
+    """Envía las entradas nuevas del manifest al índice del master (BD)."""
+    if not FRAGMENTOS_INDICE_API or not entradas:
+        return
+
+    fragmentos = []
+    for e in entradas:
+        try:
+            tamano = os.path.getsize(e["ruta"])
+        except OSError:
+            tamano = None
+        fragmentos.append({
+            "inicio_ms": int(datetime.fromisoformat(e["inicio"]).timestamp() * 1000),
+            "fin_ms": int(datetime.fromisoformat(e["fin"]).timestamp() * 1000),
+            "ruta": e["ruta"],
+            "tamano_bytes": tamano,
+        })
+
+    insertados = registrar_fragmentos(mac_camara, fragmentos)
+    print(f"[MANIFEST] Índice BD: {insertados} de {len(fragmentos)} fragmentos")
+
+
+def listar_fragmentos(mac_camara, fecha_base):
+    """Rutas de fragmentos de la cámara para el día y el siguiente."""
+    rutas = []
+    for fecha in obtener_fechas_a_procesar(fecha_base):
+        ruta_frag = os.path.join(
+            SMB_ROOT,
+            GRABADOR_UUID,
+            "hi_quality",
+            mac_camara,
+            fecha.strftime("%Y"),
+            fecha.strftime("%m"),
+            fecha.strftime("%d")
+        )
+        rutas.extend(glob(os.path.join(ruta_frag, "*", EXT_FRAGMENTO)))
+    return rutas
+
+
+def fragmento_final_listo(rutas, fin_sesion):
+    """
+    True si algún fragmento completo (con sufijo) cubre o rebasa el fin
+    de la sesión: inicio + duración(sufijo) >= fin, o inicio >= fin.
+    fin_sesion: datetime aware UTC.
+    """
+    fin_ms = fin_sesion.timestamp() * 1000
+
+    for ruta in rutas:
+        archivo = os.path.basename(ruta)
+        dur = duracion_desde_sufijo(archivo)
+        if dur is None:
+            continue
+        try:
+            inicio_ms = int(archivo.split("_")[0])
+        except ValueError:
+            continue
+        if inicio_ms + dur * 1000 >= fin_ms:
+            return True
+
+    return False
+
+
+def _fin_sesion_utc(fin_iso):
+    dt = datetime.fromisoformat(fin_iso)
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
 def ruta_manifest(mac, fecha):
     yyyy = fecha.strftime("%Y")
     mm = fecha.strftime("%m")
@@ -193,31 +513,65 @@ def ruta_manifest(mac, fecha):
 #   CELERY TASK — GENERAR MANIFEST INCREMENTAL SEGURo
 # ============================================================
 
-@celery_app.task(name="tasks.generar_manifest", queue="manifest")
-def generar_manifest(mac_camara, fecha_iso, job_id):
+@celery_app.task(name="tasks.generar_manifest", queue="manifest", bind=True)
+def generar_manifest(self, mac_camara, fecha_iso, job_id, fin_iso=None, limite_ts=None, tolerante=False):
     """
     Genera o actualiza el manifest de una cámara en un día.
     Solo agrega fragmentos nuevos, con validación extendida.
-    Ahora espera 5 minutos ANTES de generar el manifest.
+
+    Antes de generar espera a que exista el fragmento que cubre fin_iso.
+    La espera NO bloquea el worker: la tarea se reencola con countdown
+    (MANIFEST_POLL_SEG) hasta que el fragmento aparece o se llega al
+    límite de MANIFEST_WAIT_SECONDS. Sin fin_iso se espera el límite.
+
+    tolerante=True (cabecera del chord de unir_sesion): un error deja el
+    job en error y retorna {"error", "camara"} en lugar de lanzar, para
+    que el chord siga y la otra cámara se una igual.
     """
-    import time
+    fecha_base = datetime.fromisoformat(fecha_iso).date()
+
+    # ============================================================
+    #   ESPERA DEL ÚLTIMO FRAGMENTO (reintento, no sleep)
+    # ============================================================
+    if limite_ts is None:
+        limite_ts = time.time() + MANIFEST_WAIT_SECONDS
+        actualizar_job(job_id, estado="procesando", error=None)
+
     try:
-        # ============================================================
-        #   ESPERA REQUERIDA PARA ASEGURAR EL ÚLTIMO FRAGMENTO
-        # ============================================================
-        # por defecto 5 minutos
-        WAIT_SECONDS = int(os.getenv("MANIFEST_WAIT_SECONDS", "300"))
+        listo = bool(fin_iso) and fragmento_final_listo(
+            listar_fragmentos(mac_camara, fecha_base), _fin_sesion_utc(fin_iso))
+    except (OSError, ValueError) as e:
+        # Solo fallas de SMB o un fin_iso ilegible; un error de código
+        # (NameError, TypeError...) debe fallar la tarea, no esperar el límite
+        print(f"[MANIFEST] Error verificando fragmento final: {e}")
+        listo = False
+
+    if not listo and time.time() < limite_ts:
+        restante = limite_ts - time.time()
+        print(
+            f"[MANIFEST] Cámara {mac_camara}: fragmento final aún no disponible, "
+            f"reintento en {MANIFEST_POLL_SEG}s (límite en {restante:.0f}s)")
+        raise self.retry(
+            args=[mac_camara, fecha_iso, job_id],
+            kwargs={"fin_iso": fin_iso, "limite_ts": limite_ts,
+                    "tolerante": tolerante},
+            countdown=min(MANIFEST_POLL_SEG, max(1, restante)),
+            max_retries=None,
+        )
 
+    if listo:
+        print(f"[MANIFEST] Cámara {mac_camara}: fragmento final disponible")
+    else:
         print(
-            f"[MANIFEST] Esperando {WAIT_SECONDS} segundos antes de generar manifest para cámara {mac_camara}...")
-        time.sleep(WAIT_SECONDS)
+            f"[MANIFEST] Cámara {mac_camara}: límite de {MANIFEST_WAIT_SECONDS}s "
+            f"alcanzado, se genera con lo disponible")
+
+    try:
         print(
             f"[MANIFEST] Iniciando generación real del manifest para cámara {mac_camara}")
 
         pid = os.getpid()
 
-        actualizar_job(job_id, estado="procesando", error=None)
-
         # send_heartbeat(
         #    worker="manifest",
         #    status="processing",
@@ -225,24 +579,7 @@ def generar_manifest(mac_camara, fecha_iso, job_id):
         #    queue="manifest"
         # )
 
-        fecha_base = datetime.fromisoformat(fecha_iso).date()
-        fechas_a_procesar = obtener_fechas_a_procesar(fecha_base)
-
-        todas_las_rutas = []
-
-        for fecha in fechas_a_procesar:
-            ruta_frag = os.path.join(
-                SMB_ROOT,
-                GRABADOR_UUID,
-                "hi_quality",
-                mac_camara,
-                fecha.strftime("%Y"),
-                fecha.strftime("%m"),
-                fecha.strftime("%d")
-            )
-
-            pattern = os.path.join(ruta_frag, "*", EXT_FRAGMENTO)
-            todas_las_rutas.extend(glob(pattern))
+        todas_las_rutas = listar_fragmentos(mac_camara, fecha_base)
 
         if not todas_las_rutas:
             msg = "No se encontraron fragmentos para generar manifest"
@@ -252,16 +589,42 @@ def generar_manifest(mac_camara, fecha_iso, job_id):
         fragmentos = sorted(todas_las_rutas)
 
         path_manifest = ruta_manifest(mac_camara, fecha_base)
+
+        # ffprobe en paralelo SIN lock; el lock solo cubre merge + escritura
+        vista = vista_manifest(path_manifest)
+        pendientes = [
+            f for f in fragmentos if os.path.basename(f) not in vista["archivos"]]
+        t_probe = time.monotonic()
+        probados = probar_fragmentos(pendientes)
+        print(
+            f"[MANIFEST] Probados {len(pendientes)} fragmentos en "
+            f"{time.monotonic() - t_probe:.1f}s (workers={MANIFEST_PROBE_WORKERS})"
+        )
+
         nuevos = _actualizar_manifest_con_lock(
             path_manifest,
             mac_camara,
             fecha_iso,
-            fragmentos,
+            pendientes,
+            probados,
+            vista,
         )
 
         print(f"[MANIFEST] Guardado → {path_manifest}")
         print(f"[MANIFEST] Fragmentos nuevos agregados: {len(nuevos)}")
 
+        publicar_fragmentos(mac_camara, nuevos)
+
+        if MANIFEST_DURACION_SUFIJO and MANIFEST_VERIFICAR_PCT > 0:
+            # Solo se muestrean los que tomaron la duración del sufijo
+            por_sufijo = [
+                (n["ruta"], n["duracion_segundos"])
+                for n in nuevos
+                if duracion_desde_sufijo(os.path.basename(n["ruta"])) is not None
+            ]
+            if por_sufijo:
+                verificar_duraciones_sufijo.delay(por_sufijo, MANIFEST_VERIFICAR_PCT)
+
         actualizar_job(
             job_id,
             estado="completado",
@@ -276,6 +639,9 @@ def generar_manifest(mac_camara, fecha_iso, job_id):
             estado="error",
             error=str(e)
         )
+        if tolerante:
+            print(f"[MANIFEST] Cámara {mac_camara}: error (el chord continúa): {e}")
+            return {"error": str(e), "camara": mac_camara}
         raise
     # finally:
     #    send_heartbeat(
@@ -286,6 +652,49 @@ def generar_manifest(mac_camara, fecha_iso, job_id):
     #    )
 
 
+# ============================================================
+#   CELERY TASK — VERIFICADOR MUESTRAL DE DURACIONES POR SUFIJO
+# ============================================================
+
+@celery_app.task(name="tasks.verificar_duraciones_sufijo", queue="manifest")
+def verificar_duraciones_sufijo(fragmentos, porcentaje):
+    """
+    Prueba con ffprobe un % aleatorio de fragmentos indexados por sufijo
+    y reporta los que no coinciden. No modifica el manifest.
+    fragmentos: [(ruta, duracion_manifest), ...]
+    """
+    import random
+
+    n = max(1, round(len(fragmentos) * min(porcentaje, 100) / 100))
+    muestra = random.sample(fragmentos, min(n, len(fragmentos)))
+
+    desacuerdos = []
+    with slot_ffmpeg(MANIFEST_PROBE_HILOS, f"verificar:{len(muestra)}"):
+        reales = [(ruta, dur, obtener_duracion(ruta)) for ruta, dur in muestra]
+
+    for ruta, dur_manifest, dur_real in reales:
+        if dur_real is None:
+            continue
+
+        diff = abs(dur_real - dur_manifest)
+        if diff > MANIFEST_VERIFICAR_TOLERANCIA:
+            print(
+                f"[MANIFEST][VERIFICAR] ⚠️ Sufijo no coincide: {ruta} "
+                f"sufijo={dur_manifest:.3f}s ffprobe={dur_real:.3f}s"
+            )
+            desacuerdos.append({
+                "ruta": ruta,
+                "sufijo": dur_manifest,
+                "ffprobe": dur_real,
+            })
+
+    print(
+        f"[MANIFEST][VERIFICAR] {len(muestra)} verificados, "
+        f"{len(desacuerdos)} desacuerdos"
+    )
+    return {"verificados": len(muestra), "desacuerdos": desacuerdos}
+
+
 def obtener_fechas_a_procesar(fecha_base):
     """
     Retorna lista de fechas a procesar.
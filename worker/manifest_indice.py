@@ -0,0 +1,239 @@
+# ============================================================
+#   SEMEFO — manifest_indice.py
+#   Índice binario del manifest (manifest.idx) para consultas
+#   por rango sin leer/parsear el JSON completo del día.
+#
+#   Formato (little endian):
+#     cabecera:  b"SMIX" | u8 versión | u16 len_mac | mac utf-8
+#     registro:  i64 inicio_us | i64 fin_us | u16 len_ruta | ruta utf-8
+#
+#   Solo se agregan registros al final (O_APPEND). Un registro
+#   truncado por un crash al final del archivo se ignora al leer.
+#   La lectura mapea el archivo y solo decodifica las rutas de los
+#   registros que caen en el rango consultado.
+#   manifest.json sigue siendo la vista de exportación.
+# ============================================================
+
+import mmap
+import operator
+import os
+import struct
+from array import array
+from contextlib import contextmanager
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+from datetime import datetime, timezone
+
+MAGIA = b"SMIX"
+VERSION = 1
+
+_CABECERA = struct.Struct("<4sBH")
+_REGISTRO = struct.Struct("<qqH")
+
+
+def ruta_indice(path_manifest):
+    return os.path.splitext(path_manifest)[0] + ".idx"
+
+
+# ============================================================
+#   CONVERSIONES
+# ============================================================
+
+def _a_us(iso):
+    dt = datetime.fromisoformat(iso)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return round(dt.timestamp() * 1_000_000)
+
+
+def _de_us(us):
+    return datetime.fromtimestamp(us / 1_000_000, tz=timezone.utc)
+
+
+def _codificar_registros(archivos):
+    partes = []
+    for a in archivos:
+        ruta = a["ruta"].encode("utf-8")
+        partes.append(_REGISTRO.pack(_a_us(a["inicio"]), _a_us(a["fin"]), len(ruta)))
+        partes.append(ruta)
+    return b"".join(partes)
+
+
+def _codificar_cabecera(mac):
+    mac_b = (mac or "").encode("utf-8")
+    return _CABECERA.pack(MAGIA, VERSION, len(mac_b)) + mac_b
+
+
+# ============================================================
+#   ESCRITURA
+# ============================================================
+
+def escribir_indice(path_idx, mac, archivos):
+    """Reconstruye el índice completo (temp + rename, atómico)."""
+    tmp = f"{path_idx}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_codificar_cabecera(mac))
+        f.write(_codificar_registros(
+            sorted(archivos, key=lambda a: a["inicio"])))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path_idx)
+
+
+def agregar_al_indice(path_idx, archivos):
+    """
+    Agrega registros al final con un solo write O_APPEND.
+    Debe llamarse con el lock del manifest tomado.
+    """
+    if not archivos:
+        return
+    datos = _codificar_registros(archivos)
+    fd = os.open(path_idx, os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(fd, datos)
+    finally:
+        os.close(fd)
+
+
+# ============================================================
+#   LECTURA
+# ============================================================
+
+class IndiceManifest:
+    """
+    Columnas de cabeceras ordenadas por inicio: inicios/fines (µs epoch)
+    y la posición de cada ruta en el archivo (mmap). Las rutas se
+    decodifican solo para los registros que caen en el rango pedido.
+    fin_max[i] = max(fines[:i+1]) permite bisect del límite inferior
+    aunque haya fragmentos traslapados.
+
+    Cargarlo cuesta O(registros) (un desempacado de cabecera por
+    registro); cada consulta sobre el objeto ya cargado es O(log n + k).
+    Mantiene el mmap abierto: usar abrir_indice() o close().
+    """
+
+    def __init__(self, camara_mac, datos, inicios, fines, posiciones, completo=True):
+        if any(map(operator.gt, inicios, islice(inicios, 1, None))):
+            # Appends fuera de orden (fragmentos tardíos): reordenar columnas
+            orden = sorted(range(len(inicios)), key=inicios.__getitem__)
+            inicios = array("q", (inicios[i] for i in orden))
+            fines = array("q", (fines[i] for i in orden))
+            posiciones = array("q", (posiciones[i] for i in orden))
+
+        self.camara_mac = camara_mac
+        # False si el archivo termina en un registro truncado
+        self.completo = completo
+        self._datos = datos
+        self.inicios = inicios
+        self.fines = fines
+        self.posiciones = posiciones
+        self.fin_max = array("q", accumulate(fines, max))
+
+    def close(self):
+        if self._datos is not None:
+            self._datos.close()
+            self._datos = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        return len(self.inicios)
+
+    def _ruta(self, i):
+        pos = self.posiciones[i]
+        _, _, len_ruta = _REGISTRO.unpack_from(self._datos, pos)
+        inicio = pos + _REGISTRO.size
+        return self._datos[inicio:inicio + len_ruta].decode("utf-8")
+
+    def rango(self, inicio, fin):
+        """
+        Fragmentos que se traslapan con [inicio, fin] (datetimes aware),
+        con la misma forma que los de manifest["archivos"].
+        """
+        ini_us = round(inicio.timestamp() * 1_000_000)
+        fin_us = round(fin.timestamp() * 1_000_000)
+
+        lo = bisect_left(self.fin_max, ini_us)
+        hi = bisect_right(self.inicios, fin_us)
+
+        frags = []
+        vistos = set()
+        for i in range(lo, hi):
+            if self.fines[i] < ini_us:
+                continue
+            ruta = self._ruta(i)
+            # Un append repetido (reintento tras crash) no duplica fragmentos
+            if ruta in vistos:
+                continue
+            vistos.add(ruta)
+            dt_ini = _de_us(self.inicios[i])
+            dt_fin = _de_us(self.fines[i])
+            frags.append({
+                "archivo": os.path.basename(ruta),
+                "inicio": dt_ini.isoformat(),
+                "fin": dt_fin.isoformat(),
+                "duracion_segundos": (self.fines[i] - self.inicios[i]) / 1_000_000,
+                "ruta": ruta,
+                "_dt_ini": dt_ini,
+                "_dt_fin": dt_fin,
+            })
+        return frags
+
+
+def leer_indice(path_idx):
+    """
+    IndiceManifest del archivo, o None si no existe / no es válido.
+    El archivo se mapea (mmap) y solo se desempacan las cabeceras fijas
+    <qqH de cada registro; las rutas quedan sin decodificar. El llamador
+    cierra el índice (close() o with); abrir_indice() lo hace solo.
+    """
+    try:
+        with open(path_idx, "rb") as f:
+            tamano = os.fstat(f.fileno()).st_size
+            if tamano < _CABECERA.size:
+                return None
+            datos = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+    magia, version, len_mac = _CABECERA.unpack_from(datos, 0)
+    if magia != MAGIA or version != VERSION:
+        print(f"[INDICE] Cabecera inválida: {path_idx}")
+        datos.close()
+        return None
+
+    pos = _CABECERA.size
+    mac = datos[pos:pos + len_mac].decode("utf-8")
+    pos += len_mac
+
+    inicios, fines, posiciones = array("q"), array("q"), array("q")
+    desempacar = _REGISTRO.unpack_from
+    tam_registro = _REGISTRO.size
+    while pos + tam_registro <= tamano:
+        ini_us, fin_us, len_ruta = desempacar(datos, pos)
+        if pos + tam_registro + len_ruta > tamano:
+            break
+        inicios.append(ini_us)
+        fines.append(fin_us)
+        posiciones.append(pos)
+        pos += tam_registro + len_ruta
+
+    completo = pos == tamano
+    if not completo:
+        print(f"[INDICE] Registro truncado al final ignorado: {path_idx}")
+    return IndiceManifest(mac, datos, inicios, fines, posiciones, completo)
+
+
+@contextmanager
+def abrir_indice(path_idx):
+    """leer_indice() que cierra el mmap al salir; produce None si no hay índice."""
+    indice = leer_indice(path_idx)
+    try:
+        yield indice
+    finally:
+        if indice is not None:
+            indice.close()
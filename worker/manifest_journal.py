@@ -0,0 +1,135 @@
+# ============================================================
+#   SEMEFO — manifest_journal.py
+#   Journal append-only del manifest (manifest.journal, JSONL).
+#
+#   Las actualizaciones agregan una línea por fragmento nuevo con
+#   O_APPEND en lugar de reescribir el manifest.json del día.
+#   Periódicamente se compacta al snapshot (temp + rename).
+#   Lectores: snapshot + journal, deduplicado por "archivo".
+#
+#   manifest.journal.meta lleva {generacion, lineas, bytes}: cada
+#   reescritura del snapshot incrementa la generación, así que un
+#   escritor que leyó snapshot + journal fuera del lock solo necesita
+#   la cola del journal a partir del byte que ya vio.
+# ============================================================
+
+import json
+import os
+
+
+def ruta_journal(path_manifest):
+    return os.path.splitext(path_manifest)[0] + ".journal"
+
+
+def leer_journal(path_journal):
+    """Entradas del journal. Una última línea truncada (crash) se ignora."""
+    return leer_journal_desde(path_journal)[0]
+
+
+def leer_journal_desde(path_journal, desde=0):
+    """
+    (entradas, fin): entradas a partir del byte `desde` y el byte
+    siguiente a la última línea completa (el `desde` de la próxima
+    lectura). Una última línea truncada (crash) se ignora.
+    """
+    try:
+        with open(path_journal, "rb") as f:
+            f.seek(desde)
+            datos = f.read()
+    except FileNotFoundError:
+        return [], 0
+
+    completo = datos.rfind(b"\n") + 1
+    if completo < len(datos):
+        print(f"[JOURNAL] Línea truncada ignorada: {path_journal}")
+
+    entradas = []
+    for linea in datos[:completo].split(b"\n")[:-1]:
+        try:
+            entrada = json.loads(linea)
+        except ValueError:
+            print(f"[JOURNAL] Línea inválida ignorada: {path_journal}")
+            continue
+        if isinstance(entrada, dict) and "archivo" in entrada:
+            entradas.append(entrada)
+    return entradas, desde + completo
+
+
+def agregar_al_journal(path_journal, entradas):
+    """
+    Un solo write O_APPEND con todas las líneas. Si el archivo quedó con
+    una línea truncada, se antepone un salto para no pegarse a ella.
+    Debe llamarse con el lock del manifest tomado.
+    """
+    if not entradas:
+        return
+
+    datos = "".join(
+        json.dumps(e, ensure_ascii=False) + "\n" for e in entradas
+    ).encode("utf-8")
+
+    fd = os.open(path_journal, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+    try:
+        tamano = os.fstat(fd).st_size
+        if tamano:
+            with open(path_journal, "rb") as f:
+                f.seek(tamano - 1)
+                if f.read(1) != b"\n":
+                    datos = b"\n" + datos
+        os.write(fd, datos)
+    finally:
+        os.close(fd)
+
+
+def contar_lineas(path_journal):
+    try:
+        with open(path_journal, "rb") as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def ruta_meta(path_journal):
+    return f"{path_journal}.meta"
+
+
+def leer_meta(path_journal):
+    """{generacion, lineas, bytes}; ceros si no existe (días previos)."""
+    try:
+        with open(ruta_meta(path_journal), "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = {}
+    return {
+        "generacion": int(meta.get("generacion", 0)),
+        "lineas": int(meta.get("lineas", 0)),
+        "bytes": int(meta.get("bytes", 0)),
+    }
+
+
+def guardar_meta(path_journal, meta):
+    """Escritura atómica (temp + rename). Llamar con el lock tomado."""
+    tmp = f"{ruta_meta(path_journal)}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, ruta_meta(path_journal))
+
+
+def tamano_journal(path_journal):
+    try:
+        return os.path.getsize(path_journal)
+    except FileNotFoundError:
+        return 0
+
+
+def fusionar(archivos, entradas):
+    """snapshot["archivos"] + journal sin duplicados, ordenado por inicio."""
+    vistos = {a["archivo"] for a in archivos}
+    fusion = list(archivos)
+    for e in entradas:
+        if e["archivo"] in vistos:
+            continue
+        vistos.add(e["archivo"])
+        fusion.append(e)
+    fusion.sort(key=lambda x: x["inicio"])
+    return fusion
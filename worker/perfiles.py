@@ -0,0 +1,45 @@
+# ============================================================
+#   SEMEFO — perfiles.py
+#   Registro de perfiles de codificación de la unión. Módulo sin
+#   dependencias para que la API valide perfil_video sin importar
+#   worker.tasks.
+# ============================================================
+
+FILTRO_720P_20FPS = (
+    "scale=1280:720:force_original_aspect_ratio=decrease,"
+    "pad=1280:720:(ow-iw)/2:(oh-ih)/2,fps=20"
+)
+
+# codec=None → la salida conserva el codec de la fuente (remux)
+# costo: orden relativo de CPU; "auto" elige el más barato que cumpla contrato
+PERFILES_CODIFICACION = {
+    "copia_mkv": {
+        "extension": "mkv", "codec": None, "costo": 0, "filtro": False,
+        "video": "-c:v copy",
+    },
+    "copia_mp4": {
+        "extension": "mp4", "codec": None, "costo": 1, "filtro": False,
+        "video": "-c:v copy -movflags +faststart",
+    },
+    "x264_ultrafast": {
+        "extension": "mp4", "codec": "h264", "costo": 20, "filtro": True,
+        "video": "-c:v libx264 -preset ultrafast -crf 23",
+    },
+    "vp8_realtime": {
+        "extension": "webm", "codec": "vp8", "costo": 30, "filtro": True,
+        "video": "-c:v libvpx -deadline realtime -cpu-used 8 -b:v 1.5M",
+    },
+    "vp9_rowmt": {
+        "extension": "webm", "codec": "vp9", "costo": 60, "filtro": True,
+        "video": "-c:v libvpx-vp9 -row-mt 1 -deadline realtime -cpu-used 8 -b:v 1M",
+    },
+    "vp8": {
+        "extension": "webm", "codec": "vp8", "costo": 100, "filtro": True,
+        "video": "-c:v libvpx -b:v 1.5M",
+    },
+}
+
+
+def perfil_valido(nombre):
+    """Nombre del registro o "auto" (ver tasks.elegir_perfil)."""
+    return nombre == "auto" or nombre in PERFILES_CODIFICACION
@@ -11,11 +11,22 @@ import json
 import requests
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-import psutil
 import time
-
-from worker.job_api_client import registrar_job, actualizar_job, registrar_archivo, obtener_pausas_todas, enviar_a_whisper, finalizar_archivo
-from worker.db_utils import ensure_dir, expediente_fs, limpiar_temp, normalizar_ruta
+import threading
+import logging
+from logging.handlers import RotatingFileHandler
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from worker.job_api_client import registrar_job, actualizar_job, registrar_archivo, obtener_pausas_todas, enviar_a_whisper, finalizar_archivo, actualizar_progreso, obtener_fragmentos
+from worker.db_utils import ensure_dir, expediente_fs, normalizar_ruta
+from worker.admision import slot_ffmpeg
+from worker.manifest_indice import abrir_indice, ruta_indice
+from worker.manifest_journal import fusionar, leer_journal, ruta_journal
+from worker.cobertura import cobertura_sesion
+from worker.intervalos import calcular_cortes
+from worker.checkpoints import CheckpointUnion, clave_contenido, clave_recorte, purgar_checkpoints
+from worker.perfiles import FILTRO_720P_20FPS, PERFILES_CODIFICACION
 
 load_dotenv()
 
@@ -28,6 +39,48 @@ EXPEDIENTES_PATH = os.getenv(
     "EXPEDIENTES_PATH", "/mnt/wave/archivos_sistema_semefo").rstrip("/")
 TEMP_ROOT = os.getenv("TEMP_ROOT", "/opt/semefo/storage/tmp")
 FFMPEG_THREADS = int(os.getenv("FFMPEG_THREADS", 4))
+# Recortes -c copy simultáneos (cada uno es un proceso ffmpeg independiente)
+FFMPEG_TRIM_WORKERS = max(1, int(os.getenv("FFMPEG_TRIM_WORKERS", 4)))
+# Hilos que declara ante admisión cada recorte (un lote pide workers × esto)
+FFMPEG_TRIM_HILOS = max(1, int(os.getenv("FFMPEG_TRIM_HILOS", 1)))
+# 1 = usar manifest.idx (bisect por rango) cuando exista; 0 = solo JSON
+MANIFEST_INDICE = os.getenv("MANIFEST_INDICE", "1").strip() in (
+    "1", "true", "True", "yes", "YES")
+# manifest (default) = solo archivos | auto = consultar primero la tabla
+# fragmentos_camara (API), validada contra manifest.idx
+FRAGMENTOS_FUENTE = os.getenv("FRAGMENTOS_FUENTE", "manifest").strip().lower()
+# % mínimo de tiempo válido grabado para unir (0 = unir con lo que haya)
+UNION_COBERTURA_MINIMA = float(os.getenv("UNION_COBERTURA_MINIMA", "0"))
+# Presupuesto de hilos de unir_sesion (se reparte entre las 2 cámaras)
+UNION_SESION_HILOS = max(
+    2, int(os.getenv("UNION_SESION_HILOS", FFMPEG_THREADS)))
+# dos_etapas: recorte a TEMP_ROOT + concat | una_pasada: concat con
+# inpoint/outpoint leyendo directo de /mnt/wave (sin archivos intermedios)
+UNION_MODO = os.getenv("UNION_MODO", "dos_etapas").strip().lower()
+# Encode VP8 en K chunks paralelos + concat -c copy (1 = desactivado)
+UNION_CHUNKS = max(1, int(os.getenv("UNION_CHUNKS", 1)))
+# Duración mínima por chunk: sesiones cortas no se dividen
+UNION_CHUNK_MIN_SEG = max(1, int(os.getenv("UNION_CHUNK_MIN_SEG", 300)))
+# Perfil de codificación: nombre del registro o "auto" (ffprobe 1er fragmento)
+UNION_PERFIL = os.getenv("UNION_PERFIL", "vp8").strip()
+# Perfil por cámara: {"<mac>": "<perfil>", ...}
+UNION_PERFIL_POR_CAMARA = json.loads(
+    os.getenv("UNION_PERFIL_POR_CAMARA", "") or "{}")
+# Contrato de salida (lo que Whisper y el dashboard consumen)
+UNION_CODECS_SALIDA = {
+    c.strip() for c in os.getenv("UNION_CODECS_SALIDA", "vp8").split(",") if c.strip()
+}
+# Mínimo de segundos entre PUT /sesiones/{id}/progreso/{tipo}
+PROGRESO_INTERVALO_SEG = float(os.getenv("PROGRESO_INTERVALO_SEG", 5))
+# Líneas finales de stderr que se conservan para el mensaje de error
+FFMPEG_STDERR_TAIL = 200
+# Logs ffmpeg por sesión (los sirve GET /procesos/ffmpeg_log/{id})
+FFMPEG_LOG_DIR = os.getenv("FFMPEG_LOG_DIR", "/opt/semefo/logs").rstrip("/")
+FFMPEG_LOG_MAX_BYTES = int(os.getenv("FFMPEG_LOG_MAX_BYTES", 10 * 1024 * 1024))
+FFMPEG_LOG_BACKUPS = int(os.getenv("FFMPEG_LOG_BACKUPS", 2))
+UNION_CONTENEDORES_SALIDA = {
+    c.strip() for c in os.getenv("UNION_CONTENEDORES_SALIDA", "webm").split(",") if c.strip()
+}
 
 os.makedirs(TEMP_ROOT, exist_ok=True)
 QUEUE_VIDEO = "uniones_video"
@@ -41,32 +94,132 @@ QUEUE_VIDEO = "uniones_video"
 def cargar_manifest(path):
     if not os.path.exists(path):
         raise FileNotFoundError(f"No existe manifest: {path}")
+    # Journal antes que snapshot: la compactación renombra el snapshot y
+    # luego trunca el journal, en ese orden no se pierden fragmentos
+    journal = leer_journal(ruta_journal(path))
     with open(path, "r") as f:
         data = json.load(f)
     if "archivos" not in data:
         raise Exception("Manifest corrupto: falta 'archivos'")
-    data["archivos"].sort(key=lambda x: x["inicio"])
+    # Fragmentos aún no compactados al snapshot (fusionar ordena)
+    data["archivos"] = fusionar(data["archivos"], journal)
     return data
 
 
-def ffmpeg_concat_cmd(list_txt, salida):
+# ============================================================
+#   PERFILES DE CODIFICACIÓN (salida de la unión)
+# ============================================================
+
+def probar_video(ruta):
+    """ffprobe del primer stream de video: codec_name, width, height, fps."""
+    try:
+        r = subprocess.run(
+            [
+                "ffprobe", "-v", "quiet", "-select_streams", "v:0",
+                "-show_entries", "stream=codec_name,width,height,avg_frame_rate,r_frame_rate",
+                "-of", "json", ruta
+            ],
+            capture_output=True,
+            text=True
+        )
+        streams = json.loads(r.stdout or "{}").get("streams") or []
+        return streams[0] if streams else {}
+    except Exception as e:
+        print(f"[PERFIL] Error ffprobe {ruta}: {e}")
+        return {}
+
+
+def fps_video(info):
+    """fps del stream ("20/1", "30000/1001"); None si ffprobe no lo dio."""
+    for campo in ("avg_frame_rate", "r_frame_rate"):
+        try:
+            num, den = (info.get(campo) or "").split("/")
+            if float(den):
+                return float(num) / float(den)
+        except (ValueError, ZeroDivisionError):
+            continue
+    return None
+
+
+def cumple_contrato(perfil, info):
+    """
+    El perfil cumple si el codec y contenedor resultantes son aceptados
+    y, en remux (sin filtro), la fuente ya es 1280x720 a 20 fps: el
+    remux conserva resolución y fps de la fuente.
+    """
+    codec = perfil["codec"] or info.get("codec_name")
+    if codec not in UNION_CODECS_SALIDA:
+        return False
+    if perfil["extension"] not in UNION_CONTENEDORES_SALIDA:
+        return False
+    if not perfil["filtro"]:
+        fps = fps_video(info)
+        return (
+            info.get("width") == 1280
+            and info.get("height") == 720
+            and fps is not None
+            and abs(fps - 20) < 0.01
+        )
+    return True
+
+
+def elegir_perfil(solicitado, primer_fragmento):
+    """
+    Perfil explícito (sesión/cámara/env) o "auto": el más barato del
+    registro que cumpla el contrato de salida según ffprobe del primer
+    fragmento. Si ninguno cumple se usa "vp8" (comportamiento histórico).
+    """
+    solicitado = (solicitado or "auto").strip()
+
+    if solicitado != "auto":
+        if solicitado not in PERFILES_CODIFICACION:
+            raise Exception(f"Perfil de codificación desconocido: {solicitado}")
+        return solicitado
+
+    info = probar_video(primer_fragmento)
+    candidatos = sorted(
+        PERFILES_CODIFICACION.items(), key=lambda kv: kv[1]["costo"])
+
+    for nombre, perfil in candidatos:
+        if cumple_contrato(perfil, info):
+            print(f"[PERFIL] auto → {nombre} (fuente {info})")
+            return nombre
+
+    print(f"[PERFIL] auto sin candidato para fuente {info} → vp8")
+    return "vp8"
+
+
+def ffmpeg_concat_cmd(list_txt, salida, threads=FFMPEG_THREADS, perfil="vp8"):
+    p = PERFILES_CODIFICACION[perfil]
+    filtro = f"-vf \"{FILTRO_720P_20FPS}\" " if p["filtro"] else ""
+    pix_fmt = "-pix_fmt yuv420p " if p["filtro"] else ""
+
     return (
         f"ffmpeg -y "
         f"-fflags +genpts "
         f"-f concat -safe 0 -i \"{list_txt}\" "
         f"-map 0:v:0 -map 0:a? "
-        f"-vf \"scale=1280:720:force_original_aspect_ratio=decrease,"
-        f"pad=1280:720:(ow-iw)/2:(oh-ih)/2,fps=20\" "
-        f"-c:v libvpx "
-        f"-b:v 1.5M "
-        f"-threads {FFMPEG_THREADS} "
-        f"-pix_fmt yuv420p "
+        f"{filtro}"
+        f"{p['video']} "
+        f"-threads {threads} "
+        f"{pix_fmt}"
         f"-c:a libopus -ac 1 -ar 16000 -b:a 32k "
         f"-reset_timestamps 1 "
         f"\"{salida}\""
     )
 
 
+def ffmpeg_stitch_cmd(list_txt, salida):
+    """Une chunks WebM ya codificados sin re-encode (mismos parámetros)."""
+    return (
+        f"ffmpeg -y "
+        f"-f concat -safe 0 -i \"{list_txt}\" "
+        f"-map 0:v:0 -map 0:a? "
+        f"-c copy "
+        f"\"{salida}\""
+    )
+
+
 def obtener_pausas_api(id_sesion):
     try:
         r = requests.get(
@@ -78,6 +231,11 @@ def obtener_pausas_api(id_sesion):
 
 
 def construir_intervalos_validos(inicio_sesion, fin_sesion, pausas):
+    """
+    [inicio, fin] menos las pausas, recortado a la sesión (misma regla
+    que cobertura.intervalos_validos_ms): una pausa que empieza después
+    del fin no abre un intervalo fuera de la sesión.
+    """
     inicio_sesion = _to_utc_aware(inicio_sesion)
     fin_sesion = _to_utc_aware(fin_sesion)
 
@@ -93,9 +251,11 @@ def construir_intervalos_validos(inicio_sesion, fin_sesion, pausas):
             continue
 
         if ini > cursor:
-            intervalos.append({"ini": cursor, "fin": ini})
+            intervalos.append({"ini": cursor, "fin": min(ini, fin_sesion)})
 
         cursor = max(cursor, fin)
+        if cursor >= fin_sesion:
+            break
 
     if cursor < fin_sesion:
         intervalos.append({"ini": cursor, "fin": fin_sesion})
@@ -126,6 +286,128 @@ def fragmentos_del_manifest(manifest, inicio, fin):
     return sorted(frags, key=lambda x: x["_dt_ini"])
 
 
+def _mac_de_manifest(manifest_path):
+    """.../manifests/<uuid>/<mac>/YYYY/MM/DD/manifest.json → <mac>"""
+    partes = os.path.normpath(manifest_path).split(os.sep)
+    return partes[-5] if len(partes) >= 5 else ""
+
+
+def _fragmentos_desde_api(camara_mac, inicio, fin, manifest_path):
+    """
+    Fragmentos desde la tabla fragmentos_camara (GET /fragmentos/{mac}).
+    La publicación a la tabla no se reintenta, así que solo se aceptan
+    si cubren ambos extremos de la sesión y traen al menos tantos
+    fragmentos como manifest.idx en la ventana (un lote perdido a mitad
+    de la sesión). Sin índice para comparar, o si falta algo, se usa el
+    manifest.
+    """
+    filas = obtener_fragmentos(camara_mac, inicio.isoformat(), fin.isoformat())
+    if not filas:
+        return None
+
+    ini_ms = inicio.timestamp() * 1000
+    fin_ms = fin.timestamp() * 1000
+    if filas[0]["inicio_ms"] > ini_ms or max(f["fin_ms"] for f in filas) < fin_ms:
+        print(f"[UNION] Índice BD incompleto para {camara_mac}, se usa manifest")
+        return None
+
+    with abrir_indice(ruta_indice(manifest_path)) as indice:
+        esperados = len(indice.rango(inicio, fin)) if indice is not None else None
+    if esperados is None or len({f["ruta"] for f in filas}) < esperados:
+        print(
+            f"[UNION] Índice BD de {camara_mac} sin verificar o con faltantes "
+            f"({len(filas)} vs manifest.idx {esperados}), se usa manifest"
+        )
+        return None
+
+    frags = []
+    for f in filas:
+        dt_ini = datetime.fromtimestamp(f["inicio_ms"] / 1000, tz=timezone.utc)
+        dt_fin = datetime.fromtimestamp(f["fin_ms"] / 1000, tz=timezone.utc)
+        frags.append({
+            "archivo": os.path.basename(f["ruta"]),
+            "inicio": dt_ini.isoformat(),
+            "fin": dt_fin.isoformat(),
+            "duracion_segundos": (f["fin_ms"] - f["inicio_ms"]) / 1000,
+            "ruta": f["ruta"],
+            "_dt_ini": dt_ini,
+            "_dt_fin": dt_fin,
+        })
+    return frags
+
+
+def cargar_fragmentos_sesion(manifest_path, inicio, fin):
+    """
+    Fragmentos del rango de la sesión + MAC de la cámara. Orden:
+      1. índice en BD (FRAGMENTOS_FUENTE=auto), validado contra manifest.idx
+      2. manifest.idx (bisect sobre cabeceras; solo se decodifican las rutas del rango)
+      3. manifest JSON con recorrido lineal
+    """
+    inicio = _to_utc_aware(inicio)
+    fin = _to_utc_aware(fin)
+
+    if FRAGMENTOS_FUENTE == "auto":
+        camara_mac = _mac_de_manifest(manifest_path)
+        frags = _fragmentos_desde_api(camara_mac, inicio, fin, manifest_path)
+        if frags:
+            return frags, camara_mac
+
+    if MANIFEST_INDICE:
+        with abrir_indice(ruta_indice(manifest_path)) as indice:
+            if indice is not None and len(indice):
+                frags = indice.rango(_to_utc_aware(inicio), _to_utc_aware(fin))
+                if not frags:
+                    raise Exception("No hay fragmentos válidos en el manifest")
+                return frags, indice.camara_mac
+
+    manifest = cargar_manifest(manifest_path)
+    return fragmentos_del_manifest(manifest, inicio, fin), manifest.get("camara_mac", "")
+
+
+def _a_ms(dt):
+    return round(_to_utc_aware(dt).timestamp() * 1000)
+
+
+def verificar_cobertura(frags, inicio, fin, pausas, etiqueta=""):
+    """
+    Cobertura grabada vs esperada (sesión menos pausas) por barrido.
+    Sin grabación o por debajo de UNION_COBERTURA_MINIMA (%) → Exception.
+    Con huecos por encima del mínimo se continúa (se une lo que existe).
+    """
+    cob = cobertura_sesion(
+        [(_a_ms(f["_dt_ini"]), _a_ms(f["_dt_fin"])) for f in frags],
+        _a_ms(inicio),
+        _a_ms(fin),
+        [(_a_ms(_parse_iso_utc(p["inicio"])), _a_ms(_parse_iso_utc(p["fin"])))
+         for p in pausas],
+    )
+
+    print(
+        f"[COBERTURA] {etiqueta} {cob['porcentaje']}% "
+        f"grabado={cob['grabado_seg']}s esperado={cob['esperado_seg']}s "
+        f"huecos={len(cob['huecos'])} traslapes={len(cob['traslapes'])}"
+    )
+
+    if cob["grabado_seg"] <= 0:
+        raise Exception("No hay grabación dentro de los intervalos válidos de la sesión")
+
+    if cob["porcentaje"] < UNION_COBERTURA_MINIMA:
+        raise Exception(
+            f"Cobertura insuficiente: {cob['porcentaje']}% < "
+            f"{UNION_COBERTURA_MINIMA}% (faltan {cob['faltante_seg']}s "
+            f"en {len(cob['huecos'])} huecos)"
+        )
+
+    for h in cob["huecos"]:
+        print(
+            f"[COBERTURA] ⚠️ Hueco {etiqueta}: "
+            f"{datetime.fromtimestamp(h['inicio_ms'] / 1000, tz=timezone.utc).isoformat()} "
+            f"({h['duracion_seg']}s)"
+        )
+
+    return cob
+
+
 def recortar_fragmento(src, ini_seg, fin_seg, dst):
     duracion = fin_seg - ini_seg
     if duracion <= 0:
@@ -150,20 +432,426 @@ def recortar_fragmento(src, ini_seg, fin_seg, dst):
         raise Exception("Fragmento inválido o vacío")
 
 
-def esperar_cpu_baja(limite=85):
-    while True:
-        cpu = psutil.cpu_percent(interval=1)
-        if cpu < limite:
-            return
-        print(f"⚠️ CPU alta ({cpu}%), esperando...")
-        time.sleep(3)
+def _ejecutar_en_paralelo(func, argumentos, max_workers):
+    """
+    Ejecuta func(*args) para cada tupla de `argumentos` con un pool acotado.
+    Al primer fallo cancela lo que aún no arranca y propaga el error.
+    """
+    workers = max(1, min(max_workers, len(argumentos)))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futuros = [pool.submit(func, *a) for a in argumentos]
+        hechos, pendientes = wait(futuros, return_when=FIRST_EXCEPTION)
+
+        for fut in futuros:
+            if fut in hechos and fut.exception() is not None:
+                for p in pendientes:
+                    p.cancel()
+                raise fut.exception()
+
+    return [f.result() for f in futuros]
+
+
+def recortar_fragmentos_paralelo(recortes, max_workers=FFMPEG_TRIM_WORKERS, func=recortar_fragmento, etiqueta=""):
+    """
+    Ejecuta func (recortar_fragmento) para cada (src, ini_seg, fin_seg, dst)
+    con un pool acotado a max_workers procesos ffmpeg simultáneos. El lote
+    completo corre dentro de un slot de admisión de
+    workers × FFMPEG_TRIM_HILOS hilos.
+
+    Devuelve las rutas destino en el MISMO orden de `recortes` (list.txt
+    determinista). Al primer fallo cancela los recortes que aún no
+    arrancan y propaga el error.
+    """
+    if not recortes:
+        return []
+
+    workers = max(1, min(max_workers, len(recortes)))
+    print(f"[FFMPEG TRIM] {len(recortes)} recortes con {workers} en paralelo")
+
+    with slot_ffmpeg(workers * FFMPEG_TRIM_HILOS, f"recorte:{etiqueta}"):
+        _ejecutar_en_paralelo(func, recortes, workers)
+    return [r[3] for r in recortes]
+
+
+def ruta_log_ffmpeg(tipo, id_sesion):
+    return os.path.join(FFMPEG_LOG_DIR, f"ffmpeg_{tipo}_{id_sesion}.log")
+
+
+def abrir_log_ffmpeg(path):
+    """
+    Logger con RotatingFileHandler (tamaño acotado) para un log de sesión.
+    Thread-safe: los chunks paralelos escriben al mismo archivo.
+    """
+    logger = logging.getLogger(f"semefo.ffmpeg.{os.path.basename(path)}")
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=FFMPEG_LOG_MAX_BYTES,
+            backupCount=FFMPEG_LOG_BACKUPS,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def cerrar_log_ffmpeg(path):
+    logger = logging.getLogger(f"semefo.ffmpeg.{os.path.basename(path)}")
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
+
+
+def ejecutar_ffmpeg(cmd, on_progreso=None, log_path=None):
+    """
+    Ejecuta ffmpeg leyendo stderr en streaming: solo se conservan las
+    últimas FFMPEG_STDERR_TAIL líneas (para el error), nunca todo el log.
+    Con log_path el stderr completo va a un log rotativo en disco.
+    Con on_progreso usa `-progress pipe:1` y llama on_progreso(segundos)
+    con cada out_time_ms (microsegundos pese al nombre).
+    """
+    log = abrir_log_ffmpeg(log_path) if log_path else None
+    if log:
+        log.info(f"===== {datetime.now(timezone.utc).isoformat()} =====")
+        log.info(cmd)
+
+    flags = "-nostats "
+    if on_progreso:
+        flags += "-progress pipe:1 "
+    cmd = cmd.replace("ffmpeg ", f"ffmpeg {flags}", 1)
+
+    proc = subprocess.Popen(
+        cmd,
+        shell=True,
+        stdout=subprocess.PIPE if on_progreso else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+    )
+
+    cola = deque(maxlen=FFMPEG_STDERR_TAIL)
+
+    def _leer_stderr():
+        for linea in proc.stderr:
+            linea = linea.rstrip()
+            cola.append(linea)
+            if log:
+                log.info(linea)
+
+    lector = threading.Thread(target=_leer_stderr, daemon=True)
+    lector.start()
+
+    if on_progreso:
+        for linea in proc.stdout:
+            clave, _, valor = linea.strip().partition("=")
+            if clave == "out_time_ms" and valor.isdigit():
+                on_progreso(int(valor) / 1_000_000)
+
+    proc.wait()
+    lector.join()
+
+    if log:
+        log.info(f"===== returncode={proc.returncode} =====")
+
+    if proc.returncode != 0:
+        raise Exception("\n".join(cola))
+
+
+def ejecutar_ffmpeg_admitido(cmd, hilos, etiqueta="", on_progreso=None, log_path=None):
+    """Encode con slot del control de admisión host-wide (ver admision.py)."""
+    with slot_ffmpeg(hilos, etiqueta):
+        ejecutar_ffmpeg(cmd, on_progreso, log_path)
+
+
+class ReportadorProgreso:
+    """
+    Acumula el out_time de uno o varios ffmpeg (chunks) y publica el % sobre
+    la duración válida total, como máximo una vez cada `intervalo` segundos.
+    """
+
+    def __init__(self, sesion_id, tipo, total_seg, intervalo=PROGRESO_INTERVALO_SEG):
+        self.sesion_id = sesion_id
+        self.tipo = tipo
+        self.total_seg = max(total_seg, 0.001)
+        self.intervalo = intervalo
+        self._por_proceso = {}
+        self._ultimo_envio = 0.0
+        self._lock = threading.Lock()
+
+    def callback(self, clave="principal"):
+        return lambda segundos: self.actualizar(clave, segundos)
+
+    def actualizar(self, clave, segundos):
+        with self._lock:
+            self._por_proceso[clave] = segundos
+            ahora = time.monotonic()
+            if ahora - self._ultimo_envio < self.intervalo:
+                return
+            self._ultimo_envio = ahora
+            hecho = sum(self._por_proceso.values())
+
+        # 100 solo lo reporta finalizar() (falta stitch / validación)
+        pct = min(99.0, 100.0 * hecho / self.total_seg)
+        actualizar_progreso(self.sesion_id, self.tipo, round(pct, 1))
+
+    def finalizar(self):
+        actualizar_progreso(self.sesion_id, self.tipo, 100.0)
+
+
+def planificar_segmentos(frags, intervalos):
+    """
+    Cruza intervalos válidos × fragmentos del manifest.
+    Devuelve, en orden de reproducción, los segmentos a unir:
+      {"ruta", "ini", "fin", "completo"}
+    ini/fin son segundos relativos al inicio del fragmento; "completo"
+    indica que el fragmento entero cae dentro del intervalo.
+    El cruce lo hace worker.intervalos sobre ms epoch (searchsorted).
+    """
+    frag_ini = [_a_ms(f["_dt_ini"]) for f in frags]
+    frag_fin = [_a_ms(f["_dt_fin"]) for f in frags]
+
+    cortes = calcular_cortes(
+        frag_ini,
+        frag_fin,
+        [_a_ms(v["ini"]) for v in intervalos],
+        [_a_ms(v["fin"]) for v in intervalos],
+    )
+
+    segmentos = []
+    for i, entrada, salida in cortes:
+        segmentos.append({
+            "ruta": frags[i]["ruta"],
+            "ini": entrada / 1000,
+            "fin": salida / 1000,
+            "completo": entrada == 0 and salida == frag_fin[i] - frag_ini[i],
+        })
+
+    return segmentos
+
+
+def preparar_partes_dos_etapas(segmentos, temp_dir, checkpoint=None, etiqueta=""):
+    """
+    Modo dos_etapas: recorta (en paralelo) solo los segmentos de borde.
+    Los fragmentos completos van directo al list.txt sin re-muxear.
+    Con checkpoint, las partes ya registradas (misma fuente y corte)
+    se reutilizan y cada recorte nuevo se registra al terminar.
+    """
+    partes = []
+    recortes = []
+    claves = {}
+    reutilizadas = 0
+
+    for seg in segmentos:
+        if seg["completo"]:
+            partes.append(seg["ruta"])
+            continue
+
+        clave = clave_recorte(seg["ruta"], seg["ini"], seg["fin"])
+        nombre = f"part_{clave}.mkv"
+        dst = os.path.join(temp_dir, nombre)
+        partes.append(dst)
+
+        if checkpoint and checkpoint.valido(nombre, clave):
+            reutilizadas += 1
+            continue
+
+        claves[dst] = clave
+        recortes.append((seg["ruta"], seg["ini"], seg["fin"], dst))
+
+    def _recortar(src, ini_seg, fin_seg, dst):
+        recortar_fragmento(src, ini_seg, fin_seg, dst)
+        if checkpoint:
+            checkpoint.registrar(
+                os.path.basename(dst), claves[dst],
+                src=src, ini=ini_seg, fin=fin_seg,
+            )
+
+    print(
+        f"[RECORTE] completos={len(partes) - len(recortes) - reutilizadas} "
+        f"reutilizadas={reutilizadas} a_recortar={len(recortes)}"
+    )
+    recortar_fragmentos_paralelo(recortes, func=_recortar, etiqueta=etiqueta)
+    return partes
+
+
+def escribir_lista_concat(list_txt, partes):
+    with open(list_txt, "w") as f:
+        for p in partes:
+            f.write(f"file '{p}'\n")
+
+
+def escribir_lista_una_pasada(list_txt, segmentos):
+    """
+    Modo una_pasada: list.txt del concat demuxer apuntando a los MKV
+    originales, con directivas inpoint/outpoint en los segmentos de borde.
+    El encode final lee directo de /mnt/wave sin partes intermedias.
+    """
+    with open(list_txt, "w") as f:
+        for seg in segmentos:
+            f.write(f"file '{seg['ruta']}'\n")
+            if not seg["completo"]:
+                f.write(f"inpoint {seg['ini']:.3f}\n")
+                f.write(f"outpoint {seg['fin']:.3f}\n")
+
+
+def escribir_lista(list_txt, segmentos, partes=None):
+    """partes=None → modo una_pasada (inpoint/outpoint sobre originales)."""
+    if partes is None:
+        escribir_lista_una_pasada(list_txt, segmentos)
+    else:
+        escribir_lista_concat(list_txt, partes)
+
+
+def dividir_en_chunks(segmentos, chunks=UNION_CHUNKS, min_seg=UNION_CHUNK_MIN_SEG):
+    """
+    Agrupa índices de segmentos en chunks contiguos de duración similar.
+    Los cortes caen siempre en límite de segmento: cada chunk arranca al
+    inicio de un MKV (keyframe) o en un inpoint/recorte de borde, que ya
+    arranca en keyframe. Nunca genera chunks más cortos que min_seg.
+    """
+    total = sum(seg["fin"] - seg["ini"] for seg in segmentos)
+    k = max(1, min(chunks, int(total // min_seg), len(segmentos)))
+
+    if k == 1:
+        return [list(range(len(segmentos)))]
+
+    objetivo = total / k
+    grupos = [[]]
+    acumulado = 0.0
+
+    for i, seg in enumerate(segmentos):
+        if grupos[-1] and len(grupos) < k and acumulado >= objetivo * len(grupos):
+            grupos.append([])
+        grupos[-1].append(i)
+        acumulado += seg["fin"] - seg["ini"]
+
+    return grupos
+
+
+def codificar_union(segmentos, partes, temp_dir, salida, chunks=UNION_CHUNKS, perfil="vp8", etiqueta="", progreso=None, log_path=None, hilos=FFMPEG_THREADS, checkpoint=None):
+    """
+    Encode final según el perfil (por defecto VP8 1280x720 20fps + Opus
+    mono 16k).
+    Con chunks > 1 divide la línea de tiempo válida, codifica cada chunk
+    en su propio proceso ffmpeg en paralelo y los une con concat -c copy;
+    los parámetros de codificación son idénticos en todos los chunks.
+    progreso: ReportadorProgreso opcional (suma el avance de los chunks).
+    log_path: log rotativo de la sesión donde va el stderr de ffmpeg.
+    hilos: presupuesto total de hilos ffmpeg de esta unión.
+    checkpoint: CheckpointUnion opcional; los chunks ya codificados con
+    los mismos segmentos y perfil no se vuelven a codificar.
+    """
+    hilos_total = hilos
+    grupos = dividir_en_chunks(segmentos, chunks)
+
+    if len(grupos) == 1:
+        list_txt = os.path.join(temp_dir, "list.txt")
+        escribir_lista(list_txt, segmentos, partes)
+
+        cmd = ffmpeg_concat_cmd(
+            list_txt, salida, threads=hilos_total, perfil=perfil)
+        print("\n========== FFMPEG CONCAT ==========")
+        print(cmd)
+        print("==================================")
+        ejecutar_ffmpeg_admitido(
+            cmd, hilos_total, etiqueta,
+            progreso.callback() if progreso else None,
+            log_path,
+        )
+        return
+
+    extension = PERFILES_CODIFICACION[perfil]["extension"]
+    pendientes = []
+    salidas_chunk = []
+    for n, indices in enumerate(grupos, start=1):
+        segs = [segmentos[i] for i in indices]
+        clave = clave_contenido(
+            "chunk", perfil, PERFILES_CODIFICACION[perfil],
+            [(seg["ruta"], seg["ini"], seg["fin"]) for seg in segs],
+        )
+        nombre = f"chunk_{clave}.{extension}"
+        dst = os.path.join(temp_dir, nombre)
+        salidas_chunk.append(dst)
+
+        if checkpoint and checkpoint.valido(nombre, clave):
+            print(f"[CHUNKS] chunk {n} reutilizado ({nombre})")
+            if progreso:
+                progreso.actualizar(n, sum(seg["fin"] - seg["ini"] for seg in segs))
+            continue
+
+        list_n = os.path.join(temp_dir, f"list_chunk_{n}.txt")
+        escribir_lista(
+            list_n,
+            segs,
+            None if partes is None else [partes[i] for i in indices],
+        )
+        pendientes.append((n, list_n, dst, nombre, clave))
+
+    def _codificar_chunk(cmd, hilos_chunk, etiqueta_chunk, on_progreso, nombre, clave):
+        ejecutar_ffmpeg_admitido(
+            cmd, hilos_chunk, etiqueta_chunk, on_progreso, log_path)
+        if checkpoint:
+            checkpoint.registrar(nombre, clave, perfil=perfil)
+
+    if pendientes:
+        hilos = max(1, hilos_total // len(pendientes))
+        print(
+            f"[CHUNKS] {len(grupos)} chunks ({len(pendientes)} por codificar) "
+            f"× {hilos} hilos"
+        )
+        comandos = [
+            (
+                ffmpeg_concat_cmd(list_n, dst, threads=hilos, perfil=perfil),
+                hilos,
+                f"{etiqueta}#chunk{n}",
+                progreso.callback(n) if progreso else None,
+                nombre,
+                clave,
+            )
+            for n, list_n, dst, nombre, clave in pendientes
+        ]
+        _ejecutar_en_paralelo(_codificar_chunk, comandos, len(comandos))
+
+    chunks_txt = os.path.join(temp_dir, "chunks.txt")
+    escribir_lista_concat(chunks_txt, salidas_chunk)
+
+    cmd = ffmpeg_stitch_cmd(chunks_txt, salida)
+    print(f"[CHUNKS] {cmd}")
+    ejecutar_ffmpeg(cmd, log_path=log_path)
+
 
 # ============================================================
 #   CORE
 # ============================================================
 
 
-def _unir_video(expediente, carpeta, id_sesion, manifest_path, tipo):
+def linea_tiempo_sesion(id_sesion):
+    """
+    Inicio/fin, pausas e intervalos válidos de la sesión (una sola
+    consulta a la API). unir_sesion la comparte entre ambas cámaras.
+    """
+    info = obtener_pausas_todas(id_sesion)
+
+    inicio = datetime.fromisoformat(info["inicio_sesion"])
+    fin = datetime.fromisoformat(info["fin_sesion"])
+    pausas = info.get("pausas", [])
+
+    print(f"[SESION] {inicio} → {fin}")
+    print(f"[PAUSAS] {len(pausas)}")
+
+    return {
+        "inicio": inicio,
+        "fin": fin,
+        "pausas": pausas,
+        "intervalos": construir_intervalos_validos(inicio, fin, pausas),
+    }
+
+
+def _unir_video(expediente, carpeta, id_sesion, manifest_path, tipo, perfil=None, linea=None, hilos=FFMPEG_THREADS, purgar=True):
 
     pid = os.getpid()
 
@@ -175,59 +863,58 @@ def _unir_video(expediente, carpeta, id_sesion, manifest_path, tipo):
     #    queue=QUEUE_VIDEO
     # )
 
-    info = obtener_pausas_todas(id_sesion)
-
-    inicio = datetime.fromisoformat(info["inicio_sesion"])
-    fin = datetime.fromisoformat(info["fin_sesion"])
-    pausas = info.get("pausas", [])
-
-    print(f"[SESION] {inicio} → {fin}")
-    print(f"[PAUSAS] {len(pausas)}")
+    linea = linea or linea_tiempo_sesion(id_sesion)
+    inicio, fin, pausas = linea["inicio"], linea["fin"], linea["pausas"]
 
     carpeta_fs = expediente_fs(carpeta)
     temp_dir = os.path.join(TEMP_ROOT, f"{tipo}_{carpeta_fs}_{id_sesion}")
 
-    limpiar_temp(temp_dir)
-    os.makedirs(temp_dir, exist_ok=True)
+    # Sin limpiar: una re-entrega reutiliza partes/chunks del checkpoint
+    # (unir_sesion purga una sola vez antes de lanzar las cámaras)
+    if purgar:
+        purgar_checkpoints(TEMP_ROOT, excluir=[temp_dir])
+    checkpoint = CheckpointUnion(temp_dir)
 
-    nombre_final = "video.webm" if tipo == "video" else "video2.webm"
+    # Nombre provisional: la extensión real depende del perfil, que se
+    # elige más abajo (puede requerir ffprobe); el job se corrige entonces
+    nombre_final = f"{tipo}.webm"
     job_id = registrar_job(expediente, id_sesion, tipo, nombre_final)
     salida = None
+    log_path = ruta_log_ffmpeg(tipo, id_sesion)
 
     try:
-        manifest = cargar_manifest(manifest_path)
-        frags = fragmentos_del_manifest(manifest, inicio, fin)
-        intervalos = construir_intervalos_validos(inicio, fin, pausas)
-
-        partes = []
-        idx = 0
-
-        for intervalo in intervalos:
-            for f in frags:
-                if f["_dt_fin"] <= intervalo["ini"] or f["_dt_ini"] >= intervalo["fin"]:
-                    continue
-
-                ini = max(0, (intervalo["ini"] - f["_dt_ini"]).total_seconds())
-                fin_ = min(
-                    (intervalo["fin"] - f["_dt_ini"]).total_seconds(),
-                    (f["_dt_fin"] - f["_dt_ini"]).total_seconds()
-                )
-
-                if fin_ <= ini:
-                    continue
+        frags, camara_mac = cargar_fragmentos_sesion(manifest_path, inicio, fin)
+        intervalos = linea["intervalos"]
 
-                idx += 1
-                dst = os.path.join(temp_dir, f"part_{idx}.mkv")
-                recortar_fragmento(f["ruta"], ini, fin_, dst)
-                partes.append(dst)
+        # Pre-check: falla antes de cualquier ffmpeg si faltan fragmentos
+        verificar_cobertura(frags, inicio, fin, pausas, tipo)
 
-        if not partes:
+        segmentos = planificar_segmentos(frags, intervalos)
+        if not segmentos:
             raise Exception("No se generaron fragmentos")
 
-        list_txt = os.path.join(temp_dir, "list.txt")
-        with open(list_txt, "w") as f:
-            for p in partes:
-                f.write(f"file '{p}'\n")
+        # Perfil: sesión → cámara → env (UNION_PERFIL)
+        perfil = elegir_perfil(
+            perfil
+            or UNION_PERFIL_POR_CAMARA.get(camara_mac)
+            or UNION_PERFIL,
+            segmentos[0]["ruta"],
+        )
+        extension = PERFILES_CODIFICACION[perfil]["extension"]
+        if f"{tipo}.{extension}" != nombre_final:
+            nombre_final = f"{tipo}.{extension}"
+            if job_id:
+                actualizar_job(job_id, archivo=nombre_final)
+
+        print(
+            f"[UNION] modo={UNION_MODO} perfil={perfil} "
+            f"segmentos={len(segmentos)}"
+        )
+
+        partes = None
+        if UNION_MODO != "una_pasada":
+            partes = preparar_partes_dos_etapas(
+                segmentos, temp_dir, checkpoint, f"{tipo}:{id_sesion}")
 
         salida = f"{EXPEDIENTES_PATH}/{carpeta_fs}/{id_sesion}/{nombre_final}"
         ensure_dir(os.path.dirname(salida))
@@ -246,20 +933,23 @@ def _unir_video(expediente, carpeta, id_sesion, manifest_path, tipo):
         if job_id:
             actualizar_job(job_id, estado="pendiente")
 
-        esperar_cpu_baja()
-
-        cmd = ffmpeg_concat_cmd(list_txt, salida)
-        print("\n========== FFMPEG CONCAT ==========")
-        print(cmd)
-        print("==================================")
+        progreso = ReportadorProgreso(
+            id_sesion, tipo, sum(seg["fin"] - seg["ini"] for seg in segmentos))
 
-        r = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if r.returncode != 0:
-            raise Exception(r.stderr)
+        codificar_union(
+            segmentos, partes, temp_dir, salida,
+            perfil=perfil, etiqueta=f"{tipo}:{id_sesion}", progreso=progreso,
+            log_path=log_path, hilos=hilos, checkpoint=checkpoint,
+        )
 
         if not os.path.exists(salida) or os.path.getsize(salida) < 200_000:
             raise Exception("Archivo final inválido")
 
+        # Salida válida: el checkpoint ya no sirve
+        checkpoint.eliminar()
+
+        progreso.finalizar()
+
         # Registrar/actualizar job -> completado primero
         if job_id:
             actualizar_job(job_id, estado="completado")
@@ -296,10 +986,14 @@ def _unir_video(expediente, carpeta, id_sesion, manifest_path, tipo):
             conversion_completa=False
         )
 
+        # El checkpoint se conserva para el reintento / reproceso
+        # (purgar_checkpoints lo elimina si se abandona)
+        print(f"[CHECKPOINT] Conservado {temp_dir} para reintento")
         raise
 
     finally:
-        limpiar_temp(temp_dir)
+        checkpoint.cerrar()
+        cerrar_log_ffmpeg(log_path)
         # send_heartbeat(
         #    worker=tipo,
         #    status="listening",
@@ -337,10 +1031,72 @@ def _parse_iso_utc(s: str) -> datetime:
 
 
 @celery_app.task(name="worker.tasks.unir_video")
-def unir_video(expediente, carpeta, id_sesion, manifest_path, *_):
-    return _unir_video(expediente, carpeta, id_sesion, manifest_path, "video")
+def unir_video(expediente, carpeta, id_sesion, manifest_path, *_, perfil=None):
+    return _unir_video(expediente, carpeta, id_sesion, manifest_path, "video", perfil)
 
 
 @celery_app.task(name="worker.tasks.unir_video2")
-def unir_video2(expediente, carpeta, id_sesion, manifest_path, *_):
-    return _unir_video(expediente, carpeta, id_sesion, manifest_path, "video2")
+def unir_video2(expediente, carpeta, id_sesion, manifest_path, *_, perfil=None):
+    return _unir_video(expediente, carpeta, id_sesion, manifest_path, "video2", perfil)
+
+
+@celery_app.task(name="worker.tasks.unir_sesion")
+def unir_sesion(*args, perfil=None):
+    """
+    Unión de ambas cámaras en una sola tarea: la línea de tiempo se
+    calcula una vez y video/video2 se codifican en paralelo repartiendo
+    UNION_SESION_HILOS. Cada cámara reporta a su propio job/archivo;
+    si una falla la otra termina igual y la tarea se marca con error.
+
+    args: [resultados_manifest,] expediente, carpeta, id_sesion,
+    manifest_path1, manifest_path2, ... — el chord antepone la lista de
+    resultados de generar_manifest(tolerante=True); una cámara cuyo
+    manifest devolvió {"error"} se omite (mensajes previos, inmutables,
+    llegan sin la lista).
+    """
+    resultados = [None, None]
+    if args and isinstance(args[0], list):
+        resultados, args = args[0], args[1:]
+    expediente, carpeta, id_sesion, manifest_path1, manifest_path2 = args[:5]
+
+    linea = linea_tiempo_sesion(id_sesion)
+
+    errores = {}
+    camaras = []
+    for tipo, manifest, resultado in zip(
+        ("video", "video2"), (manifest_path1, manifest_path2), resultados
+    ):
+        if isinstance(resultado, dict) and resultado.get("error"):
+            errores[tipo] = f"manifest: {resultado['error']}"
+            print(f"[UNION SESION] {id_sesion}: {tipo} omitido, manifest con error")
+        else:
+            camaras.append((tipo, manifest))
+
+    # Con una sola cámara se le da todo el presupuesto
+    hilos = max(1, UNION_SESION_HILOS // max(1, len(camaras)))
+    print(f"[UNION SESION] {id_sesion}: {len(camaras)} cámaras × {hilos} hilos")
+
+    carpeta_fs = expediente_fs(carpeta)
+    purgar_checkpoints(TEMP_ROOT, excluir=[
+        os.path.join(TEMP_ROOT, f"{tipo}_{carpeta_fs}_{id_sesion}")
+        for tipo, _ in camaras
+    ])
+
+    with ThreadPoolExecutor(max_workers=max(1, len(camaras))) as pool:
+        futuros = {
+            tipo: pool.submit(
+                _unir_video, expediente, carpeta, id_sesion, manifest,
+                tipo, perfil, linea, hilos, False,
+            )
+            for tipo, manifest in camaras
+        }
+
+    for tipo, futuro in futuros.items():
+        try:
+            futuro.result()
+        except Exception as e:
+            errores[tipo] = str(e)
+
+    if errores:
+        raise Exception(f"Unión de sesión {id_sesion} con errores: {errores}")
+    return True